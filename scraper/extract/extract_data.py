@@ -1,9 +1,44 @@
 import re
 import json
+import time
+import asyncio
 import logging
 import requests
-from typing import Any, List, Dict
-from bs4 import BeautifulSoup
+import multiprocessing
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Dict, Tuple, Union
+from xml.etree.ElementTree import iterparse, ParseError
+from urllib.parse import urlsplit
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+
+# Optional fast HTML parser, used by the parser backend 'selectolax' when it is installed
+try :
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError :
+    LexborHTMLParser = None
+
+# Polars is imported by the batch mode only, the image store (and Pillow) by the image stage only
+if TYPE_CHECKING :
+    import polars as pl
+    from .image_cache import ImageStore
+
+from .transport import HTTPTransport, get_shared_transport
+from .records import ProductVariant, decode_product_variants, decode_locale_fields, localize_variants, variants_from_product, flatten_product_payloads
+
+
+# Number of requests sent at the same time when nothing is set into the configuration
+DEFAULT_CONCURRENCY = 8
+
+# Maximum number of products returned by one page of the bulk products JSON endpoint
+CATALOG_PAGE_LIMIT = 250
+
+# Namespace of the elements of the sitemaps
+SITEMAP_NAMESPACE = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+# Parser backends available to extract the product's links from a listing page
+PARSER_BACKENDS = ("html.parser", "lxml", "strainer", "selectolax")
 
 
 
@@ -15,17 +50,22 @@ class AbstractAPIExtractor() :
 
     def __init__(self,
                  configuration: Any=None,
-                 file_log: str=None) -> None :
+                 file_log: str=None,
+                 transport: Union[HTTPTransport, None]=None) -> None :
         """
         Base class to use when getting data from an API, do not implement this class, it'is for making an abstract base class
-        Constructor : initialise the log management and the configuration file
+        Constructor : initialise the log management, the configuration file and the HTTP transport
             
             Args
                 configuration : [Any type] : object that store configurations using by the function inside this class and his inheritance
                 file_log : [string] : the path where to store logs during the runtime execution when calling/using this class
+                transport : [HTTPTransport or None] : the transport used to send requests
+                        if None, use the transport shared by all extractors (built from the configuration 'transport')
+                        :default:None
         """
 
         self.configuration = configuration
+        self.transport = transport if transport is not None else get_shared_transport((configuration or {}).get("transport"))
 
         # Set the log management
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -38,16 +78,18 @@ class AbstractAPIExtractor() :
     def send_request(self,
                      url: str) -> Any :
         """
-        Send a request to API specified by the url :param:url
+        Send a request to API specified by the url :param:url through the shared transport
+        (connections kept alive, retries with backoff on connection errors, 429 and 5xx)
             
             Args
                 url : [string] : The API's url
 
             Return
-                [Any type] : the response of the request into a Response type
+                [Any type] : the response of the request into a Response type, None when all the retries failed
 
             Raises
-                [requests.ConnectionError] : when we got bad response or error from server
+                [requests.HTTPError] : when we got bad response or error from server
+                [requests.RequestException] : when the connection failed or timed out
                 [Exception] : for other exceptions
             
             Assertions
@@ -62,7 +104,7 @@ class AbstractAPIExtractor() :
         try :
             # Send a call API
             self.logger.info(f"Try to send a request to '{url}'")
-            response = requests.get(url=url)
+            response = self.transport.get(url=url)
             response.raise_for_status()
 
             if response.status_code == 200 :
@@ -72,16 +114,90 @@ class AbstractAPIExtractor() :
             else:
                 raise requests.ConnectionError(f"{response.status_code} {response.reason}")
 
-        except requests.ConnectionError as error:
+        except requests.HTTPError as error :
+            self.logger.error(f"Got a bad response from '{url}' after all the retries : {error}")
+            response = None
+
+        except requests.RequestException as error :
             self.logger.error(f"A request type error occurred during sending a request to '{url}' : {error}")
+            response = None
 
         except Exception as error :
             self.logger.error(f"An internal error occurred for durong sending a request to '{url}' : {error}")
+            response = None
 
         finally :
             return response
 
 
+    def map_concurrently(self,
+                         function: Callable[[Any], Any],
+                         items: List[Any],
+                         concurrency: int,
+                         callback: Union[Callable[[Any, Any], None], None]=None) -> List[Any] :
+        """
+        Call :param:function on each item of :param:items with an asyncio event loop, at most :param:concurrency calls are running at the same time
+            
+            Args
+                function : [Callable] : blocking function (e.g. a function that sends a request) to call with one item
+                items : [list of Any type] : the items to give to :param:function
+                concurrency : [integer] : the maximum number of calls running at the same time
+                callback : [Callable or None] : if not None, called with (item, result) into the order of :param:items
+                        as soon as the result and the ones before are known, the results are not kept
+                        :default:None
+
+            Return
+                [list of Any type] : the results into the same order than :param:items, None when the call failed
+                        (empty list when :param:callback is given)
+
+            Assertions
+                concurrency : raise an error when this parameter is not a positive integer
+        """
+
+        assert isinstance(concurrency, int) and concurrency > 0, "Expected value of 'concurrency' is a positive integer, please check"
+
+        return asyncio.run(self._gather(function=function,
+                                        items=items,
+                                        concurrency=concurrency,
+                                        callback=callback))
+
+
+    async def _gather(self,
+                      function: Callable[[Any], Any],
+                      items: List[Any],
+                      concurrency: int,
+                      callback: Union[Callable[[Any, Any], None], None]=None) -> List[Any] :
+        """
+        Coroutine used by :func:map_concurrently, run the blocking calls into a thread pool limited by a semaphore
+        """
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor :
+
+            async def call(item: Any) -> Any :
+                async with semaphore :
+                    try :
+                        return await loop.run_in_executor(executor, function, item)
+
+                    # One failed call must not cancel the others
+                    except Exception as error :
+                        self.logger.error(f"An error occurred during calling '{function.__name__}' with '{item}' : {error}")
+                        return None
+
+            # `gather` keeps the order of the items, whatever the order of completion
+            if callback is None :
+                return await asyncio.gather(*(call(item) for item in items))
+
+            # Give the results into the order of the items, a result is only kept until the ones before are known
+            tasks = [asyncio.ensure_future(call(item)) for item in items]
+            for item, task in zip(items, tasks) :
+                callback(item, await task)
+
+            return []
+
+
 
 # ==================================================================================================================================================================== #
 # ======================================================================= KoroshiProductsListExtractor ======================================================================= #
@@ -99,6 +215,77 @@ class KoroshiProductsListExtractor(AbstractAPIExtractor) :
 
         # Configuration
         self.products_list_config = self.configuration["products-list"]
+        self.parser = self.products_list_config.get("parser", "html.parser")
+
+        assert self.parser in PARSER_BACKENDS, f"Unknown parser backend '{self.parser}', expected one of {PARSER_BACKENDS}"
+
+        # The backends whose library is not installed fall back to 'html.parser'
+        if (self.parser == "lxml" and builder_registry.lookup("lxml") is None) or (self.parser == "selectolax" and LexborHTMLParser is None) :
+            self.logger.warning(f"The parser backend '{self.parser}' is not installed, use 'html.parser'")
+            self.parser = "html.parser"
+
+
+    @staticmethod
+    def selector_tags(selector: str) -> Union[List[str], None] :
+        """
+        Get the tag names used by a CSS selector, to parse only these tags (and what they contain) with the backend 'strainer'
+            
+            Args
+                selector : [string] : the CSS selector (e.g. 'div.grid a.product-link')
+
+            Return
+                [list of string or None] : the tag names, None when a part of the selector has no tag name
+                        or uses a pseudo-class : all the page has to be parsed to get the same elements
+        """
+
+        if ':' in selector :
+            return None
+
+        tags = []
+        for compound in re.split(r"\s*[\s>+~,]\s*", selector.strip()) :
+            tag = re.match(r"^[a-zA-Z][\w-]*", compound)
+            if tag is None :
+                return None
+            tags.append(tag.group(0).lower())
+
+        return sorted(set(tags))
+
+
+    def select_attributes(self,
+                          html: str,
+                          selector: str,
+                          attribute: str) -> List[Union[str, None]] :
+        """
+        Get the value of an attribute for all the elements selected by a CSS selector, with the parser backend of the configuration
+        ('products-list.parser') : 'html.parser' (default), 'lxml', 'strainer' (BeautifulSoup that only parses the tags of the selector)
+        or 'selectolax'
+            
+            Args
+                html : [string] : the page
+                selector : [string] : the CSS selector of the elements
+                attribute : [string] : the attribute name
+
+            Return
+                [list of string or None] : the values into the page order, None for an element without the attribute
+        """
+
+        if self.parser == "selectolax" :
+            return [(node.attributes[attribute] or '') if attribute in node.attributes else None
+                    for node in LexborHTMLParser(html).css(selector)]
+
+        parse_only = None
+        features = 'html.parser'
+        
+        if self.parser == "strainer" :
+            tags = self.selector_tags(selector)
+            parse_only = SoupStrainer(tags) if tags is not None else None
+
+        elif self.parser == "lxml" :
+            features = 'lxml'
+
+        soup = BeautifulSoup(html, features, parse_only=parse_only)
+
+        return [element.attrs.get(attribute) for element in soup.select(selector=selector)]
 
 
     def get_products_list(self,
@@ -121,17 +308,18 @@ class KoroshiProductsListExtractor(AbstractAPIExtractor) :
 
         # Got the good response and extract data from it
         if response is not None :
-            soup = BeautifulSoup(response.text, 'html.parser')
-            productElements = soup.select(selector=products["selector"])
+            productLinks = self.select_attributes(html=response.text,
+                                                  selector=products["selector"],
+                                                  attribute=products["attribute"])
 
-            if len(productElements):
-                for prodElm in productElements :
+            if len(productLinks):
+                for prodLink in productLinks :
                     # Extract link from html element
-                    try :
-                        products_list.append(f"{products['url-prefix']}{prodElm.attrs[products['attribute']].strip()}")
+                    if prodLink is not None :
+                        products_list.append(f"{products['url-prefix']}{prodLink.strip()}")
                     
                     # When the html element does not have the attribute that we expected, skip this element
-                    except KeyError :
+                    else :
                         self.logger.error(f"Element '{products["selector"]}' has no attribute '{products['attribute']}'")
                         products_list.append('')
                         continue
@@ -173,6 +361,88 @@ class KoroshiProductsListExtractor(AbstractAPIExtractor) :
         self.logger.info(f"Next page link : {next_page_url}")
 
         return next_page_url
+
+
+    def page_url(self,
+                 url: str,
+                 n_page: int) -> str :
+        """
+        Get the link of the page number :param:n_page, the first page is the url itself
+            
+            Args
+                url : [string] : the url of the first page
+                n_page : [integer] : the page number, starting at 1
+
+            Return
+                [string] : the page link
+        """
+
+        return url if n_page == 1 else self.next_page(url=url, n_page=n_page)
+
+
+    def get_all_pages_products_list(self,
+                                    url: str,
+                                    max_pages: Union[int, None]=None,
+                                    prefetch_window: int=1,
+                                    callback: Union[Callable[[int, List[str]], None], None]=None,
+                                    start_page: int=1) -> List[str] :
+        """
+        Get the product's links of all the pages, :param:prefetch_window pages are fetched at the same time
+        because the next page links are known in advance. The exploration stops at the first page without products,
+        the pages fetched after this one are discarded
+            
+            Args
+                url : [string] : the url of the first page
+                max_pages : [integer or None] : the maximum number of pages to explore, if None explore until an empty page
+                        :default:None
+                prefetch_window : [integer] : the number of pages fetched at the same time, 1 means one page after the other
+                        :default:1
+                callback : [Callable or None] : if not None, called with (n_page, links) for each page into the page order
+                        (e.g. to write them into a file), the links are not kept
+                        :default:None
+                start_page : [integer] : the first page to explore (e.g. to resume a stopped exploration) :default:1
+
+            Return
+                [list of string] : list that contains all product links, into the page order (empty list when :param:callback is given)
+
+            Assertions
+                prefetch_window : raise an error when this parameter is not a positive integer
+        """
+
+        assert isinstance(prefetch_window, int) and prefetch_window > 0, "Expected value of 'prefetch_window' is a positive integer, please check"
+
+        # The output data
+        all_products = []
+        page = start_page
+
+        while max_pages is None or page <= max_pages :
+            
+            # Pages of the current window
+            last_page = page + prefetch_window - 1 if max_pages is None else min(page + prefetch_window - 1, max_pages)
+            pages = list(range(page, last_page + 1))
+            self.logger.info(f"Fetching the pages ({page}) to ({last_page})")
+
+            pages_products = self.map_concurrently(function=lambda n_page : self.get_products_list(url=self.page_url(url=url, n_page=n_page)),
+                                                   items=pages,
+                                                   concurrency=len(pages))
+
+            # Keep the pages into their order until the first empty one
+            for n_page, current_page_products in zip(pages, pages_products) :
+                if not current_page_products :
+                    self.logger.warning(f"No products found on the page ({n_page}), stop exploring website ({last_page - n_page}) prefetched pages discarded")
+                    return all_products
+                
+                if callback is None :
+                    all_products.extend(current_page_products)
+                else :
+                    callback(n_page, current_page_products)
+                self.logger.info(f"Got ({len(current_page_products)}) products from the page ({n_page})")
+
+            page = last_page + 1
+
+        self.logger.warning(f"Aborting pagination, the maximum number of pages ({max_pages}) is reached")
+
+        return all_products
     
 
 
@@ -191,50 +461,35 @@ class KoroshiProductDataExtractor(AbstractAPIExtractor):
 
         AbstractAPIExtractor.__init__(self, *args, **kwargs)
 
+        # Configuration
+        self.page_product_config = (self.configuration or {}).get("page-product", {})
+
 
     def extract_product_variants(self,
                                  data: Any, 
-                                 url: str) -> List[Dict[str, Any]] :
+                                 url: str) -> List[ProductVariant] :
         """
-        Extract variants about the product and save into a list of dictionary
+        Extract variants about the product and save into a list of records
             
             Args
                 data : [Any type] : Response from the call API into object format
                 url : [string] : the url to the product
 
             Return
-                [List of object] : list that stores data variants about the product into dictionary
+                [List of ProductVariant] : list that stores data variants about the product
         """
 
         # The output data
         product_variants = []
 
         if data is not None :
-            product_variants = list(
-                map(
-                    lambda variant : {
-                            "product_url" : url,
-                            "product_id" : variant['id'],
-                            "product_sku" : variant['sku'],
-                            "product_name" : data['title'],
-                            "product_color" : variant['option1'],
-                            "product_size" : variant['option2'],
-                            "product_image" : variant['featured_image']['src'],
-                            "product_description" : data['description'],
-                            "product_net_price" : variant['price'],
-                            "product_gross_price" : variant['compare_at_price'],
-                            "product_stock_status" : variant['available'],
-                            "product_barcode" : variant['barcode']
-                        },
-                    data['variants']
-                )
-            )
+            product_variants = variants_from_product(data=data, url=url)
             
         return product_variants
     
 
     def extract_product_data(self,
-                             product_url: str) -> List[Dict[str, Any]] :
+                             product_url: str) -> Union[List[ProductVariant], None] :
 
         """
         When we got the url of the product, we extract all data about that product
@@ -243,21 +498,633 @@ class KoroshiProductDataExtractor(AbstractAPIExtractor):
                 product_url : [url] : the product's link
 
             Return
-                [list of object] : list that contains data about the product
+                [list of ProductVariant or None] : list that contains data about the product (empty for a product without variants),
+                        None when the request failed
         """
         
-        # The output data
-        product_variants = []
-        
         self.logger.info(f"Entering in the webpage with url : '{product_url}'")
         url = product_url.split('?variant=')[0]
         response = self.send_request(url=f"{url}.js")
         
-        if response is not None :
-            product_data = json.loads(response.text)
+        if response is None :
+            return None
+
+        # Extract all variants, straight from the bytes of the response
+        product_variants = decode_product_variants(body=response.content, url=url)
+        self.logger.info(f"Got ({len(product_variants)}) variants from url '{product_url}'")
+            
+        return product_variants
+    
+
+    @staticmethod
+    def product_key(product_url: str) -> str :
+        """
+        Get the key of a product shared by all its locales : the host and the handle, without the locale prefix of the path
+        (e.g. 'https://<store>/fr-fi/products/<handle>?variant=1' -> '<store>/products/<handle>')
+            
+            Args
+                product_url : [string] : the product's link
+
+            Return
+                [string] : the key of the product, the link without query when it has no '/products/<handle>' path
+        """
+
+        parts = urlsplit(product_url)
+        match = re.search(r"/products/([^/]+)/?$", parts.path)
+
+        return f"{parts.netloc.lower()}/products/{match.group(1)}" if match else f"{parts.netloc.lower()}{parts.path}"
+
+
+    def group_products_urls(self,
+                            products_urls: List[str]) -> List[List[str]] :
+        """
+        Group the links of the same product into several locales (e.g. '/fr-fi/products/<handle>' and '/en-fi/products/<handle>')
+            
+            Args
+                products_urls : [list of string] : the products' links
+
+            Return
+                [list of list of string] : the links of each product, the products into the order of their first link
+        """
+
+        groups = {}
+        for product_url in products_urls :
+            groups.setdefault(self.product_key(product_url), []).append(product_url)
+
+        return list(groups.values())
+
+
+    def extract_product_locale_fields(self,
+                                      product_url: str) -> Union[Dict[int, Any], None] :
+        """
+        Get the prices and the availability of the variants of a product into the locale of its link
+            
+            Args
+                product_url : [url] : the product's link
+
+            Return
+                [dictionary or None] : see :func:decode_locale_fields, None when the request failed or the payload is invalid
+        """
+
+        response = self.send_request(url=f"{product_url.split('?variant=')[0]}.js")
+        if response is None :
+            return None
+
+        try :
+            return decode_locale_fields(body=response.content)
+        except ValueError as error :
+            self.logger.error(f"Invalid payload for the product '{product_url}' : {error}")
+            return None
+
+
+    def extract_product_locales_data(self,
+                                     products_urls: List[str]) -> List[Union[List[ProductVariant], None]] :
+        """
+        Extract data about one product sold into several locales : all the fields are extracted from the first locale that answers
+        with a valid payload, only the prices and the availability are decoded for the other ones. The locales are fetched one
+        after the other into the worker slot of the product, each with its own '<product>.js' request : the grouping saves
+        the decoding of the shared fields, not the requests, and a product with many locales holds its slot longer
+            
+            Args
+                products_urls : [list of string] : the links of the product into each locale (see :func:group_products_urls)
+
+            Return
+                [list of list of ProductVariant] : the variants of each link, into the order of :param:products_urls,
+                        None for a link that cannot be fetched
+        """
+
+        # The output data
+        products_variants = []
+        shared_variants = []
+
+        for product_url in products_urls :
+            # The first locale that answers gives the fields shared by all locales
+            if not shared_variants :
+                try :
+                    product_variants = self.extract_product_data(product_url=product_url)
+                except ValueError as error :
+                    # The next locale gives the shared fields
+                    self.logger.error(f"Invalid payload for the product '{product_url}' : {error}")
+                    product_variants = None
+                products_variants.append(product_variants)
+                shared_variants = product_variants or []
+                continue
+
+            locale_fields = self.extract_product_locale_fields(product_url=product_url)
+            products_variants.append(None if locale_fields is None else localize_variants(variants=shared_variants,
+                                                                                        url=product_url.split('?variant=')[0],
+                                                                                        locale_fields=locale_fields))
+
+        return products_variants
+
+
+    def extract_products_data(self,
+                              products_urls: List[str],
+                              concurrency: Union[int, None]=None,
+                              callback: Union[Callable[[str, Union[List[ProductVariant], None]], None], None]=None) -> List[ProductVariant] :
+        """
+        Extract data about many products concurrently, the variants are returned into the same order than :param:products_urls.
+        The links of the same product into several locales are extracted together (see :func:extract_product_locales_data),
+        they follow the first link of the product
+            
+            Args
+                products_urls : [list of string] : the products' links
+                concurrency : [integer or None] : the maximum number of requests sent at the same time
+                        if None, use the value 'concurrency' of the configuration 'page-product'
+                        :default:None
+                callback : [Callable or None] : if not None, called with (product_url, variants) for each product into the order
+                        of :param:products_urls (e.g. to write them into a file), the variants are not kept.
+                        The variants are None when the product cannot be fetched, an empty list when it has no variants
+                        :default:None
+
+            Return
+                [list of ProductVariant] : list that contains data about all products (empty list when :param:callback is given)
+        """
+
+        if concurrency is None :
+            concurrency = self.page_product_config.get("concurrency", DEFAULT_CONCURRENCY)
+
+        products_groups = self.group_products_urls(products_urls)
+
+        self.logger.info(f"Extracting data of ({len(products_urls)}) products links, ({len(products_groups)}) distinct products, with a concurrency of ({concurrency})")
+
+        def group_callback(products_group: List[str], group_variants: Union[List[Union[List[ProductVariant], None]], None]) -> None :
+            # A failed product is failed for each of its links
+            for product_url, product_variants in zip(products_group, group_variants or [None] * len(products_group)) :
+                callback(product_url, product_variants)
+
+        groups_variants = self.map_concurrently(function=self.extract_product_locales_data,
+                                                items=products_groups,
+                                                concurrency=concurrency,
+                                                callback=None if callback is None else group_callback)
+
+        return [variant for group_variants in groups_variants if group_variants for product_variants in group_variants if product_variants
+                for variant in product_variants]
+
+
+    def fetch_product_payload(self,
+                              product_url: str) -> Union[bytes, None] :
+        """
+        Get the raw body of the '<product>.js' response of a product, to be flattened later with other products
+            
+            Args
+                product_url : [url] : the product's link
+
+            Return
+                [bytes or None] : the body of the response, None when the request failed
+        """
+
+        response = self.send_request(url=f"{product_url.split('?variant=')[0]}.js")
+
+        return None if response is None else response.content
+
+
+    def extract_products_frame(self,
+                               products_urls: List[str],
+                               concurrency: Union[int, None]=None) -> "pl.DataFrame" :
+        """
+        Batch mode of :func:extract_products_data : the payloads are fetched concurrently, then all of them are flattened
+        into the variants table in a single Polars pass (same columns and values than the variants of :func:extract_product_data)
+            
+            Args
+                products_urls : [list of string] : the products' links
+                concurrency : [integer or None] : the maximum number of requests sent at the same time
+                        if None, use the value 'concurrency' of the configuration 'page-product'
+                        :default:None
+
+            Return
+                [pl.DataFrame] : one row per variant, into the order of :param:products_urls
+        """
+
+        import polars as pl
+
+        if concurrency is None :
+            concurrency = self.page_product_config.get("concurrency", DEFAULT_CONCURRENCY)
+
+        self.logger.info(f"Extracting data of ({len(products_urls)}) products in batch with a concurrency of ({concurrency})")
+        payloads = self.map_concurrently(function=self.fetch_product_payload,
+                                         items=products_urls,
+                                         concurrency=concurrency)
+        fetched = [(product_url.split('?variant=')[0], payload) for product_url, payload in zip(products_urls, payloads) if payload is not None]
+        urls = [url for url, _ in fetched]
+        payloads = [payload for _, payload in fetched]
+
+        try :
+            frame = flatten_product_payloads(payloads=payloads, urls=urls)
+
+        except ValueError as error :
+            # One invalid payload rejects the whole batch : flatten the products one by one and skip the invalid ones
+            self.logger.warning(f"Cannot flatten the batch at once, flattening the products one by one : {error}")
+            frames = []
+            for url, payload in fetched :
+                try :
+                    frames.append(flatten_product_payloads(payloads=[payload], urls=[url]))
+                except ValueError as error :
+                    self.logger.error(f"Invalid payload for the product '{url}' : {error}")
+            frame = pl.concat(frames) if frames else flatten_product_payloads(payloads=[], urls=[])
+
+        self.logger.info(f"Got ({frame.height}) variants from ({len(fetched)}) products")
+
+        return frame
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= KoroshiCatalogExtractor ======================================================================= #
+# ==================================================================================================================================================================== #
+class KoroshiCatalogExtractor(KoroshiProductDataExtractor):
+
+
+
+    def __init__(self, *args, **kwargs) -> None :
+        """
+            Provide some feature to extract data of all products from the bulk products JSON endpoint of the store ('products.json'),
+            one request returns up to 250 products with their variants : no listing pages and no request per product
+            Constructor: initialize super class and the configuration to use for performing the behaviour of each function inside the class
+        """
+
+        KoroshiProductDataExtractor.__init__(self, *args, **kwargs)
+
+        # Configuration
+        self.catalog_config = (self.configuration or {}).get("catalog", {})
+
+
+    @staticmethod
+    def to_cents(price: Any) -> Union[int, None] :
+        """
+        Convert a price of the bulk endpoint (e.g. "29.99") into cents like the prices of the '<product>.js' endpoint (e.g. 2999)
+            
+            Args
+                price : [Any type] : the price into string format or None
+
+            Return
+                [integer or None] : the price into cents, None when there is no price
+        """
+
+        return None if price is None else int(Decimal(str(price)) * 100)
+
+
+    def normalize_catalog_product(self,
+                                  product: Dict[str, Any]) -> Dict[str, Any] :
+        """
+        Give to a product of the bulk endpoint the same structure than the data of the '<product>.js' endpoint,
+        so that it can be given to :func:extract_product_variants
+            
+            Args
+                product : [dictionary] : one product of the bulk endpoint
+
+            Return
+                [dictionary] : the product with the fields 'title', 'description' and 'variants' of the '<product>.js' endpoint
+        """
+
+        # Image of the product used for the variants without their own image
+        images = product.get("images") or []
+        default_image = {"src" : images[0]["src"] if images else None}
+
+        return {
+            "title" : product["title"],
+            "description" : product.get("body_html"),
+            "variants" : [
+                {
+                    **variant,
+                    "price" : self.to_cents(variant.get("price")),
+                    "compare_at_price" : self.to_cents(variant.get("compare_at_price")),
+                    "featured_image" : variant.get("featured_image") or default_image,
+                    "available" : variant.get("available"),
+                    "barcode" : variant.get("barcode")
+                }
+                for variant in product.get("variants", [])
+            ]
+        }
+
+
+    def extract_catalog_data(self,
+                             url: Union[str, None]=None,
+                             limit: Union[int, None]=None,
+                             max_pages: Union[int, None]=None,
+                             callback: Union[Callable[[int, List[ProductVariant]], None], None]=None,
+                             start_page: int=1) -> List[ProductVariant] :
+        """
+        Page through the bulk products JSON endpoint and extract the variants of all products
+            
+            Args
+                url : [string or None] : the url of the endpoint (e.g. 'https://<store>/fr-fi/products.json')
+                        if None, use the value 'url' of the configuration 'catalog'
+                        :default:None
+                limit : [integer or None] : the number of products per page (at most 250),
+                        if None, use the value 'limit' of the configuration 'catalog' or 250
+                        :default:None
+                max_pages : [integer or None] : the maximum number of pages to explore, if None explore until an empty page
+                        :default:None
+                callback : [Callable or None] : if not None, called with (page, variants) for each page of the catalog
+                        (e.g. to write them into a file), the variants are not kept
+                        :default:None
+                start_page : [integer] : the first page to explore (e.g. to resume a stopped exploration) :default:1
+
+            Return
+                [list of ProductVariant] : list that contains data about all products, same structure than :func:extract_product_data
+                        (empty list when :param:callback is given)
+
+            Assertions
+                url : raise an error when no url is given nor set into the configuration
+        """
+
+        url = url or self.catalog_config.get("url")
+        limit = limit or self.catalog_config.get("limit", CATALOG_PAGE_LIMIT)
+        max_pages = max_pages or self.catalog_config.get("max-pages")
+
+        assert url, "No url of the bulk products endpoint, please check the configuration 'catalog'"
+
+        # The output data
+        products_variants = []
+
+        # The product page is next to the endpoint : '<...>/products.json' -> '<...>/products/<handle>'
+        products_url = url.split('?')[0].removesuffix('.json')
+        page = start_page
+        n_variants = 0
+
+        while max_pages is None or page <= max_pages :
+            response = self.send_request(url=f"{url}{'&' if '?' in url else '?'}limit={limit}&page={page}")
+            if response is None :
+                break
+
+            products = json.loads(response.content).get("products", [])
+            page_variants = []
+            for product in products :
+                product_variants = self.extract_product_variants(data=self.normalize_catalog_product(product),
+                                                                 url=f"{products_url}/{product['handle']}")
+                page_variants.extend(product_variants)
+
+            if callback is None :
+                products_variants.extend(page_variants)
+            else :
+                callback(page, page_variants)
+            n_variants += len(page_variants)
+            self.logger.info(f"Got ({len(products)}) products from the page ({page}) of the catalog")
+
+            # The last page is not full
+            if len(products) < limit :
+                break
+            page += 1
+
+        self.logger.info(f"Got ({n_variants}) variants from the catalog '{url}'")
+
+        return products_variants
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= KoroshiImageExtractor ======================================================================= #
+# ==================================================================================================================================================================== #
+class KoroshiImageExtractor(AbstractAPIExtractor):
+
+
+
+    def __init__(self, *args, **kwargs) -> None :
+        """
+            Provide some feature to download the images of the variants into a content-addressed store and to make their thumbnails
+            Constructor: initialize super class and the configuration to use for performing the behaviour of each function inside the class
+        """
+
+        AbstractAPIExtractor.__init__(self, *args, **kwargs)
+
+        # Configuration
+        self.images_config = (self.configuration or {}).get("images", {})
+
+
+    @staticmethod
+    def image_url(src: Any) -> Union[str, None] :
+        """
+        Get the absolute url of an image of a variant (the store gives urls without scheme, e.g. '//<store>/cdn/shop/files/<name>.jpg?v=1')
+            
+            Args
+                src : [Any type] : the field 'product_image' of a variant
+
+            Return
+                [string or None] : the url, None when the variant has no image
+        """
+
+        if not isinstance(src, str) or not src.strip() :
+            return None
+
+        src = src.strip()
+
+        return f"https:{src}" if src.startswith("//") else src
+
+
+    def download_image(self,
+                       store: "ImageStore",
+                       url: str) -> Union[Dict[str, Any], None] :
+        """
+        Download an image into the store with a conditional request, an unchanged image is not downloaded again
+            
+            Args
+                store : [ImageStore] : the store of the images
+                url : [string] : the url of the image
+
+            Return
+                [dictionary or None] : the entry of the image into the store, None when the request failed
+        """
+
+        try :
+            # The images are kept by the store, not by the HTTP cache of the transport
+            response = self.transport.send(url, headers=store.conditional_headers(url), timeout=self.transport.timeout)
+        except requests.RequestException as error :
+            self.logger.error(f"A request type error occurred during downloading the image '{url}' : {error}")
+            store.error()
+            return None
+
+        if response.status_code == 304 :
+            entry = store.not_modified(url)
+            if entry is not None :
+                return entry
+
+        if response.status_code != 200 :
+            self.logger.error(f"Got a bad response ({response.status_code}) for the image '{url}'")
+            store.error()
+            return None
+
+        return store.store(url, response.content, response.headers)
+
+
+    def extract_images(self,
+                       variants: Iterable[Dict[str, Any]],
+                       directory: str,
+                       concurrency: Union[int, None]=None,
+                       processes: Union[int, None]=None,
+                       thumbnail_size: Union[int, None]=None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]] :
+        """
+        Download the images of the variants, each image url once, and make the thumbnails of the new images into a process pool
+            
+            Args
+                variants : [iterable of dictionary] : the variants (fields 'product_id' and 'product_image')
+                directory : [string] : the directory of the :class:ImageStore
+                concurrency : [integer or None] : the maximum number of downloads at the same time,
+                        if None, use the value 'concurrency' of the configuration 'images' :default:None
+                processes : [integer or None] : the number of processes that decode and resize the images,
+                        if None, use the value 'processes' of the configuration 'images' or the number of CPUs :default:None
+                thumbnail_size : [integer or None] : the maximum width and height of the thumbnails,
+                        if None, use the value 'thumbnail-size' of the configuration 'images' or 256 :default:None
+
+            Return
+                [tuple] : the manifest (for each variant with an image : 'product_id', 'image_url', 'sha256', 'path' and 'thumbnail'),
+                        and the stats of the store with the number of 'variants', 'images', 'thumbnails' and 'images_per_second'
+        """
+
+        from .image_cache import ImageStore, HAS_PIL, make_thumbnail
+
+        concurrency = concurrency or self.images_config.get("concurrency", DEFAULT_CONCURRENCY)
+        processes = processes or self.images_config.get("processes")
+        thumbnail_size = thumbnail_size or self.images_config.get("thumbnail-size", 256)
+        start = time.perf_counter()
+
+        # Each image url is downloaded once, whatever the number of variants that show it
+        variants_images = [(variant["product_id"], self.image_url(variant.get("product_image"))) for variant in variants]
+        urls = list(dict.fromkeys(url for _, url in variants_images if url is not None))
+
+        store = ImageStore(directory=directory)
+        self.logger.info(f"Downloading ({len(urls)}) images of ({len(variants_images)}) variants with a concurrency of ({concurrency})")
+        entries = dict(zip(urls, self.map_concurrently(function=lambda url : self.download_image(store=store, url=url),
+                                                       items=urls,
+                                                       concurrency=concurrency)))
+        store.save_index()
+
+        # Decode and resize into several processes, each image content once
+        thumbnails = {}
+        if not HAS_PIL :
+            self.logger.warning("The library 'pillow' is not installed, no thumbnails")
+        else :
+            images = {entry["sha256"] : entry["path"] for entry in entries.values() if entry is not None}
+            # The transport threads are running, a forked child could inherit a held lock
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as executor :
+                paths = executor.map(make_thumbnail,
+                                     images.values(),
+                                     [store.thumbnail_path(digest, thumbnail_size) for digest in images],
+                                     [thumbnail_size] * len(images),
+                                     chunksize=16)
+                thumbnails = dict(zip(images, paths))
+
+        manifest = [{"product_id" : product_id,
+                     "image_url" : url,
+                     "sha256" : entries[url]["sha256"],
+                     "path" : entries[url]["path"],
+                     "thumbnail" : thumbnails.get(entries[url]["sha256"])}
+                    for product_id, url in variants_images if url is not None and entries.get(url) is not None]
+
+        seconds = time.perf_counter() - start
+        stats = {**store.get_stats(),
+                 "variants" : len(variants_images),
+                 "images" : len(urls),
+                 "thumbnails" : sum(path is not None for path in thumbnails.values()),
+                 "images_per_second" : round(len(urls) / seconds, 3) if seconds > 0 else None}
+        self.logger.info(f"Images : {stats}")
+
+        return manifest, stats
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= KoroshiSitemapExtractor ======================================================================= #
+# ==================================================================================================================================================================== #
+class KoroshiSitemapExtractor(AbstractAPIExtractor):
 
-            # Extract all variants
-            product_variants = self.extract_product_variants(data=product_data, url=url)
-            self.logger.info(f"Got ({len(product_variants)}) variants from url '{product_url}'")
+
+
+    def __init__(self, *args, **kwargs) -> None :
+        """
+            Provide some feature to discover the product's links from the sitemaps of the store, with the date of their last modification
+            Constructor: initialize super class and the configuration to use for performing the behaviour of each function inside the class
+        """
+
+        AbstractAPIExtractor.__init__(self, *args, **kwargs)
+
+        # Configuration
+        self.sitemap_config = (self.configuration or {}).get("sitemap", {})
+
+
+    def iter_sitemap(self,
+                     url: str) -> Iterator[Tuple[str, str, Union[str, None]]] :
+        """
+        Read a sitemap while it is downloaded, the elements are dropped as soon as they are read so the memory does not grow with its size
             
-        return product_variants
\ No newline at end of file
+            Args
+                url : [string] : the url of the sitemap
+
+            Return
+                [iterator of tuple] : for each entry, its type ('sitemap' for an entry of a sitemap index, else 'url'), its 'loc' and its 'lastmod'
+                        (None when it has none)
+
+            Raises
+                [requests.RequestException] : when the sitemap cannot be downloaded (error status included)
+                [ParseError] : when the sitemap is not a valid XML document, after the entries read before the error
+        """
+
+        try :
+            # Not through the HTTP cache of the transport, which reads the whole body
+            response = self.transport.send(url, stream=True, timeout=self.transport.timeout)
+            response.raise_for_status()
+        except requests.RequestException as error :
+            self.logger.error(f"Cannot download the sitemap '{url}' : {error}")
+            raise
+
+        # The body is decompressed while it is read
+        response.raw.decode_content = True
+        n_entries = 0
+        root = None
+
+        try :
+            for event, element in iterparse(response.raw, events=("start", "end")) :
+                if root is None :
+                    root = element
+                if event != "end" :
+                    continue
+
+                entry_type = element.tag.removeprefix(SITEMAP_NAMESPACE)
+
+                if entry_type in ("url", "sitemap") :
+                    loc = element.findtext(f"{SITEMAP_NAMESPACE}loc")
+                    lastmod = element.findtext(f"{SITEMAP_NAMESPACE}lastmod")
+                    # The entries read stay children of the root until it is cleared
+                    root.clear()
+                    if loc :
+                        n_entries += 1
+                        yield entry_type, loc.strip(), lastmod.strip() if lastmod else None
+
+        except ParseError as error :
+            self.logger.error(f"Invalid sitemap '{url}' after ({n_entries}) entries : {error}")
+            raise
+
+        finally :
+            response.close()
+
+        self.logger.info(f"Got ({n_entries}) entries from the sitemap '{url}'")
+
+
+    def iter_products(self,
+                      url: Union[str, None]=None) -> Iterator[Tuple[str, Union[str, None]]] :
+        """
+        Get the product's links of the sitemaps of the store : the sitemap index is followed into the product sitemaps
+        (the ones whose url contains the value 'filter' of the configuration 'sitemap', 'sitemap_products' by default)
+            
+            Args
+                url : [string or None] : the url of the sitemap or of the sitemap index,
+                        if None, use the value 'url' of the configuration 'sitemap' :default:None
+
+            Return
+                [iterator of tuple] : the 'loc' and the 'lastmod' of each product (the urls without '/products/' are skipped)
+
+            Assertions
+                url : raise an error when no url is given nor set into the configuration
+        """
+
+        url = url or self.sitemap_config.get("url")
+        assert url, "No url of the sitemap, please check the configuration 'sitemap'"
+        products_filter = self.sitemap_config.get("filter", "sitemap_products")
+
+        for entry_type, loc, lastmod in self.iter_sitemap(url=url) :
+            # The product sitemaps also give the home page of the store
+            if entry_type == "url" :
+                if "/products/" in loc :
+                    yield loc, lastmod
+            elif products_filter in loc :
+                yield from self.iter_products(url=loc)
@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import threading
+import requests
+from collections import OrderedDict
+from typing import Any, Dict, Union
+from requests.structures import CaseInsensitiveDict
+
+
+
+# Headers of the response kept with the body
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= HTTPCache ======================================================================= #
+# ==================================================================================================================================================================== #
+class HTTPCache() :
+
+
+    def __init__(self,
+                 directory: str,
+                 max_bytes: int=512 * 1024 * 1024) -> None :
+        """
+        Persistent cache of responses keyed by url, used for conditional requests : the ETag and Last-Modified of the response
+        are sent back with 'If-None-Match' and 'If-Modified-Since', and the body is read from the disk when the server answers 304.
+        The least recently used responses are removed when the cache is bigger than :param:max_bytes
+        Constructor : create the directory and index the responses already on the disk
+
+            Args
+                directory : [string] : the directory where responses are stored
+                max_bytes : [integer] : the maximum size of the stored bodies :default:512 MiB
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits" : 0, "misses" : 0, "bytes_saved" : 0, "evictions" : 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Size of each entry, from the least to the most recently used (the modification time of a body is its last use)
+        self.entries = OrderedDict()
+        bodies = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".body")]
+        for entry in sorted(bodies, key=lambda entry : entry.stat().st_mtime) :
+            self.entries[entry.name.removesuffix(".body")] = entry.stat().st_size
+        self.size = sum(self.entries.values())
+
+
+    @staticmethod
+    def key(url: str) -> str :
+        """
+        Get the name of the files of an url
+
+            Args
+                url : [string] : the url
+
+            Return
+                [string] : the key of the url into the cache
+        """
+
+        return hashlib.sha256(url.encode()).hexdigest()
+
+
+    def path(self,
+             key: str,
+             extension: str) -> str :
+        """
+        Get the path of the file '.body' or '.meta' of an entry
+        """
+
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+
+    def conditional_headers(self,
+                            url: str) -> Dict[str, str] :
+        """
+        Get the headers that make the request conditional when a response of the url is stored
+
+            Args
+                url : [string] : the url
+
+            Return
+                [dictionary] : 'If-None-Match' and/or 'If-Modified-Since', empty when the url is not cached
+        """
+
+        key = self.key(url)
+
+        with self.lock :
+            if key not in self.entries :
+                return {}
+
+        try :
+            with open(self.path(key, "meta"), 'r') as file :
+                headers = json.load(file)["headers"]
+
+        except (OSError, ValueError, KeyError) :
+            return {}
+
+        conditional = {}
+        if "ETag" in headers :
+            conditional["If-None-Match"] = headers["ETag"]
+        if "Last-Modified" in headers :
+            conditional["If-Modified-Since"] = headers["Last-Modified"]
+
+        return conditional
+
+
+    def load(self,
+             url: str) -> Union[requests.Response, None] :
+        """
+        Build a response from the disk, after the server answered 304 to a conditional request
+
+            Args
+                url : [string] : the url
+
+            Return
+                [requests.Response or None] : the stored response with the status 200, None when it is no more on the disk
+        """
+
+        key = self.key(url)
+
+        try :
+            with open(self.path(key, "meta"), 'r') as file :
+                meta = json.load(file)
+            with open(self.path(key, "body"), 'rb') as file :
+                body = file.read()
+            # Mark the entry as recently used, also for the next runs
+            os.utime(self.path(key, "body"))
+
+        except (OSError, ValueError) :
+            return None
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = url
+        response._content = body
+        response.encoding = meta.get("encoding")
+        response.headers = CaseInsensitiveDict(meta["headers"])
+
+        with self.lock :
+            if key in self.entries :
+                self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += len(body)
+
+        return response
+
+
+    def store(self,
+              url: str,
+              response: requests.Response) -> None :
+        """
+        Store a response when it can be validated later (it has an ETag or a Last-Modified), then evict the least recently used entries
+
+            Args
+                url : [string] : the url
+                response : [requests.Response] : a response with the status 200
+        """
+
+        with self.lock :
+            self.stats["misses"] += 1
+
+        headers = {name : response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        if "ETag" not in headers and "Last-Modified" not in headers :
+            return
+
+        key = self.key(url)
+        body = response.content
+
+        # Write into temporary files first so that a stopped run never leaves a half written entry
+        for extension, data in (("body", body), ("meta", json.dumps({"url" : url, "encoding" : response.encoding, "headers" : headers}).encode())) :
+            tmp_fp = f"{self.path(key, extension)}.{threading.get_ident()}.tmp"
+            with open(tmp_fp, 'wb') as file :
+                file.write(data)
+            os.replace(tmp_fp, self.path(key, extension))
+
+        with self.lock :
+            self.size += len(body) - self.entries.pop(key, 0)
+            self.entries[key] = len(body)
+
+            while self.size > self.max_bytes and len(self.entries) > 1 :
+                evicted, size = self.entries.popitem(last=False)
+                self.size -= size
+                self.stats["evictions"] += 1
+                for extension in ("body", "meta") :
+                    try :
+                        os.remove(self.path(evicted, extension))
+                    except OSError :
+                        pass
+
+
+    def get_stats(self) -> Dict[str, Any] :
+        """
+        Get the counters of the cache
+
+            Return
+                [dictionary] : 'hits', 'misses', 'bytes_saved', 'evictions', the number of 'entries' and their 'size' in bytes
+        """
+
+        with self.lock :
+            return {**self.stats, "entries" : len(self.entries), "size" : self.size}
@@ -0,0 +1,232 @@
+import os
+import json
+import hashlib
+import threading
+import importlib.util
+from typing import Any, Dict, Union
+
+# Optional image library, the thumbnails are skipped when it is not installed.
+# It is only imported by the processes that make the thumbnails
+HAS_PIL = importlib.util.find_spec("PIL") is not None
+
+
+
+# Extension of the stored images for their content type
+IMAGE_EXTENSIONS = {"image/jpeg" : "jpg", "image/png" : "png", "image/webp" : "webp", "image/gif" : "gif", "image/avif" : "avif"}
+
+
+
+def make_thumbnail(image_fp: str,
+                   thumbnail_fp: str,
+                   size: int) -> Union[str, None] :
+    """
+    Decode an image and save a JPEG thumbnail whose largest side is :param:size, run into the worker processes of the image stage
+
+        Args
+            image_fp : [string] : the path of the image
+            thumbnail_fp : [string] : the path of the thumbnail, nothing is done when it already exists
+            size : [integer] : the maximum width and height of the thumbnail
+
+        Return
+            [string or None] : the path of the thumbnail, None when the image cannot be decoded
+    """
+
+    if os.path.isfile(thumbnail_fp) :
+        return thumbnail_fp
+
+    from PIL import Image
+
+    try :
+        with Image.open(image_fp) as image :
+            # Decode the JPEG directly at a smaller scale when possible
+            image.draft("RGB", (size, size))
+            image = image.convert("RGB")
+            image.thumbnail((size, size))
+            tmp_fp = f"{thumbnail_fp}.{os.getpid()}.tmp"
+            image.save(tmp_fp, "JPEG", quality=85, optimize=True)
+        os.replace(tmp_fp, thumbnail_fp)
+
+    except (OSError, ValueError, Image.DecompressionBombError) :
+        return None
+
+    return thumbnail_fp
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= ImageStore ======================================================================= #
+# ==================================================================================================================================================================== #
+class ImageStore() :
+
+
+    def __init__(self,
+                 directory: str) -> None :
+        """
+        Content-addressed store of the product images : each image is saved once under the SHA-256 of its bytes, whatever the number
+        of urls and variants that use it. An index keeps for each url its ETag, Last-Modified and hash, so that the next runs send
+        conditional requests and an unchanged image is not downloaded again
+        Constructor : create the directories and read the index
+
+            Args
+                directory : [string] : the directory of the store ('objects/', 'thumbnails/' and 'index.json')
+        """
+
+        self.directory = directory
+        self.index_fp = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+        self.stats = {"requests" : 0, "not_modified" : 0, "duplicates" : 0, "downloaded" : 0, "bytes_downloaded" : 0, "bytes_saved" : 0, "errors" : 0}
+
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "thumbnails"), exist_ok=True)
+
+        try :
+            with open(self.index_fp, 'r') as file :
+                self.index = json.load(file)
+        except (OSError, ValueError) :
+            self.index = {}
+
+
+    def object_path(self,
+                    digest: str,
+                    extension: str) -> str :
+        """
+        Get the path of an image from its hash, into a sub-directory of the 2 first characters
+        """
+
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.{extension}")
+
+
+    def thumbnail_path(self,
+                       digest: str,
+                       size: int) -> str :
+        """
+        Get the path of the thumbnail of an image for a size
+        """
+
+        return os.path.join(self.directory, "thumbnails", f"{digest}_{size}.jpg")
+
+
+    def conditional_headers(self,
+                            url: str) -> Dict[str, str] :
+        """
+        Get the headers that make the request of an image conditional, when its image is still into the store
+
+            Args
+                url : [string] : the url of the image
+
+            Return
+                [dictionary] : 'If-None-Match' and/or 'If-Modified-Since', empty when the url is not known
+        """
+
+        with self.lock :
+            entry = self.index.get(url)
+
+        if entry is None or not os.path.isfile(self.object_path(entry["sha256"], entry["extension"])) :
+            return {}
+
+        conditional = {}
+        if entry.get("etag") :
+            conditional["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified") :
+            conditional["If-Modified-Since"] = entry["last_modified"]
+
+        return conditional
+
+
+    def not_modified(self,
+                     url: str) -> Union[Dict[str, Any], None] :
+        """
+        Get the entry of an url after the server answered 304
+
+            Args
+                url : [string] : the url of the image
+
+            Return
+                [dictionary or None] : the entry ('sha256', 'extension', 'path', 'size'), None when the url is not known
+        """
+
+        with self.lock :
+            entry = self.index.get(url)
+            self.stats["requests"] += 1
+            if entry is not None :
+                self.stats["not_modified"] += 1
+                self.stats["bytes_saved"] += entry["size"]
+
+        return None if entry is None else {**entry, "path" : self.object_path(entry["sha256"], entry["extension"])}
+
+
+    def store(self,
+              url: str,
+              body: bytes,
+              headers: Any) -> Dict[str, Any] :
+        """
+        Store the body of an image downloaded with the status 200, the bytes already stored under the same hash are not written again
+
+            Args
+                url : [string] : the url of the image
+                body : [bytes] : the image
+                headers : [Any type] : the headers of the response (for 'Content-Type', 'ETag' and 'Last-Modified')
+
+            Return
+                [dictionary] : the entry ('sha256', 'extension', 'path', 'size')
+        """
+
+        digest = hashlib.sha256(body).hexdigest()
+        extension = IMAGE_EXTENSIONS.get(headers.get("Content-Type", '').split(';')[0].strip(), "img")
+        path = self.object_path(digest, extension)
+        duplicate = os.path.isfile(path)
+
+        if not duplicate :
+            # Write into a temporary file first so that a stopped run never leaves a half written image
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_fp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_fp, 'wb') as file :
+                file.write(body)
+            os.replace(tmp_fp, path)
+
+        entry = {"sha256" : digest, "extension" : extension, "size" : len(body), "etag" : headers.get("ETag"), "last_modified" : headers.get("Last-Modified")}
+
+        with self.lock :
+            self.index[url] = entry
+            self.stats["requests"] += 1
+            self.stats["bytes_downloaded"] += len(body)
+            self.stats["duplicates" if duplicate else "downloaded"] += 1
+
+        return {**entry, "path" : path}
+
+
+    def error(self) -> None :
+        """
+        Count an image that could not be downloaded
+        """
+
+        with self.lock :
+            self.stats["requests"] += 1
+            self.stats["errors"] += 1
+
+
+    def save_index(self) -> None :
+        """
+        Save the index of the urls, replaced at once so that a stopped run keeps the previous index
+        """
+
+        with self.lock :
+            content = json.dumps(self.index)
+
+        with open(f"{self.index_fp}.tmp", 'w', encoding='utf-8') as file :
+            file.write(content)
+        os.replace(f"{self.index_fp}.tmp", self.index_fp)
+
+
+    def get_stats(self) -> Dict[str, Any] :
+        """
+        Get the counters of the store
+
+            Return
+                [dictionary] : 'requests', 'not_modified' (304), 'duplicates' (downloaded bytes already stored), 'downloaded', 'errors',
+                        'bytes_downloaded', 'bytes_saved' and the 'hit_rate' (images not written again out of the requests)
+        """
+
+        with self.lock :
+            hits = self.stats["not_modified"] + self.stats["duplicates"]
+            return {**self.stats, "hit_rate" : round(hits / self.stats["requests"], 4) if self.stats["requests"] else None}
@@ -0,0 +1,185 @@
+import time
+import threading
+from typing import Any, Dict, Union
+from urllib.parse import urlsplit
+
+
+
+# Status codes that mean the host is overloaded : the limit is decreased and the request is sent again later
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= AdaptiveLimiter ======================================================================= #
+# ==================================================================================================================================================================== #
+class AdaptiveLimiter() :
+
+
+    def __init__(self,
+                 initial: int=4,
+                 minimum: int=1,
+                 maximum: int=64,
+                 increase: float=1.0,
+                 decrease: float=0.5,
+                 latency_target: float=2.0) -> None :
+        """
+        Limit of the requests sent at the same time to one host, adapted like the congestion window of TCP (AIMD) :
+        the limit grows by :param:increase after each window of healthy responses, and is multiplied by :param:decrease
+        (at most once per round trip) when the host answers 429/503, fails, or is slower than :param:latency_target.
+        A 'Retry-After' pauses all the requests to the host
+        Constructor : initialise the limit
+
+            Args
+                initial : [integer] : the limit at the start :default:4
+                minimum : [integer] : the limit is never lower :default:1
+                maximum : [integer] : the limit is never higher :default:64
+                increase : [float] : requests added to the limit after each window of healthy responses :default:1.0
+                decrease : [float] : the factor of the limit when the host is overloaded :default:0.5
+                latency_target : [float] : seconds above which a response is a sign of overload :default:2.0
+
+            Assertions
+                minimum, initial, maximum : raise an error when they are not 1 <= minimum <= initial <= maximum
+                decrease : raise an error when the factor is not between 0 and 1
+        """
+
+        assert 1 <= minimum <= initial <= maximum, "Expected values are 1 <= 'minimum' <= 'initial' <= 'maximum', please check"
+        assert 0 < decrease < 1, "Expected value of 'decrease' is between 0 and 1, please check"
+
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.decrease_window_until = 0.0
+        self.condition = threading.Condition()
+        self.stats = {"requests" : 0, "throttled" : 0, "increases" : 0, "decreases" : 0, "max_limit" : int(self.limit)}
+
+
+    def acquire(self) -> None :
+        """
+        Wait until a request can be sent to the host : fewer requests than the limit are running and the host is not paused
+        """
+
+        with self.condition :
+            while True :
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit) :
+                    break
+                self.condition.wait(timeout=wait if wait > 0 else None)
+
+            self.in_flight += 1
+
+
+    def release(self,
+                status_code: Union[int, None],
+                seconds: float,
+                retry_after: Union[float, None]=None) -> None :
+        """
+        Record the end of a request and adapt the limit
+
+            Args
+                status_code : [integer or None] : the status of the response, None when the request failed without response
+                seconds : [float] : the latency of the request
+                retry_after : [float or None] : the seconds of the header 'Retry-After', if None no pause :default:None
+        """
+
+        with self.condition :
+            now = time.monotonic()
+            self.in_flight -= 1
+            self.stats["requests"] += 1
+            throttled = status_code is None or status_code in THROTTLE_STATUS_CODES
+
+            if throttled or seconds > self.latency_target :
+                if throttled :
+                    self.stats["throttled"] += 1
+                # The requests sent at the same time see the same overload : only one decrease per round trip
+                if now >= self.decrease_window_until :
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.decrease_window_until = now + seconds
+                    self.stats["decreases"] += 1
+                if retry_after is not None :
+                    self.paused_until = max(self.paused_until, now + retry_after)
+
+            elif self.limit < self.maximum :
+                # 'increase' more request once a whole window of requests succeeded
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+                self.stats["increases"] += 1
+                self.stats["max_limit"] = max(self.stats["max_limit"], int(self.limit))
+
+            self.condition.notify_all()
+
+
+    def get_stats(self) -> Dict[str, Any] :
+        """
+        Get the current limit and the counters
+
+            Return
+                [dictionary] : 'limit', 'in_flight', 'requests', 'throttled', 'increases', 'decreases' and 'max_limit'
+        """
+
+        with self.condition :
+            return {"limit" : int(self.limit), "in_flight" : self.in_flight, **self.stats}
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= AdaptiveConcurrency ======================================================================= #
+# ==================================================================================================================================================================== #
+class AdaptiveConcurrency() :
+
+
+    def __init__(self,
+                 **limiter_parameters: Any) -> None :
+        """
+        One :class:AdaptiveLimiter per host, created at the first request to the host
+        Constructor : keep the parameters of the limiters
+
+            Args
+                limiter_parameters : [Any type] : the parameters of :class:AdaptiveLimiter (e.g. initial=4, maximum=64)
+        """
+
+        self.limiter_parameters = limiter_parameters
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+        # Check the parameters now rather than at the first request
+        AdaptiveLimiter(**limiter_parameters)
+
+
+    def limiter(self,
+                url: str) -> AdaptiveLimiter :
+        """
+        Get the limiter of the host of an url
+
+            Args
+                url : [string] : the url of the request
+
+            Return
+                [AdaptiveLimiter] : the limiter of the host
+        """
+
+        host = urlsplit(url).netloc
+
+        with self.lock :
+            if host not in self.limiters :
+                self.limiters[host] = AdaptiveLimiter(**self.limiter_parameters)
+            return self.limiters[host]
+
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]] :
+        """
+        Get the stats of the limiter of each host
+
+            Return
+                [dictionary] : see :func:AdaptiveLimiter.get_stats, for each host
+        """
+
+        with self.lock :
+            limiters = dict(self.limiters)
+
+        return {host : limiter.get_stats() for host, limiter in limiters.items()}
@@ -0,0 +1,306 @@
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Union
+
+# Polars is imported by the batch flattening only, the stages that do not flatten start without it
+if TYPE_CHECKING :
+    import polars as pl
+
+# Fast decoder of requirements.txt, the payloads are decoded straight into typed structs (the json module is the fallback)
+try :
+    import msgspec
+except ImportError :
+    msgspec = None
+
+
+
+# Fields of a variant, into the order of the columns of the table
+VARIANT_FIELDS = ("product_url", "product_id", "product_sku", "product_name", "product_color", "product_size", "product_image",
+                  "product_description", "product_net_price", "product_gross_price", "product_stock_status", "product_barcode")
+
+@lru_cache(maxsize=1)
+def product_payload_dtype() -> "pl.Struct" :
+    """
+    Get the used fields of a '<product>.js' payload and their types, the other fields are skipped by the decoder
+    """
+
+    import polars as pl
+
+    return pl.Struct({
+        "title" : pl.Utf8,
+        "description" : pl.Utf8,
+        "variants" : pl.List(pl.Struct({
+            "id" : pl.Int64,
+            "sku" : pl.Utf8,
+            "option1" : pl.Utf8,
+            "option2" : pl.Utf8,
+            "featured_image" : pl.Struct({"src" : pl.Utf8}),
+            "price" : pl.Int64,
+            "compare_at_price" : pl.Int64,
+            "available" : pl.Boolean,
+            "barcode" : pl.Utf8
+        }))
+    })
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= ProductVariant ======================================================================= #
+# ==================================================================================================================================================================== #
+@dataclass(slots=True)
+class ProductVariant() :
+    """
+    One variant of a product, carried between the stages instead of a dictionary : no dictionary per variant,
+    and the name, the description and the url are shared by all the variants of a product
+    """
+
+    product_url: str
+    product_id: int
+    product_sku: Union[str, None]
+    product_name: str
+    product_color: Union[str, None]
+    product_size: Union[str, None]
+    product_image: Union[str, None]
+    product_description: Union[str, None]
+    product_net_price: Union[int, None]
+    product_gross_price: Union[int, None]
+    product_stock_status: Union[bool, None]
+    product_barcode: Union[str, None]
+
+
+    def to_dict(self) -> Dict[str, Any] :
+        """
+        Get the variant into dictionary format (e.g. to write it into a json file)
+
+            Return
+                [dictionary] : the fields of :data:VARIANT_FIELDS
+        """
+
+        return {field : getattr(self, field) for field in VARIANT_FIELDS}
+
+
+
+# Only the fields of the payload that are used are decoded, the others are skipped by the decoder
+if msgspec is not None :
+
+    class _Image(msgspec.Struct) :
+        src: Union[str, None] = None
+
+    class _Variant(msgspec.Struct) :
+        id: int
+        sku: Union[str, None] = None
+        option1: Union[str, None] = None
+        option2: Union[str, None] = None
+        featured_image: Union[_Image, None] = None
+        price: Union[int, None] = None
+        compare_at_price: Union[int, None] = None
+        available: Union[bool, None] = None
+        barcode: Union[str, None] = None
+
+    class _Product(msgspec.Struct) :
+        title: str
+        description: Union[str, None] = None
+        variants: List[_Variant] = []
+
+    _product_decoder = msgspec.json.Decoder(_Product)
+
+    # Fields of a variant that change with the locale
+    class _LocaleVariant(msgspec.Struct) :
+        id: int
+        price: Union[int, None] = None
+        compare_at_price: Union[int, None] = None
+        available: Union[bool, None] = None
+
+    class _LocaleProduct(msgspec.Struct) :
+        variants: List[_LocaleVariant] = []
+
+    _locale_decoder = msgspec.json.Decoder(_LocaleProduct)
+
+
+
+def variants_from_product(data: Dict[str, Any],
+                          url: str) -> List[ProductVariant] :
+    """
+    Build the variants of a product already decoded into dictionary format (e.g. a product of the bulk endpoint)
+
+        Args
+            data : [dictionary] : the product with the fields 'title', 'description' and 'variants' of the '<product>.js' endpoint
+            url : [string] : the url of the product
+
+        Return
+            [list of ProductVariant] : the variants of the product
+    """
+
+    title = data['title']
+    description = data.get('description')
+
+    return [
+        ProductVariant(url,
+                       variant['id'],
+                       variant.get('sku'),
+                       title,
+                       variant.get('option1'),
+                       variant.get('option2'),
+                       (variant.get('featured_image') or {}).get('src'),
+                       description,
+                       variant.get('price'),
+                       variant.get('compare_at_price'),
+                       variant.get('available'),
+                       variant.get('barcode'))
+        for variant in data.get('variants', [])
+    ]
+
+
+def decode_product_variants(body: Union[bytes, str],
+                            url: str) -> List[ProductVariant] :
+    """
+    Decode the body of a '<product>.js' response straight into variants, without decoding it into text first.
+    With msgspec, only the used fields are decoded and no dictionary is built ; without it, the json module is used
+
+        Args
+            body : [bytes or string] : the body of the response
+            url : [string] : the url of the product
+
+        Return
+            [list of ProductVariant] : the variants of the product
+
+        Raises
+            [ValueError] : when the body is not a valid json (json.JSONDecodeError or msgspec.DecodeError)
+    """
+
+    if msgspec is None :
+        return variants_from_product(data=json.loads(body), url=url)
+
+    try :
+        product = _product_decoder.decode(body)
+    except msgspec.DecodeError as error :
+        raise ValueError(f"Invalid product payload : {error}") from error
+
+    return [
+        ProductVariant(url,
+                       variant.id,
+                       variant.sku,
+                       product.title,
+                       variant.option1,
+                       variant.option2,
+                       variant.featured_image.src if variant.featured_image is not None else None,
+                       product.description,
+                       variant.price,
+                       variant.compare_at_price,
+                       variant.available,
+                       variant.barcode)
+        for variant in product.variants
+    ]
+
+
+def decode_locale_fields(body: Union[bytes, str]) -> Dict[int, Tuple[Union[int, None], Union[int, None], Union[bool, None]]] :
+    """
+    Decode only the fields of the variants that change with the locale (prices and availability) from the body of a '<product>.js' response
+
+        Args
+            body : [bytes or string] : the body of the response
+
+        Return
+            [dictionary] : for each variant id, its (net price, gross price, stock status)
+
+        Raises
+            [ValueError] : when the body is not a valid json (json.JSONDecodeError or msgspec.DecodeError)
+    """
+
+    if msgspec is None :
+        return {variant['id'] : (variant.get('price'), variant.get('compare_at_price'), variant.get('available'))
+                for variant in json.loads(body).get('variants', [])}
+
+    try :
+        product = _locale_decoder.decode(body)
+    except msgspec.DecodeError as error :
+        raise ValueError(f"Invalid product payload : {error}") from error
+
+    return {variant.id : (variant.price, variant.compare_at_price, variant.available) for variant in product.variants}
+
+
+def localize_variants(variants: List[ProductVariant],
+                      url: str,
+                      locale_fields: Dict[int, Tuple[Union[int, None], Union[int, None], Union[bool, None]]]) -> List[ProductVariant] :
+    """
+    Build the variants of a product for another locale : the shared fields (name, description, sku, image, ...) come from
+    the variants already extracted, the prices and the availability from the locale
+
+        Args
+            variants : [list of ProductVariant] : the variants of the product extracted from one locale
+            url : [string] : the url of the product into the other locale
+            locale_fields : [dictionary] : the fields of the other locale, see :func:decode_locale_fields
+
+        Return
+            [list of ProductVariant] : the variants sold into the other locale, into the order of :param:variants
+    """
+
+    return [
+        ProductVariant(url,
+                       variant.product_id,
+                       variant.product_sku,
+                       variant.product_name,
+                       variant.product_color,
+                       variant.product_size,
+                       variant.product_image,
+                       variant.product_description,
+                       *locale_fields[variant.product_id],
+                       variant.product_barcode)
+        for variant in variants if variant.product_id in locale_fields
+    ]
+
+
+def flatten_product_payloads(payloads: List[Union[bytes, str]],
+                             urls: List[str]) -> "pl.DataFrame" :
+    """
+    Flatten many '<product>.js' payloads into the variants table in a single Polars pass (decode, explode the variants,
+    unnest the image, cast the types) : the columns are the ones of :data:VARIANT_FIELDS, with the same values than :func:variants_from_product
+
+        Args
+            payloads : [list of bytes or string] : the bodies of the responses
+            urls : [list of string] : the url of the product of each payload
+
+        Return
+            [pl.DataFrame] : one row per variant, into the order of the payloads
+
+        Raises
+            [ValueError] : when a payload is not a valid json, the whole batch is rejected
+
+        Assertions
+            urls : raise an error when there is not one url per payload
+    """
+
+    assert len(payloads) == len(urls), "Expected one url per payload, please check"
+
+    import polars as pl
+
+    texts = pl.Series("payload", [payload.decode('utf-8') if isinstance(payload, bytes) else payload for payload in payloads], dtype=pl.Utf8)
+
+    try :
+        products = texts.str.json_decode(product_payload_dtype())
+    except pl.exceptions.ComputeError as error :
+        raise ValueError(f"Invalid product payload : {error}") from error
+
+    return (
+        pl.DataFrame({"product_url" : pl.Series(urls, dtype=pl.Utf8), "payload" : products})
+        .unnest("payload")
+        .explode("variants")
+        # A product without variants gives an empty row
+        .filter(pl.col("variants").is_not_null())
+        .unnest("variants")
+        .select(
+            pl.col("product_url"),
+            pl.col("id").alias("product_id"),
+            pl.col("sku").alias("product_sku"),
+            pl.col("title").alias("product_name"),
+            pl.col("option1").alias("product_color"),
+            pl.col("option2").alias("product_size"),
+            pl.col("featured_image").struct.field("src").alias("product_image"),
+            pl.col("description").alias("product_description"),
+            pl.col("price").alias("product_net_price"),
+            pl.col("compare_at_price").alias("product_gross_price"),
+            pl.col("available").alias("product_stock_status"),
+            pl.col("barcode").alias("product_barcode")
+        )
+    )
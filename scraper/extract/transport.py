@@ -0,0 +1,411 @@
+import os
+import time
+import random
+import threading
+import requests
+from typing import Any, Callable, Dict, List, Union
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+
+from .http_cache import HTTPCache
+from .rate_control import AdaptiveConcurrency, THROTTLE_STATUS_CODES
+
+
+
+# Status codes for which a request is sent again (rate limiting and temporary server errors)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Relative paths of the configuration are relative to the scraper directory
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Transport shared by all the extractors of the process
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= ObservedRetry ======================================================================= #
+# ==================================================================================================================================================================== #
+class ObservedRetry(Retry) :
+
+
+    def __init__(self,
+                 *args: Any,
+                 on_retry: Union[Callable[[str, Union[int, None]], None], None]=None,
+                 **kwargs: Any) -> None :
+        """
+        Retry of urllib3 that reports each attempt it sends again : the transport only sees the last response of a request
+        Constructor : initialise the retry and keep the function to call
+
+            Args
+                args, kwargs : [Any type] : the arguments of `urllib3.util.Retry`
+                on_retry : [Callable or None] : if not None, called with (url, status_code) for each attempt sent again,
+                        the status code is None when the attempt failed without response :default:None
+        """
+
+        super().__init__(*args, **kwargs)
+        self.on_retry = on_retry
+
+
+    def new(self,
+            **kwargs: Any) -> "ObservedRetry" :
+        # urllib3 builds a new object for each attempt
+        retry = super().new(**kwargs)
+        retry.on_retry = self.on_retry
+        return retry
+
+
+    def increment(self,
+                  method: Union[str, None]=None,
+                  url: Union[str, None]=None,
+                  response: Any=None,
+                  error: Union[Exception, None]=None,
+                  _pool: Any=None,
+                  _stacktrace: Any=None) -> "ObservedRetry" :
+        # Raises when the retries are exhausted : the last attempt is then the one seen by the transport
+        retry = super().increment(method=method, url=url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+
+        if self.on_retry is not None :
+            full_url = f"{_pool.scheme}://{_pool.host}:{_pool.port}{url}" if _pool is not None and url and url.startswith("/") else url
+            self.on_retry(full_url, response.status if response is not None else None)
+
+        return retry
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= HTTPTransport ======================================================================= #
+# ==================================================================================================================================================================== #
+class HTTPTransport() :
+
+
+    def __init__(self,
+                 pool_connections: int=10,
+                 pool_maxsize: int=32,
+                 connect_timeout: float=5.0,
+                 read_timeout: float=30.0,
+                 max_retries: int=3,
+                 backoff_factor: float=0.5,
+                 backoff_jitter: float=0.5,
+                 cache: Union[HTTPCache, None]=None,
+                 adaptive: Union[AdaptiveConcurrency, None]=None,
+                 max_requeues: int=10) -> None :
+        """
+        HTTP transport shared by the extractors : one keep-alive connection pool per host, compressed responses, timeouts
+        and bounded retries with a jittered exponential backoff
+        Constructor : initialise the session and mount the adapter that holds the connection pools
+
+            Args
+                pool_connections : [integer] : the number of hosts for which a connection pool is kept :default:10
+                pool_maxsize : [integer] : the maximum number of connections kept alive for one host,
+                        must be at least the number of requests sent at the same time :default:32
+                connect_timeout : [float] : seconds to wait for establishing a connection :default:5.0
+                read_timeout : [float] : seconds to wait for the server between two bytes of the response :default:30.0
+                max_retries : [integer] : the maximum number of retries of one request :default:3
+                backoff_factor : [float] : the retry 'n' waits 'backoff_factor * 2 ** (n - 1)' seconds :default:0.5
+                backoff_jitter : [float] : a random delay between 0 and this value is added to each wait :default:0.5
+                cache : [HTTPCache or None] : the cache used for conditional requests, if None no cache :default:None
+                adaptive : [AdaptiveConcurrency or None] : if not None, the requests sent at the same time to a host are limited
+                        by its adaptive limit, and the responses 429/503 are not retried by urllib3 but sent again once the host
+                        accepts requests :default:None
+                max_requeues : [integer] : with :param:adaptive, the maximum number of times a rejected request is sent again :default:10
+        """
+
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache
+        self.adaptive = adaptive
+        self.max_requeues = max_requeues
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        # Functions called with (url, seconds, status_code, n_bytes) after each request sent on the network
+        self.observers: List[Callable[[str, float, Union[int, None], int], None]] = []
+        # Functions called with (url, status_code) for each attempt retried by urllib3 into a request
+        self.retry_observers: List[Callable[[str, Union[int, None]], None]] = []
+
+        retry = ObservedRetry(total=max_retries,
+                              backoff_factor=backoff_factor,
+                              backoff_jitter=backoff_jitter,
+                              status_forcelist=RETRY_STATUS_CODES if adaptive is None else tuple(set(RETRY_STATUS_CODES) - set(THROTTLE_STATUS_CODES)),
+                              allowed_methods=frozenset({"GET", "HEAD"}),
+                              # urllib3 retries any 413/429/503 with a 'Retry-After' : with the adaptive concurrency the header is honoured
+                              # by the limiter of the host instead, so that the rejections are counted and the limit backs off
+                              respect_retry_after_header=adaptive is None,
+                              raise_on_status=False,
+                              on_retry=self.notify_retry)
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        # gzip/deflate always, brotli (and zstd) only when urllib3 is able to decode it
+        self.session.headers.update({"Accept-Encoding" : ACCEPT_ENCODING,
+                                     "Connection" : "keep-alive"})
+
+
+    @classmethod
+    def from_configuration(cls,
+                           configuration: Union[Dict[str, Any], None]) -> "HTTPTransport" :
+        """
+        Build a transport from the configuration 'transport' (keys are written like 'pool-maxsize', 'read-timeout', ...),
+        the optional 'cache' ({"directory" : ..., "max-bytes" : ...}) enables the on-disk cache, its directory is relative to the scraper directory,
+        the optional 'adaptive' ({"initial" : ..., "minimum" : ..., "maximum" : ..., "latency-target" : ...}) enables the adaptive concurrency
+
+            Args
+                configuration : [dictionary or None] : the configuration 'transport', if None use the default values
+
+            Return
+                [HTTPTransport] : the new transport
+        """
+
+        parameters = {key.replace('-', '_') : value for key, value in (configuration or {}).items()}
+
+        if parameters.get("cache") is not None :
+            cache_config = parameters["cache"]
+            parameters["cache"] = HTTPCache(directory=os.path.join(SCRAPER_DIR, cache_config.get("directory", "cache/http")),
+                                            **({"max_bytes" : cache_config["max-bytes"]} if "max-bytes" in cache_config else {}))
+
+        if parameters.get("adaptive") is not None :
+            parameters["adaptive"] = AdaptiveConcurrency(**{key.replace('-', '_') : value for key, value in parameters["adaptive"].items()})
+
+        return cls(**parameters)
+
+
+    def get(self,
+            url: str,
+            **kwargs: Any) -> requests.Response :
+        """
+        Send a GET request through the connection pool of the host, when the cache is enabled the request is conditional
+        and a 304 is answered with the stored response (status 200)
+
+            Args
+                url : [string] : the url
+                kwargs : [Any type] : other arguments given to `requests.Session.get()`
+
+            Return
+                [requests.Response] : the response (the last one when all the retries failed)
+
+            Raises
+                [requests.RequestException] : when the connection failed or timed out after all retries
+        """
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        if self.cache is None :
+            return self.send(url, **kwargs)
+
+        response = self.send(url, headers={**self.cache.conditional_headers(url), **kwargs.pop("headers", {})}, **kwargs)
+
+        if response.status_code == 304 :
+            cached_response = self.cache.load(url)
+            
+            # The stored body was removed in the meantime, send the request again without condition
+            if cached_response is None :
+                response = self.send(url, **kwargs)
+            else :
+                return cached_response
+
+        if response.status_code == 200 :
+            self.cache.store(url, response)
+
+        return response
+
+
+    def add_observer(self,
+                     observer: Callable[[str, float, Union[int, None], int], None]) -> None :
+        """
+        Register a function called after each request sent on the network (e.g. to measure the latencies)
+
+            Args
+                observer : [Callable] : called with (url, seconds, status_code, n_bytes), the status code is the one of the last attempt
+                        (see :func:add_retry_observer) or None when the request failed without response, the seconds include the retries
+        """
+
+        self.observers.append(observer)
+
+
+    def add_retry_observer(self,
+                           observer: Callable[[str, Union[int, None]], None]) -> None :
+        """
+        Register a function called for each attempt that urllib3 sends again into a request (e.g. to count the status codes
+        of the retried responses, the observers of :func:add_observer only see the last attempt)
+
+            Args
+                observer : [Callable] : called with (url, status_code), the status code is None when the attempt failed without response
+        """
+
+        self.retry_observers.append(observer)
+
+
+    def send(self,
+             url: str,
+             **kwargs: Any) -> requests.Response :
+        """
+        Send a GET request through the session and notify the observers. With the adaptive concurrency, wait for a slot of the host
+        before sending, and send again the requests rejected with 429/503 (after the 'Retry-After' of the host, or the backoff
+        when the rejection has none)
+
+            Args
+                url : [string] : the url
+                kwargs : [Any type] : other arguments given to `requests.Session.get()`
+
+            Return
+                [requests.Response] : the response (the last rejection when the request was rejected :attr:max_requeues times)
+
+            Raises
+                [requests.RequestException] : when the connection failed or timed out after all retries
+        """
+
+        limiter = self.adaptive.limiter(url) if self.adaptive is not None else None
+
+        for attempt in range(self.max_requeues + 1 if limiter is not None else 1) :
+            if limiter is not None :
+                limiter.acquire()
+
+            start = time.perf_counter()
+            response, n_bytes = None, 0
+            try :
+                response = self.session.get(url, **kwargs)
+                # A streamed body is not read here, its size is the announced one
+                n_bytes = int(response.headers.get("Content-Length", 0)) if kwargs.get("stream") else len(response.content)
+            finally :
+                # Whatever was raised, the slot of the host is given back
+                seconds = time.perf_counter() - start
+                status_code = response.status_code if response is not None else None
+                if limiter is not None :
+                    limiter.release(status_code, seconds, retry_after=self.throttle_pause(response, attempt) if response is not None else None)
+                self.notify(url, seconds, status_code, n_bytes)
+
+            # Rejected : back into the queue of the host
+            if limiter is None or response.status_code not in THROTTLE_STATUS_CODES :
+                break
+
+        return response
+
+
+    @staticmethod
+    def parse_retry_after(value: str) -> Union[float, None] :
+        """
+        Get the seconds of a header 'Retry-After' (seconds or HTTP date)
+
+            Args
+                value : [string] : the value of the header
+
+            Return
+                [float or None] : the seconds to wait, None when the value is invalid
+        """
+
+        try :
+            return float(Retry().parse_retry_after(value))
+        except Exception :
+            return None
+
+
+    def throttle_pause(self,
+                       response: requests.Response,
+                       attempt: int) -> Union[float, None] :
+        """
+        Get the seconds the host is paused for after a response : the 'Retry-After' of a rejection, else the jittered
+        exponential backoff of the retries ('backoff_factor * 2 ** attempt' plus a random delay up to 'backoff_jitter')
+
+            Args
+                response : [requests.Response] : the response
+                attempt : [integer] : the number of times the request was already rejected
+
+            Return
+                [float or None] : the seconds to wait, None when the request was not rejected
+        """
+
+        if response.status_code not in THROTTLE_STATUS_CODES :
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        pause = self.parse_retry_after(retry_after) if retry_after else None
+
+        return pause if pause is not None else self.backoff_factor * 2 ** attempt + random.uniform(0, self.backoff_jitter)
+
+
+    def notify_retry(self,
+                     url: str,
+                     status_code: Union[int, None]) -> None :
+        """
+        Call the retry observers, an observer that fails never stops the request
+        """
+
+        for observer in self.retry_observers :
+            try :
+                observer(url, status_code)
+            except Exception :
+                pass
+
+
+    def notify(self,
+               url: str,
+               seconds: float,
+               status_code: Union[int, None],
+               n_bytes: int) -> None :
+        """
+        Call the observers, an observer that fails never stops the request
+        """
+
+        for observer in self.observers :
+            try :
+                observer(url, seconds, status_code, n_bytes)
+            except Exception :
+                pass
+
+
+    def connection_stats(self) -> Dict[str, Dict[str, int]] :
+        """
+        Count the connections opened and reused for each host since the creation of the transport
+
+            Return
+                [dictionary] : for each host, the number of 'requests', 'new_connections' and 'reused_connections'
+        """
+
+        stats = {}
+        pools = self.adapter.poolmanager.pools
+
+        for key in list(pools.keys()) :
+            pool = pools.get(key)
+
+            if pool is not None :
+                port = f":{key.key_port}" if key.key_port is not None else ''
+                host = stats.setdefault(f"{key.key_scheme}://{key.key_host}{port}", {"requests" : 0, "new_connections" : 0, "reused_connections" : 0})
+                host["requests"] += pool.num_requests
+                host["new_connections"] += pool.num_connections
+                host["reused_connections"] += max(pool.num_requests - pool.num_connections, 0)
+
+        return stats
+
+
+    def close(self) -> None :
+        """
+        Close all the connections kept alive
+        """
+
+        self.session.close()
+
+
+
+def get_shared_transport(configuration: Union[Dict[str, Any], None]=None) -> HTTPTransport :
+    """
+    Get the transport shared by all the extractors of the process, it is created at the first call
+
+        Args
+            configuration : [dictionary or None] : the configuration 'transport', only used at the first call :default:None
+
+        Return
+            [HTTPTransport] : the shared transport
+    """
+
+    global _shared_transport
+
+    with _shared_transport_lock :
+        if _shared_transport is None :
+            _shared_transport = HTTPTransport.from_configuration(configuration)
+
+    return _shared_transport
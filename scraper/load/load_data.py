@@ -1,10 +1,63 @@
+import io
+import os
+import time
+import hashlib
 import logging
-from typing import Any, Union
+import resource
+from datetime import date
+from typing import Any, Dict, Iterable, Union
 import polars as pl
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
 
 
+# Columns of the variants table and their types into the database
+VARIANT_COLUMNS = {
+    "product_url" : "TEXT",
+    "product_id" : "BIGINT",
+    "product_sku" : "TEXT",
+    "product_name" : "TEXT",
+    "product_color" : "TEXT",
+    "product_size" : "TEXT",
+    "product_image" : "TEXT",
+    "product_description" : "TEXT",
+    "product_net_price" : "BIGINT",
+    "product_gross_price" : "BIGINT",
+    "product_stock_status" : "BOOLEAN",
+    "product_barcode" : "TEXT"
+}
+
+# Types of the variants into the intermediate files, so that the schema is never inferred from the first rows
+# (prices are in cents like into the '<product>.js' endpoint, the barcode may be null)
+VARIANT_SCHEMA = {
+    "product_url" : pl.Utf8,
+    "product_id" : pl.Int64,
+    "product_sku" : pl.Utf8,
+    "product_name" : pl.Utf8,
+    "product_color" : pl.Utf8,
+    "product_size" : pl.Utf8,
+    "product_image" : pl.Utf8,
+    "product_description" : pl.Utf8,
+    "product_net_price" : pl.Int64,
+    "product_gross_price" : pl.Int64,
+    "product_stock_status" : pl.Boolean,
+    "product_barcode" : pl.Utf8
+}
+
+# Key of a variant into the tables : the same variant has one row per locale (see `records.localize_variants`), with the url of the locale
+VARIANT_KEY = ("product_id", "product_url")
+
+# Ways of loading the data : the table is recreated on each run (with pandas or streamed with COPY), only the changed rows are written,
+# or the rows of the day are added to one history table partitioned by date
+LOAD_MODES = ("replace", "copy", "incremental", "history")
+
+# Number of rows sent by each insert into the history table
+HISTORY_CHUNK_SIZE = 10_000
+
+# Number of rows sent by each COPY
+COPY_CHUNK_SIZE = 50_000
+
+
 
 # ==================================================================================================================================================================== #
 # ======================================================================= KoroshiDataLoader ======================================================================= #
@@ -16,7 +69,9 @@ class KoroshiDataLoader() :
                  connection_url: str,
                  table: str,
                  file_log: str,
-                 schema: Union[str, None]=None) -> None :
+                 schema: Union[str, None]=None,
+                 mode: str="replace",
+                 snapshot_date: Union[date, None]=None) -> None :
         """
         Provide some feature to connect and insert data into a database (in this case, a PostgreSQL)
             
@@ -27,11 +82,22 @@ class KoroshiDataLoader() :
                 schema : [string or None] : the schema which contains the table
                         if None, that means the schema is public or default schema
                         :default:None
+                mode : [string] : 'replace' drops and recreates the table,
+                        'copy' drops and recreates the table with typed columns for :func:copy_data,
+                        'incremental' keeps the table and only inserts or updates the variants that changed (see :func:upsert_data),
+                        'history' keeps one row per variant, per locale and per day into a table partitioned by month (see :func:insert_history_batches)
+                        :default:'replace'
+                snapshot_date : [date or None] : with the mode 'history', the day of the rows loaded, if None today :default:None
 
             Raises
                 [SQLAlchemyError] : when an error occurred during connecting to the database
+
+            Assertions
+                mode : raise an error when the mode is not one of 'replace', 'copy', 'incremental' or 'history'
         """
 
+        assert mode in LOAD_MODES, f"Unknown load mode '{mode}', expected one of {LOAD_MODES}"
+
         # Set the log management
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.setLevel(logging.INFO)
@@ -42,14 +108,42 @@ class KoroshiDataLoader() :
         # Table and schema of the database
         self.table = table
         self.schema = schema
+        self.mode = mode
+        self.snapshot_date = snapshot_date or date.today()
+        self.qualified_table = f"{self.schema}.{self.table}" if self.schema else self.table
+        self.db_engine = None
 
         try :
             # Initialize the database connection
             self.db_engine = create_engine(connection_url)
-            with self.db_engine.connect() as connection :
-                connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.schema};"))
-                connection.execute(text(f"DROP TABLE IF EXISTS {self.schema}.{self.table};"))
-                connection.execute(text(f"CREATE TABLE IF NOT EXISTS {self.schema}.{self.table}();"))
+            with self.db_engine.begin() as connection :
+                if self.schema :
+                    connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.schema};"))
+
+                columns = ', '.join(f"{column} {sql_type}" for column, sql_type in VARIANT_COLUMNS.items())
+
+                # The table of the previous runs is kept, with the hash of each variant to detect the changes
+                if self.mode == "incremental" :
+                    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {self.qualified_table} ({columns}, "
+                                            f"content_hash TEXT NOT NULL, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+                                            f"PRIMARY KEY ({', '.join(VARIANT_KEY)}));"))
+                # One table for all the days, the rows of a variant are found by the indexes without reading the other days
+                elif self.mode == "history" :
+                    partitioned = "PARTITION BY RANGE (snapshot_date)" if self.is_postgresql else ""
+                    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {self.qualified_table} ({columns}, snapshot_date DATE NOT NULL, "
+                                            f"PRIMARY KEY ({', '.join(VARIANT_KEY)}, snapshot_date)) {partitioned};"))
+                    for column in ("product_sku", "snapshot_date") :
+                        index_columns = f"{column}, snapshot_date" if column != "snapshot_date" else column
+                        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {self.table}_{column}_idx ON {self.qualified_table} ({index_columns});"))
+
+                # COPY needs the columns and their types
+                elif self.mode == "copy" :
+                    connection.execute(text(f"DROP TABLE IF EXISTS {self.qualified_table};"))
+                    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {self.qualified_table} ({columns});"))
+
+                else :
+                    connection.execute(text(f"DROP TABLE IF EXISTS {self.qualified_table};"))
+                    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {self.qualified_table}();"))
                 self.logger.info("Database initialized")
             self.logger.info("DataLoader initialized")
 
@@ -57,13 +151,54 @@ class KoroshiDataLoader() :
             self.logger.error(f"An error occurred when trying to connet to database : {e}")
 
     
+    @property
+    def is_postgresql(self) -> bool :
+        """
+        Check if the database is a PostgreSQL (the other databases, e.g. SQLite for the tests, have no partitions)
+        """
+
+        return self.db_engine is not None and self.db_engine.dialect.name == "postgresql"
+
+
+    def partition_name(self,
+                       day: date) -> str :
+        """
+        Get the name of the partition of the history table for the month of a day (e.g. '<table>_2026_10')
+        """
+
+        return f"{self.table}_{day.year}_{day.month:02d}"
+
+
+    def create_partition(self,
+                         connection: Any,
+                         day: date) -> None :
+        """
+        Create the partition of the history table for the month of a day when it does not exist (PostgreSQL only)
+            
+            Args
+                connection : [Any type] : an open connection of the engine
+                day : [date] : a day of the month
+        """
+
+        if not self.is_postgresql :
+            return
+
+        start = day.replace(day=1)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        partition = f"{self.schema}.{self.partition_name(day)}" if self.schema else self.partition_name(day)
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {self.qualified_table} "
+                                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}');"))
+
+
     def insert_data(self,
-                    dataframe: pl.DataFrame) -> None :
+                    dataframe: pl.DataFrame,
+                    if_exists: str="replace") -> None :
         """
         Insert data into the database
             
             Args
                 dataframe : [pl.DataFrame] : the dataframe that contains data
+                if_exists : [string] : 'replace' to recreate the table, 'append' to add the rows to the table :default:'replace'
         """
 
         # Converte to a pandas dataframe to have the `to_sql()` class method
@@ -74,12 +209,410 @@ class KoroshiDataLoader() :
             df.to_sql(name=self.table,
                       schema=self.schema, 
                       con=self.db_engine,
-                      if_exists="replace",
+                      if_exists=if_exists,
                       index=False)
                 
             self.logger.info(f"Data injected into the table '{self.schema}.{self.table}'")
 
 
+    def copy_data(self,
+                  dataframe: pl.DataFrame,
+                  chunk_size: int=COPY_CHUNK_SIZE) -> Dict[str, float] :
+        """
+        Stream the data into the table with `COPY ... FROM STDIN` (mode 'copy'), see :func:copy_batches
+            
+            Args
+                dataframe : [pl.DataFrame] : the dataframe that contains data
+                chunk_size : [integer] : the number of rows of each COPY :default:50 000
+
+            Return
+                [dictionary] : the number of 'rows', 'seconds', 'rows_per_second' and the 'peak_rss_mb' of the process
+        """
+
+        return self.copy_batches(batches=[dataframe], chunk_size=chunk_size)
+
+
+    def copy_batches(self,
+                     batches: Iterable[pl.DataFrame],
+                     chunk_size: int=COPY_CHUNK_SIZE) -> Dict[str, float] :
+        """
+        Stream the data into the table with `COPY ... FROM STDIN` (mode 'copy'), without pandas : each batch is sent
+        by chunks of :param:chunk_size rows written as CSV, so only one chunk is serialized at a time. All the chunks are
+        committed together
+            
+            Args
+                batches : [iterable of pl.DataFrame] : the data, e.g. the batches of a file read lazily
+                chunk_size : [integer] : the number of rows of each COPY :default:50 000
+
+            Return
+                [dictionary] : the number of 'rows', 'seconds', 'rows_per_second' and the 'peak_rss_mb' of the process
+
+            Raises
+                [Exception] : when an error occurred during the COPY, nothing is written
+        """
+
+        # The output data
+        report = {"rows" : 0, "seconds" : 0.0, "rows_per_second" : 0.0, "peak_rss_mb" : 0.0}
+
+        if self.db_engine is None :
+            return report
+
+        columns = list(VARIANT_COLUMNS)
+        copy_sql = f"COPY {self.qualified_table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        start = time.perf_counter()
+
+        connection = self.db_engine.raw_connection()
+        try :
+            with connection.cursor() as cursor :
+                for batch in batches :
+                    for chunk in batch.select(columns).iter_slices(n_rows=chunk_size) :
+                        # An empty field is NULL, an empty string is written '""'
+                        buffer = io.BytesIO()
+                        chunk.write_csv(buffer, include_header=False)
+                        buffer.seek(0)
+                        cursor.copy_expert(copy_sql, buffer)
+                        report["rows"] += chunk.height
+            connection.commit()
+
+        except Exception as e :
+            connection.rollback()
+            self.logger.error(f"An error occurred when copying into the table '{self.qualified_table}', nothing written : {e}")
+            raise
+
+        finally :
+            connection.close()
+
+        report["seconds"] = time.perf_counter() - start
+        report["rows_per_second"] = report["rows"] / report["seconds"] if report["seconds"] else 0.0
+        # `ru_maxrss` is in kilobytes on Linux
+        report["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.logger.info(f"Data copied into the table '{self.qualified_table}' : ({report['rows']}) rows, "
+                         f"({report['rows_per_second']:.0f}) rows/s, peak RSS ({report['peak_rss_mb']:.1f}) MB")
+
+        return report
+
+
+    @staticmethod
+    def content_hash(dataframe: pl.DataFrame) -> pl.Series :
+        """
+        Compute a hash of the content of each row, two rows with the same values have the same hash
+            
+            Args
+                dataframe : [pl.DataFrame] : the variants
+
+            Return
+                [pl.Series] : the md5 of each row, named 'content_hash'
+        """
+
+        rows = dataframe.select(
+            pl.concat_str([pl.col(column).cast(pl.Utf8).fill_null("\x00") for column in VARIANT_COLUMNS], separator="\x1f")
+        ).to_series()
+
+        return pl.Series("content_hash", [hashlib.md5(row.encode()).hexdigest() for row in rows], dtype=pl.Utf8)
+
+
+    def upsert_data(self,
+                    dataframe: pl.DataFrame) -> Dict[str, int] :
+        """
+        Insert the new variants and update the changed ones into the table (mode 'incremental'), see :func:upsert_batches
+            
+            Args
+                dataframe : [pl.DataFrame] : the dataframe that contains data
+
+            Return
+                [dictionary] : the number of 'inserted', 'updated' and 'unchanged' rows
+        """
+
+        return self.upsert_batches(batches=[dataframe])
+
+
+    def upsert_batches(self,
+                       batches: Iterable[pl.DataFrame]) -> Dict[str, int] :
+        """
+        Insert the new variants and update the changed ones into the table (mode 'incremental'), keyed by :data:VARIANT_KEY.
+        The rows whose content hash is the same than into the table are not written. All the writes are done in one transaction
+            
+            Args
+                batches : [iterable of pl.DataFrame] : the data, e.g. the batches of a file read lazily
+
+            Return
+                [dictionary] : the number of 'inserted', 'updated' and 'unchanged' rows
+
+            Raises
+                [SQLAlchemyError] : when an error occurred during writing, nothing is written
+        """
+
+        # The output data
+        counts = {"inserted" : 0, "updated" : 0, "unchanged" : 0}
+
+        if self.db_engine is None :
+            return counts
+
+        columns = [*VARIANT_COLUMNS, "content_hash"]
+        key = list(VARIANT_KEY)
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column not in VARIANT_KEY)
+        upsert_sql = text(f"INSERT INTO {self.qualified_table} ({', '.join(columns)}) "
+                          f"VALUES ({', '.join(f':{column}' for column in columns)}) "
+                          f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP;")
+
+        try :
+            with self.db_engine.begin() as connection :
+                # Hash of the variants already into the table
+                rows = connection.execute(text(f"SELECT {', '.join(key)}, content_hash FROM {self.qualified_table};")).fetchall()
+                existing = pl.DataFrame(rows, schema={**{column : VARIANT_SCHEMA[column] for column in key}, "content_hash" : pl.Utf8}, orient="row")
+
+                for batch in batches :
+                    # One row per variant and per locale, the last one wins
+                    variants = batch.select(list(VARIANT_COLUMNS)).unique(subset=key, keep="last", maintain_order=True)
+                    variants = variants.with_columns(self.content_hash(variants))
+
+                    changed = variants.join(existing, on=[*key, "content_hash"], how="anti")
+                    updated = changed.join(existing, on=key, how="semi").height
+                    counts["updated"] += updated
+                    counts["inserted"] += changed.height - updated
+                    counts["unchanged"] += variants.height - changed.height
+
+                    if changed.height :
+                        connection.execute(upsert_sql, changed.to_dicts())
+                        # The next batches see the rows written by this one
+                        existing = pl.concat([existing.join(changed, on=key, how="anti"),
+                                              changed.select([*key, "content_hash"])])
+
+            self.logger.info(f"Data upserted into the table '{self.qualified_table}' : {counts}")
+
+        except SQLAlchemyError as e :
+            self.logger.error(f"An error occurred when upserting into the table '{self.qualified_table}', nothing written : {e}")
+            raise
+
+        return counts
+
+
+    def insert_history_batches(self,
+                               batches: Iterable[pl.DataFrame]) -> Dict[str, int] :
+        """
+        Add the variants of the day :attr:snapshot_date to the history table (mode 'history'), the partition of the month is created
+        when needed. The rows already loaded for this day are replaced, so the load of a day can be run again. All the writes are done
+        in one transaction
+            
+            Args
+                batches : [iterable of pl.DataFrame] : the data, e.g. the batches of a file read lazily
+
+            Return
+                [dictionary] : the number of rows 'inserted' and of rows of the day 'replaced'
+
+            Raises
+                [SQLAlchemyError] : when an error occurred during writing, nothing is written
+        """
+
+        # The output data
+        counts = {"inserted" : 0, "replaced" : 0}
+
+        if self.db_engine is None :
+            return counts
+
+        columns = [*VARIANT_COLUMNS, "snapshot_date"]
+        insert_sql = text(f"INSERT INTO {self.qualified_table} ({', '.join(columns)}) VALUES ({', '.join(f':{column}' for column in columns)});")
+        day = self.snapshot_date.isoformat()
+
+        try :
+            with self.db_engine.begin() as connection :
+                self.create_partition(connection=connection, day=self.snapshot_date)
+                counts["replaced"] = connection.execute(text(f"DELETE FROM {self.qualified_table} WHERE snapshot_date = :day;"), {"day" : day}).rowcount
+
+                for batch in batches :
+                    # One row per variant, per locale and per day, the last one wins
+                    variants = (batch.select(list(VARIANT_COLUMNS))
+                                     .unique(subset=list(VARIANT_KEY), keep="last", maintain_order=True)
+                                     .with_columns(pl.lit(day).alias("snapshot_date")))
+                    for chunk in variants.iter_slices(n_rows=HISTORY_CHUNK_SIZE) :
+                        connection.execute(insert_sql, chunk.to_dicts())
+                        counts["inserted"] += chunk.height
+
+            self.logger.info(f"Data of the day '{day}' added to the history table '{self.qualified_table}' : {counts}")
+
+        except SQLAlchemyError as e :
+            self.logger.error(f"An error occurred when inserting into the history table '{self.qualified_table}', nothing written : {e}")
+            raise
+
+        return counts
+
+
+    def price_changes(self,
+                      start_date: date,
+                      end_date: date,
+                      product_id: Union[int, None]=None,
+                      product_sku: Union[str, None]=None) -> pl.DataFrame :
+        """
+        Get the price and stock changes of the variants between two days from the history table (mode 'history') : each row is a day
+        whose net price, gross price or stock status differs from the previous day the variant was seen into the same locale (url).
+        Only the partitions of the period (and the day before it) are read, and the indexes are used when a variant is given
+            
+            Args
+                start_date : [date] : the first day of the period
+                end_date : [date] : the last day of the period
+                product_id : [integer or None] : if not None, only the changes of this variant :default:None
+                product_sku : [string or None] : if not None, only the changes of the variants of this SKU :default:None
+
+            Return
+                [pl.DataFrame] : 'product_id', 'product_url', 'product_sku', 'previous_date', 'snapshot_date', the 'previous_' and new
+                        'net_price', 'gross_price' and 'stock_status', ordered by variant, locale and day, empty when there is no connection
+
+            Raises
+                [SQLAlchemyError] : when the history table cannot be read
+        """
+
+        filters = ''.join(f" AND {column} = :{column}" for column, value in (("product_id", product_id), ("product_sku", product_sku)) if value is not None)
+        parameters = {"product_id" : product_id, "product_sku" : product_sku, "start" : start_date.isoformat(), "end" : end_date.isoformat()}
+        differ = "IS DISTINCT FROM" if self.is_postgresql else "IS NOT"
+        schema = {"product_id" : pl.Int64, "product_url" : pl.Utf8, "product_sku" : pl.Utf8, "previous_date" : pl.Utf8, "snapshot_date" : pl.Utf8,
+                  "previous_net_price" : pl.Int64, "net_price" : pl.Int64, "previous_gross_price" : pl.Int64, "gross_price" : pl.Int64,
+                  "previous_stock_status" : pl.Boolean, "stock_status" : pl.Boolean}
+
+        if self.db_engine is None :
+            self.logger.error(f"Cannot read the price changes of the table '{self.qualified_table}', there is no connection to the database")
+            return pl.DataFrame(schema={**schema, "previous_date" : pl.Date, "snapshot_date" : pl.Date})
+
+        with self.db_engine.connect() as connection :
+            # The day before the period gives the state at its start
+            previous_day = connection.execute(text(f"SELECT MAX(snapshot_date) FROM {self.qualified_table} WHERE snapshot_date < :start{filters};"),
+                                              parameters).scalar()
+            parameters["first"] = str(previous_day) if previous_day is not None else parameters["start"]
+
+            rows = connection.execute(text(
+                f"SELECT * FROM ("
+                f"SELECT product_id, product_url, product_sku, LAG(snapshot_date) OVER w AS previous_date, snapshot_date, "
+                f"LAG(product_net_price) OVER w AS previous_net_price, product_net_price AS net_price, "
+                f"LAG(product_gross_price) OVER w AS previous_gross_price, product_gross_price AS gross_price, "
+                f"LAG(product_stock_status) OVER w AS previous_stock_status, product_stock_status AS stock_status "
+                f"FROM {self.qualified_table} WHERE snapshot_date >= :first AND snapshot_date <= :end{filters} "
+                f"WINDOW w AS (PARTITION BY {', '.join(VARIANT_KEY)} ORDER BY snapshot_date)"
+                f") AS history "
+                f"WHERE snapshot_date >= :start AND previous_date IS NOT NULL "
+                f"AND (net_price {differ} previous_net_price OR gross_price {differ} previous_gross_price OR stock_status {differ} previous_stock_status) "
+                f"ORDER BY {', '.join(VARIANT_KEY)}, snapshot_date;"), parameters).fetchall()
+
+        # The days are 'date' objects with PostgreSQL and strings with SQLite
+        rows = [(*row[:3], str(row[3]), str(row[4]), *row[5:]) for row in rows]
+
+        return pl.DataFrame(rows, schema=schema, orient="row", strict=False).with_columns(pl.col("previous_date", "snapshot_date").str.to_date())
+
+
+    def load_batches(self,
+                     batches: Iterable[pl.DataFrame]) -> None :
+        """
+        Load the data into the table with the way of the mode of the loader, one batch at a time
+            
+            Args
+                batches : [iterable of pl.DataFrame] : the data, e.g. the batches of a file read lazily
+        """
+
+        if self.mode == "incremental" :
+            self.upsert_batches(batches=batches)
+
+        elif self.mode == "history" :
+            self.insert_history_batches(batches=batches)
+
+        elif self.mode == "copy" :
+            self.copy_batches(batches=batches)
+
+        else :
+            # The first batch recreates the table, the next ones are added to it
+            for n_batch, batch in enumerate(batches) :
+                self.insert_data(dataframe=batch,
+                                 if_exists="replace" if n_batch == 0 else "append")
+
+
+    def scan_ndjson(self,
+                    fp: str) -> Union[pl.LazyFrame, None] :
+        """
+        Read lazily a newline-delimited json file of variants : nothing is read until the frame is collected,
+        and it can be collected by batches (`collect_batches()`) to keep the memory flat whatever the size of the file
+            
+            Args
+                fp : [string] : the file path where the data was saved
+
+            Return
+                [pl.LazyFrame or None] : the variants with an id, with the types of :data:VARIANT_SCHEMA, None when the file cannot be read
+
+            Raises
+                [FileNotFoundError] : when the file at the location :param:fp is missing
+                [Exception] : for other exceptions
+        """
+
+        # The output data
+        result = None
+
+        try :
+            # The file is only opened when the frame is collected, check it now
+            if not os.path.isfile(fp) :
+                raise FileNotFoundError(fp)
+
+            # The variants without id cannot be loaded, the filter is applied while reading the file
+            result = pl.scan_ndjson(fp, schema=VARIANT_SCHEMA).filter(pl.col("product_id").is_not_null())
+            self.logger.info(f"Scanning the ndjson file '{fp}'")
+
+        except FileNotFoundError :
+            self.logger.error(f"Cannot find the ndjson file in location : '{fp}'")
+
+        except Exception as error :
+            self.logger.error(f"An error occured during scanning the ndjson file '{fp}' : {error}")
+
+        finally :
+            return result
+
+
+    def scan_parquet(self,
+                     fp: str) -> Union[pl.LazyFrame, None] :
+        """
+        Read lazily a parquet file of variants (see `utilities.ndjson_to_parquet`) : the types are stored into the file,
+        nothing is inferred nor converted, and the local file is memory-mapped instead of being copied into memory
+            
+            Args
+                fp : [string] : the file path where the data was saved
+
+            Return
+                [pl.LazyFrame or None] : the variants with an id, None when the file cannot be read
+
+            Raises
+                [FileNotFoundError] : when the file at the location :param:fp is missing
+                [Exception] : for other exceptions
+        """
+
+        # The output data
+        result = None
+
+        try :
+            if not os.path.isfile(fp) :
+                raise FileNotFoundError(fp)
+
+            result = pl.scan_parquet(fp).select(list(VARIANT_SCHEMA)).filter(pl.col("product_id").is_not_null())
+            self.logger.info(f"Scanning the parquet file '{fp}'")
+
+        except FileNotFoundError :
+            self.logger.error(f"Cannot find the parquet file in location : '{fp}'")
+
+        except Exception as error :
+            self.logger.error(f"An error occured during scanning the parquet file '{fp}' : {error}")
+
+        finally :
+            return result
+
+
+    def scan_data(self,
+                  fp: str) -> Union[pl.LazyFrame, None] :
+        """
+        Read lazily the variants of a parquet file ('.parquet') or of a ndjson file (other extensions)
+            
+            Args
+                fp : [string] : the file path where the data was saved
+
+            Return
+                [pl.LazyFrame or None] : the variants with an id, None when the file cannot be read
+        """
+
+        return self.scan_parquet(fp=fp) if fp.endswith(".parquet") else self.scan_ndjson(fp=fp)
+
+
     def convert_json_to_dataframe(self,
                   fp: Any) -> Union[pl.DataFrame, None] :
         """
@@ -0,0 +1,160 @@
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+import polars as pl
+
+from .load_data import VARIANT_SCHEMA, VARIANT_KEY
+
+
+# Fields without which a variant is not loaded
+REQUIRED_FIELDS = ("product_url", "product_id", "product_name", "product_net_price")
+
+# Highest price accepted, in cents like the prices of the '<product>.js' endpoint
+MAX_PRICE = 100_000_000
+
+# GTIN barcodes : EAN-8, UPC-A (12 digits), EAN-13 and GTIN-14
+BARCODE_PATTERN = r"^(\d{8}|\d{12,14})$"
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= VariantValidator ======================================================================= #
+# ==================================================================================================================================================================== #
+class VariantValidator() :
+
+
+    def __init__(self,
+                 required: Iterable[str]=REQUIRED_FIELDS,
+                 max_price: int=MAX_PRICE,
+                 barcode_pattern: str=BARCODE_PATTERN) -> None :
+        """
+        Check the variants before they are loaded, a whole batch at a time with Polars expressions (no object per row) :
+        required fields, prices between 0 and :param:max_price with the gross price not below the net price, format of the barcode
+        and variants already seen (same id and url, into the batch or into the previous batches : the locales of a variant
+        share its id with different urls). The rows that fail a rule are split from the batch
+        with the list of their reasons, so that they can be saved into a quarantine file instead of the table
+        Constructor : build the rules
+
+            Args
+                required : [iterable of string] : the columns that cannot be null (nor empty for the texts) :default:REQUIRED_FIELDS
+                max_price : [integer] : the highest net or gross price accepted, in cents :default:MAX_PRICE
+                barcode_pattern : [string] : the regular expression of a valid barcode, a null or empty barcode is accepted
+                        :default:BARCODE_PATTERN
+
+            Assertions
+                required : raise an error when a column is not one of the variants
+        """
+
+        assert set(required) <= set(VARIANT_SCHEMA), f"Unknown required fields {set(required) - set(VARIANT_SCHEMA)}, please check"
+
+        self.required = tuple(required)
+        self.max_price = max_price
+        self.barcode_pattern = barcode_pattern
+        # Keys of the variants of the previous batches, the first variant of a key is kept
+        self.seen_keys = pl.DataFrame(schema={column : VARIANT_SCHEMA[column] for column in VARIANT_KEY}).to_struct("key")
+        self.stats = {"rows" : 0, "valid" : 0, "quarantined" : 0, "seconds" : 0.0, "reasons" : {}}
+
+
+    def rules(self) -> List[Tuple[str, pl.Expr]] :
+        """
+        Get the rules of the validation, each expression is True for the rows that fail the rule
+
+            Return
+                [list of tuple] : the reason and the expression of each rule
+        """
+
+        rules = []
+
+        for column in self.required :
+            missing = pl.col(column).is_null()
+            if VARIANT_SCHEMA[column] == pl.Utf8 :
+                missing = missing | (pl.col(column).str.strip_chars() == "")
+            rules.append((f"missing_{column}", missing))
+
+        net_price, gross_price, barcode = pl.col("product_net_price"), pl.col("product_gross_price"), pl.col("product_barcode")
+        key = pl.struct(VARIANT_KEY)
+
+        rules += [
+            ("net_price_out_of_range", ~net_price.is_between(0, self.max_price)),
+            # The gross price is only set for the discounted variants
+            ("gross_price_out_of_range", ~gross_price.is_between(0, self.max_price)),
+            ("gross_price_below_net_price", gross_price < net_price),
+            ("invalid_barcode", (barcode != "") & ~barcode.str.contains(self.barcode_pattern)),
+            ("duplicate_id", pl.col("product_id").is_not_null() & (key.is_in(self.seen_keys.implode()) | ~key.is_first_distinct()))
+        ]
+
+        # A comparison with a null value is null, the rule is not failed
+        return [(reason, rule.fill_null(False)) for reason, rule in rules]
+
+
+    def validate(self,
+                 batch: pl.DataFrame) -> Tuple[pl.DataFrame, pl.DataFrame] :
+        """
+        Split a batch of variants into the valid rows and the rows that fail at least one rule
+
+            Args
+                batch : [pl.DataFrame] : the variants, with the columns of :data:VARIANT_SCHEMA
+
+            Return
+                [tuple] : the valid variants, and the invalid ones with the column 'reasons' (list of the failed rules)
+        """
+
+        start = time.perf_counter()
+        rules = self.rules()
+        reasons = [reason for reason, _ in rules]
+
+        flags = batch.select([rule.alias(reason) for reason, rule in rules])
+        invalid = flags.select(pl.any_horizontal(reasons)).to_series()
+
+        valid = batch.filter(~invalid)
+        quarantined = batch.filter(invalid).with_columns(
+            flags.filter(invalid)
+            .select(pl.concat_list([pl.when(pl.col(reason)).then(pl.lit(reason)) for reason in reasons]).list.drop_nulls().alias("reasons"))
+            .to_series()
+        )
+
+        # The keys of this batch are duplicates into the next ones
+        self.seen_keys = pl.concat([self.seen_keys, batch.filter(pl.col("product_id").is_not_null()).select(pl.struct(VARIANT_KEY).alias("key")).to_series()]).unique()
+
+        self.stats["rows"] += batch.height
+        self.stats["valid"] += valid.height
+        self.stats["quarantined"] += quarantined.height
+        self.stats["seconds"] += time.perf_counter() - start
+        for reason, count in flags.sum().row(0, named=True).items() :
+            if count :
+                self.stats["reasons"][reason] = self.stats["reasons"].get(reason, 0) + count
+
+        return valid, quarantined
+
+
+    def validate_batches(self,
+                         batches: Iterable[pl.DataFrame],
+                         quarantine: Callable[[pl.DataFrame], Any]) -> Iterator[pl.DataFrame] :
+        """
+        Validate the batches while they are loaded : the valid rows of each batch are yielded to the loader,
+        the invalid ones are given to :param:quarantine
+
+            Args
+                batches : [iterable of pl.DataFrame] : the variants, e.g. the batches of a file read lazily
+                quarantine : [callable] : called with the invalid rows of each batch that has some, e.g. `NDJSONWriter.write_frame`
+
+            Return
+                [iterator of pl.DataFrame] : the valid rows of each batch
+        """
+
+        for batch in batches :
+            valid, quarantined = self.validate(batch=batch)
+            if quarantined.height :
+                quarantine(quarantined)
+            yield valid
+
+
+    def get_stats(self) -> Dict[str, Union[int, float, Dict[str, int]]] :
+        """
+        Get the counters of the validation
+
+            Return
+                [dictionary] : 'rows', 'valid', 'quarantined', the count of each failed rule ('reasons'), 'seconds' and 'rows_per_second'
+        """
+
+        return {**self.stats, "reasons" : dict(self.stats["reasons"]),
+                "rows_per_second" : round(self.stats["rows"] / self.stats["seconds"]) if self.stats["seconds"] else None}
@@ -1,79 +1,207 @@
+import time
+STARTED_AT = time.perf_counter()
+
 import os
+import sys
+import queue
+import socket
 import logging
+import argparse
+import importlib
+import threading
+import multiprocessing
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Union
 from dotenv import load_dotenv
 
-from utils.utilities import read_json, to_json
-from extract.extract_data import KoroshiProductsListExtractor, KoroshiProductDataExtractor
-from load.load_data import KoroshiDataLoader
+from utils.metrics import PipelineMetrics
+from utils.work_queue import WorkQueue, run_queue_worker
+from utils.utilities import read_json, to_json, read_ndjson, ndjson_to_parquet, canonicalize_product_url, dedupe_product_urls, NDJSONWriter, RunManifest
+
+# The libraries of the stages (requests and BeautifulSoup to extract, Polars and SQLAlchemy to load) are imported
+# by the stages when they run, see :data:STAGE_MODULES
+if TYPE_CHECKING :
+    import polars as pl
+    from load.load_data import KoroshiDataLoader
+    from load.validation import VariantValidator
+
+
+
+# Modules imported by each command of the CLI, the other stages' libraries are never imported
+STAGE_MODULES = {
+    "list" : ("extract.extract_data",),
+    "fetch" : ("extract.extract_data",),
+    "load" : ("load.load_data", "load.validation"),
+    "run" : ("extract.extract_data", "load.load_data", "load.validation")
+}
+
+# Seconds spent importing this module and the modules of the stages, printed at the end of the command
+IMPORT_TIMES = {"main" : time.perf_counter() - STARTED_AT}
+
+
+
+# ============================================================================= #
+# ============================== CHECKPOINTS ================================== #
+# ============================================================================= #
+def open_output(fp: str,
+                stage: str,
+                manifest: Union[RunManifest, None]) -> NDJSONWriter :
+    """
+    Open the output file of a stage, after the output already saved by a stopped run when there is a manifest
+        
+        Args
+            fp : [string] : the path of the output file
+            stage : [string] : the stage whose keys are recorded into the manifest
+            manifest : [RunManifest or None] : the manifest of the run, if None the file is started again
+
+        Return
+            [NDJSONWriter] : the writer of the output file
+    """
+
+    return NDJSONWriter(fp=fp) if manifest is None else manifest.open_output(stage=stage, fp=fp)
+
+
+def save_output(writer: NDJSONWriter,
+                objs: Iterable[Any],
+                stage: str,
+                key: Any,
+                manifest: Union[RunManifest, None]) -> None :
+    """
+    Write the output of a key (a page, a product) and record the key as done into the manifest
+        
+        Args
+            writer : [NDJSONWriter] : the writer of the output file
+            objs : [iterable of Any type] : the output of the key
+            stage : [string] : the stage of the key
+            key : [Any type] : the key (e.g. the page number, the product url)
+            manifest : [RunManifest or None] : the manifest of the run, if None nothing is recorded
+    """
+
+    writer.write_many(objs)
 
+    if manifest is not None :
+        manifest.mark_done(stage=stage, key=key, offset=writer.offset)
 
 
 # ============================================================================= #
 # ============================== PRODUCTS LIST ================================ #
 # ============================================================================= #
+def get_crawl_roots(configuration: Any) -> List[str] :
+    """
+    Get the listing pages where the crawl starts : the list 'crawl-roots' (e.g. a collection for each locale), or the 'main-url'
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+
+        Return
+            [list of string] : the urls of the first page of each root, without duplicates
+    """
+
+    return list(dict.fromkeys(configuration.get("crawl-roots") or [configuration["main-url"]]))
+
+
+def crawl_roots(scraper: Any,
+                crawl_root: Callable[[str], Any],
+                roots: List[str]) -> None :
+    """
+    Explore the crawl roots at the same time, a root that fails does not stop the others but the crawl is not complete
+        
+        Args
+            scraper : [KoroshiProductsListExtractor] : the extractor whose thread pool explores the roots
+            crawl_root : [Callable] : called with the url of each root, explores all its pages
+            roots : [list of string] : the urls of the first page of each root (see :func:get_crawl_roots)
+
+        Raises
+            [RuntimeError] : when the crawl of at least one root failed, once the other roots are explored
+    """
+
+    def explore(root: str) -> bool :
+        crawl_root(root)
+        return True
+
+    # A failed call gives None
+    results = scraper.map_concurrently(function=explore, items=roots, concurrency=len(roots))
+    failed_roots = [root for root, result in zip(roots, results) if result is None]
+
+    if failed_roots :
+        raise RuntimeError(f"The crawl of ({len(failed_roots)}) roots failed, the products list is not complete : {failed_roots}")
+
+
+def page_key(root: str,
+             n_page: int) -> str :
+    """
+    Get the key of a listing page into the manifest, the pages of each crawl root are recorded apart
+        
+        Args
+            root : [string] : the url of the first page of the root
+            n_page : [integer] : the page number
+
+        Return
+            [string] : the key '<root>#<n_page>'
+    """
+
+    return f"{root}#{n_page}"
+
+
 def get_all_products_list(configuration: Any,
-                          log_file: str) -> str :
+                          log_file: str,
+                          manifest: Union[RunManifest, None]=None,
+                          output_fp: Union[str, None]=None) -> str :
     """
-    Extract products' link, save into a json file and return the path of this file
+    Extract products' link, save them into a ndjson file (one link per line, written page after page) and return the path of this file.
+    The crawl roots (see :func:get_crawl_roots) are explored at the same time, their links are written into the same file.
+    When a root fails, an error is raised once the other roots are explored and the stage is not marked as done
         
         Args
             configuration : [Any type] : object data that contains configuration how to extract data
+                    ('crawl-roots', 'products-list.pagination.max-pages' and 'products-list.pagination.prefetch-window' are optional)
             log_file : [string] : the file path where log will be saved
+            manifest : [RunManifest or None] : the manifest of the run, the pages already explored by a stopped run are skipped
+                    :default:None
+            output_fp : [string or None] : the path of the ndjson file, if None 'json/products_list_<date>.ndjson' :default:None
 
         Return
             [string] : file path where data is stored
 
     """
 
-    # Variable that contains all products' link
-    all_products = []
+    output_fp = output_fp or os.path.join(os.path.dirname(__file__),
+                                          f'json/products_list_{datetime.now().date()}.ndjson')
+
+    if manifest is not None and manifest.is_stage_done("products-list") :
+        logging.info(f"The products list was already extracted into '{output_fp}', skipping")
+        return output_fp
+
+    from extract.extract_data import KoroshiProductsListExtractor
 
     koroshi_products_list_scraper = KoroshiProductsListExtractor(configuration=configuration,
                                                                  file_log=log_file)
-    page = 1
-
-    # Loop to extract links along url
-    while True :
-
-        # /!\ A enlever ce bout de code si necessaire /!\
-        # Pour le test, on va se limiter à faire 2 pagination
-        if page > 3 :
-            logging.warning(f"Aborting pagination")
-            break
-        # /!\
-
-        # First url
-        url = configuration["main-url"]
-        
-        # Get next page url
-        if page > 1 :
-            url = koroshi_products_list_scraper.next_page(url=url,
-                                                          n_page=page)
-        
-        # Extraction de la liste des produits
-        logging.info(f" === Extraction of product list started ===")
-        logging.info(f"Entering in the webpage with url : '{url}'")
-        current_page_products = koroshi_products_list_scraper.get_products_list(url=url)
-        
-        # On casse la boucle au cas où il n'y a plus de produits sur la page
-        if len(current_page_products) == 0 :
-            logging.warning(f"No products found, stop exploring website")
-            break
-
-        all_products.extend(current_page_products)
-        logging.info(f"Got ({len(current_page_products)}) products : {current_page_products[:10]}")
-        logging.info(f" === Extraction of product list finished. Exit with code 0 ===\n")
-        page += 1
-
-    logging.info(f"Get ({len(all_products)}) total of products from the website")
+    pagination_config = configuration["products-list"]["pagination"]
+    roots = get_crawl_roots(configuration)
+    done_pages = manifest.done("pages") if manifest is not None else {}
+
+    # Extraction of the links along the pages, several pages are fetched at the same time
+    # The links of each page are saved into the file as soon as the page is explored
+    logging.info(f" === Extraction of product list started ===")
+    with open_output(fp=output_fp, stage="pages", manifest=manifest) as writer :
+
+        def crawl_root(root: str) -> None :
+            # Resume after the last page of the root saved by a stopped run
+            start_page = max((int(key.rsplit('#', 1)[1]) for key in map(str, done_pages) if key.rsplit('#', 1)[0] == root), default=0) + 1
+            logging.info(f"Entering in the webpage with url : '{root}' from the page ({start_page})")
+            koroshi_products_list_scraper.get_all_pages_products_list(url=root,
+                                                                      max_pages=pagination_config.get("max-pages"),
+                                                                      prefetch_window=pagination_config.get("prefetch-window", 1),
+                                                                      start_page=start_page,
+                                                                      callback=lambda n_page, links : save_output(writer, links, "pages", page_key(root, n_page), manifest))
+
+        crawl_roots(scraper=koroshi_products_list_scraper, crawl_root=crawl_root, roots=roots)
     
-    # Save data into a json file
-    output_fp = os.path.join(os.path.dirname(__file__),
-                             f'json/products_list_{datetime.now().date()}.json')
-    to_json(output_fp,
-            all_products)
+    if manifest is not None :
+        manifest.mark_stage_done("products-list")
+    logging.info(f" === Extraction of product list finished. Exit with code 0 ===\n")
+
+    logging.info(f"Get ({writer.lines}) total of products from the ({len(roots)}) crawl roots of the website")
 
     return output_fp
 
@@ -83,42 +211,294 @@ def get_all_products_list(configuration: Any,
 # ============================================================================= #
 
 def get_all_products_data(products_list_fp: str,
-                          log_file: str) -> str:
+                          log_file: str,
+                          configuration: Any=None,
+                          manifest: Union[RunManifest, None]=None,
+                          metrics: Union[PipelineMetrics, None]=None,
+                          output_fp: Union[str, None]=None) -> str:
     
     """
-    Extract data about the product provided by his url
+    Extract data about the product provided by his url, the links are canonicalized and deduplicated so each product is
+    requested once, products are extracted concurrently and their variants are saved into a ndjson file (one variant per line)
+    as soon as they are extracted. The links of a product into several locales share its data, only the prices and the
+    availability are read for each locale
+        
+        Args
+            products_list_fp : [string] : file path where data that contains products'link (ndjson file)
+            log_file : [string] : the file path where log will be saved
+            configuration : [Any type] : object data that contains configuration how to extract data (see 'page-product',
+                    with 'flatten' : 'batch' the products are flattened by batches of 'batch-size' products)
+                    :default:None
+            manifest : [RunManifest or None] : the manifest of the run, the products already extracted by a stopped run are skipped
+                    :default:None
+            metrics : [PipelineMetrics or None] : if not None, the number of variants extracted is added to the counter 'variants'
+                    :default:None
+            output_fp : [string or None] : the path of the ndjson file, if None 'json/products_data_<date>.ndjson' :default:None
+
+        Return
+            [string] : the file path where data is saved
+    """
+
+    output_fp = output_fp or os.path.join(os.path.dirname(__file__),
+                                          f'json/products_data_{datetime.now().date()}.ndjson')
+
+    if manifest is not None and manifest.is_stage_done("products-data") :
+        logging.info(f"The products data were already extracted into '{output_fp}', skipping")
+        return output_fp
+
+    from extract.extract_data import KoroshiProductDataExtractor
+
+    # Extraction de la liste des produits contenu dans un fichier ndjson
+    try :
+        products_list = list(read_ndjson(fp=products_list_fp))
+    except OSError as error :
+        logging.error(f"Cannot read the products list at location '{products_list_fp}' : {error}")
+        products_list = None
+
+    with open_output(fp=output_fp, stage="products", manifest=manifest) as writer :
+
+        # Get products' link
+        if products_list is not None :
+
+            # Each product is requested once : same product on several pages, '?variant=' links, invalid links
+            products_list, urls_stats = dedupe_product_urls(products_list)
+            logging.info(f"Products links : ({urls_stats['total']}) extracted, ({urls_stats['unique']}) unique, "
+                         f"({urls_stats['duplicates']}) duplicates and ({urls_stats['invalid']}) invalid links removed")
+
+            # Only the products not extracted by a stopped run
+            if manifest is not None :
+                done_products = manifest.done("products")
+                products_list = [product_url for product_url in products_list if product_url not in done_products]
+                logging.info(f"({len(done_products)}) products already extracted, ({len(products_list)}) remaining")
+            
+            koroshi_products_data_scraper = KoroshiProductDataExtractor(configuration=configuration,
+                                                                        file_log=log_file)
+            
+            # Extract data about all products provided by the product_url, several requests at the same time
+            logging.info(f" === Extraction of product data started ===")
+            page_product_config = (configuration or {}).get("page-product", {})
+
+            # Batch mode : the payloads of a batch of products are flattened together by Polars
+            if page_product_config.get("flatten") == "batch" :
+                batch_size = page_product_config.get("batch-size", 1000)
+                for start in range(0, len(products_list), batch_size) :
+                    products_batch = products_list[start:start + batch_size]
+                    writer.write_frame(koroshi_products_data_scraper.extract_products_frame(products_urls=products_batch))
+                    if manifest is not None :
+                        for product_url in products_batch :
+                            manifest.mark_done(stage="products", key=product_url, offset=writer.offset)
+
+            else :
+                def save_product(product_url: str, variants: Union[List[Any], None]) -> None :
+                    # A product that cannot be fetched is not recorded, the resumed run fetches it again
+                    if variants is not None :
+                        save_output(writer, variants, "products", product_url, manifest)
+
+                koroshi_products_data_scraper.extract_products_data(products_urls=products_list, callback=save_product)
+            logging.info(f"Got ({writer.lines}) variants from ({len(products_list)}) products")
+            if metrics is not None :
+                metrics.add(counter="variants", value=writer.lines, stage="products-data")
+            logging.info(f"HTTP connections (new vs reused) : {koroshi_products_data_scraper.transport.connection_stats()}")
+            if koroshi_products_data_scraper.transport.cache is not None :
+                logging.info(f"HTTP cache : {koroshi_products_data_scraper.transport.cache.get_stats()}")
+            if koroshi_products_data_scraper.transport.adaptive is not None :
+                logging.info(f"Adaptive concurrency : {koroshi_products_data_scraper.transport.adaptive.get_stats()}")
+            logging.info(f" === Extraction of product data finished. Exit with code 0 === \n")
+
+    if manifest is not None and products_list is not None :
+        manifest.mark_stage_done("products-data")
+
+    return output_fp
+
+
+def get_all_catalog_data(configuration: Any,
+                         log_file: str,
+                         manifest: Union[RunManifest, None]=None,
+                         metrics: Union[PipelineMetrics, None]=None,
+                         output_fp: Union[str, None]=None) -> str :
+    """
+    Extract data about all products from the bulk products JSON endpoint of the store (configuration 'catalog'),
+    the listing pages and the request per product are skipped
         
         Args
-            products_list_fp : [string] : file path where data that contains products'link
+            configuration : [Any type] : object data that contains configuration how to extract data
             log_file : [string] : the file path where log will be saved
+            manifest : [RunManifest or None] : the manifest of the run, the pages already explored by a stopped run are skipped
+                    :default:None
+            metrics : [PipelineMetrics or None] : if not None, the number of variants extracted is added to the counter 'variants'
+                    :default:None
+            output_fp : [string or None] : the path of the ndjson file, if None 'json/products_data_<date>.ndjson' :default:None
 
         Return
             [string] : the file path where data is saved
     """
+
+    output_fp = output_fp or os.path.join(os.path.dirname(__file__),
+                                          f'json/products_data_{datetime.now().date()}.ndjson')
+
+    if manifest is not None and manifest.is_stage_done("products-data") :
+        logging.info(f"The catalog data were already extracted into '{output_fp}', skipping")
+        return output_fp
+
+    from extract.extract_data import KoroshiCatalogExtractor
+
+    koroshi_catalog_scraper = KoroshiCatalogExtractor(configuration=configuration,
+                                                      file_log=log_file)
+    
+    # Resume after the last page saved by a stopped run
+    start_page = max(manifest.done("catalog-pages"), default=0) + 1 if manifest is not None else 1
+
+    # The variants of each page of the catalog are saved as soon as the page is explored
+    logging.info(f" === Extraction of catalog data started ===")
+    with open_output(fp=output_fp, stage="catalog-pages", manifest=manifest) as writer :
+        koroshi_catalog_scraper.extract_catalog_data(start_page=start_page,
+                                                     callback=lambda page, variants : save_output(writer, variants, "catalog-pages", page, manifest))
     
-    # Contains all data of each product
-    products_data = []
+    if manifest is not None :
+        manifest.mark_stage_done("products-data")
+    logging.info(f"Got ({writer.lines}) variants from the catalog")
+    if metrics is not None :
+        metrics.add(counter="variants", value=writer.lines, stage="products-data")
+    logging.info(f" === Extraction of catalog data finished. Exit with code 0 === \n")
+
+    return output_fp
 
-    # Extraction de la liste des produits contenu dans un fichier json
-    products_list = read_json(fp=products_list_fp)
 
-    # Get products' link
-    if products_list is not None :
+def get_sitemap_products_data(configuration: Any,
+                              base_dir: str,
+                              manifest: Union[RunManifest, None]=None,
+                              metrics: Union[PipelineMetrics, None]=None,
+                              output_fp: Union[str, None]=None) -> str :
+    """
+    Discover the products from the sitemaps of the store (configuration 'sitemap' : 'url', 'filter', 'state') and only extract the products
+    that are new or whose 'lastmod' changed since the previous run, the variants of the unchanged products are carried forward from
+    the output of the previous run. The 'lastmod' of each product and the output are recorded into the state file for the next run.
+    When a sitemap cannot be downloaded or read, the error is raised before anything is written : a partial listing would drop
+    the products of the missing sitemaps from the output and the state
         
-        koroshi_products_data_scraper = KoroshiProductDataExtractor(file_log=log_file)
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs and json files are written
+            manifest : [RunManifest or None] : the manifest of the run, the stage is skipped when it was already finished :default:None
+            metrics : [PipelineMetrics or None] : if not None, the counters 'variants', 'products_changed' and 'products_unchanged' are added
+                    :default:None
+            output_fp : [string or None] : the path of the ndjson file, if None 'json/products_data_<date>.ndjson' :default:None
+
+        Return
+            [string] : the file path where data is saved
+    """
+
+    output_fp = output_fp or os.path.join(base_dir, f'json/products_data_{datetime.now().date()}.ndjson')
+    state_fp = os.path.join(base_dir, configuration.get("sitemap", {}).get("state", "json/sitemap_state.json"))
+
+    if manifest is not None and manifest.is_stage_done("products-data") :
+        logging.info(f"The products data were already extracted into '{output_fp}', skipping")
+        return output_fp
+
+    from extract.extract_data import KoroshiSitemapExtractor, KoroshiProductDataExtractor
+
+    # 'lastmod' of the products of the previous run, and the file of their variants
+    state = read_json(fp=state_fp) if os.path.isfile(state_fp) else None
+    previous_lastmod = (state or {}).get("lastmod", {})
+    previous_fp = (state or {}).get("data-fp")
+    if previous_fp is None or previous_fp == output_fp or not os.path.isfile(previous_fp) :
+        previous_lastmod, previous_fp = {}, None
+
+    koroshi_sitemap_scraper = KoroshiSitemapExtractor(configuration=configuration,
+                                                      file_log=os.path.join(base_dir, 'logs/sitemap.log'))
+
+    # The sitemaps are read while they are downloaded, only the products and their 'lastmod' are kept.
+    # The whole listing is read before the output is opened, so that a sitemap that fails leaves the previous run untouched
+    logging.info(f" === Discovery of products from the sitemaps started ===")
+    lastmod, changed = {}, []
+    for loc, product_lastmod in koroshi_sitemap_scraper.iter_products() :
+        product_url = canonicalize_product_url(loc)
+        if product_url is None or product_url in lastmod :
+            continue
+        lastmod[product_url] = product_lastmod
+        # Without 'lastmod' the product is always extracted
+        if product_lastmod is None or previous_lastmod.get(product_url) != product_lastmod :
+            changed.append(product_url)
+    logging.info(f"Sitemaps : ({len(lastmod)}) products, ({len(changed)}) new or modified since the previous run")
+
+    # A product whose extraction failed is extracted again by the next run
+    extracted = set()
+
+    def save_variants(product_url: str, variants: Union[List[Any], None]) -> None :
+        if variants is not None :
+            writer.write_many(variants)
+            extracted.add(product_url)
+
+    logging.info(f" === Extraction of product data started ===")
+    with NDJSONWriter(fp=output_fp) as writer :
+        # The variants of the unchanged products, the products removed from the sitemaps are dropped
+        unchanged = set(lastmod).difference(changed) if previous_fp is not None else set()
+        if unchanged :
+            writer.write_many(variant for variant in read_ndjson(fp=previous_fp) if variant.get("product_url") in unchanged)
+            extracted.update(unchanged)
+        carried_lines = writer.lines
+
+        koroshi_products_data_scraper = KoroshiProductDataExtractor(configuration=configuration,
+                                                                    file_log=os.path.join(base_dir, 'logs/products_data.log'))
+        koroshi_products_data_scraper.extract_products_data(products_urls=changed, callback=save_variants)
+
+    to_json(fp=state_fp, obj={"data-fp" : output_fp, "lastmod" : {product_url : lastmod[product_url] for product_url in extracted}})
+
+    if manifest is not None :
+        manifest.mark_stage_done("products-data")
+    logging.info(f"Got ({writer.lines}) variants : ({carried_lines}) carried forward from '{previous_fp}', "
+                 f"({writer.lines - carried_lines}) extracted from ({len(changed)}) products")
+    if metrics is not None :
+        metrics.add(counter="variants", value=writer.lines, stage="products-data")
+        metrics.add(counter="products_changed", value=len(changed), stage="products-data")
+        metrics.add(counter="products_unchanged", value=len(unchanged), stage="products-data")
+    logging.info(f" === Extraction of product data finished. Exit with code 0 === \n")
+
+    return output_fp
+
+
+# ============================================================================= #
+# ============================== IMAGES ======================================= #
+# ============================================================================= #
+def get_all_images(products_data_fp: str,
+                   configuration: Any,
+                   base_dir: str,
+                   metrics: Union[PipelineMetrics, None]=None) -> str :
+    """
+    Download the images of the extracted variants into the content-addressed store of the configuration 'images'
+    ('directory', 'concurrency', 'processes', 'thumbnail-size') and save the manifest of the local path of each variant's image
         
-        # Loop to extract data about each product provided by the product_url
-        for product_url in products_list :
-            logging.info(f" === Extraction of product data started ===")
-            current_product_data = koroshi_products_data_scraper.extract_product_data(product_url=product_url)
-            products_data.extend(current_product_data)
-            logging.info(f" === Extraction of product data finished. Exit with code 0 === \n")
+        Args
+            products_data_fp : [string] : the ndjson file of the variants
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs and json files are written
+            metrics : [PipelineMetrics or None] : if not None, the counters 'images' and 'image_bytes' and the hit rate are added
+                    :default:None
 
-    # Save data into a json file
-    output_fp = os.path.join(os.path.dirname(__file__),
-                             f'json/products_data_{datetime.now().date()}.json')
-    to_json(output_fp,
-            products_data)
+        Return
+            [string] : the file path of the manifest (one line per variant with an image)
+    """
+
+    from extract.extract_data import KoroshiImageExtractor
+
+    output_fp = os.path.join(base_dir, f'json/images_{datetime.now().date()}.ndjson')
+    koroshi_image_scraper = KoroshiImageExtractor(configuration=configuration,
+                                                  file_log=os.path.join(base_dir, 'logs/images.log'))
+
+    logging.info(f" === Extraction of images started ===")
+    manifest, stats = koroshi_image_scraper.extract_images(variants=read_ndjson(fp=products_data_fp),
+                                                           directory=os.path.join(base_dir, configuration.get("images", {}).get("directory", "cache/images")))
+
+    with NDJSONWriter(fp=output_fp) as writer :
+        writer.write_many(manifest)
+
+    logging.info(f"Images : ({stats['images']}) images of ({stats['variants']}) variants, ({stats['bytes_downloaded']}) bytes downloaded, "
+                 f"({stats['images_per_second']}) images/s, hit rate ({stats['hit_rate']})")
+    if metrics is not None :
+        metrics.add(counter="images", value=stats["images"], stage="images")
+        metrics.add(counter="image_bytes", value=stats["bytes_downloaded"], stage="images")
+        metrics.add(counter="image_hits", value=stats["not_modified"] + stats["duplicates"], stage="images")
+    logging.info(f" === Extraction of images finished. Exit with code 0 === \n")
 
     return output_fp
 
@@ -127,16 +507,19 @@ def get_all_products_data(products_list_fp: str,
 # ============================== LOAD INTO DATABASE =========================== #
 # ============================================================================= #
 
-def load_data_to_db(data_fp: str,
-                    log_file: str) -> None :
+def create_dataloader(log_file: str) -> "KoroshiDataLoader" :
     """
-    Job description
+    Connect to the PostgreSQL database described by the environment variables
         
         Args
-            data_fp : [string] : file path that contains data to insert to the database
             log_file : [string] : file path where log will be write
+
+        Return
+            [KoroshiDataLoader] : the loader, with the mode of the environment variable 'LOAD_MODE'
     """
 
+    from load.load_data import KoroshiDataLoader
+
     # Environment variables
     load_dotenv()
     DB_USER = os.getenv("DB_USER", "")
@@ -146,34 +529,722 @@ def load_data_to_db(data_fp: str,
     DBNAME = os.getenv("DBNAME", "")
     SCHEMA = os.getenv("SCHEMA", None)
     TABLE_NAME = os.getenv("TABLE_NAME", "")
+    LOAD_MODE = os.getenv("LOAD_MODE", "replace")
     
     # Connection to the PostgreSQL database
-    dataloader = KoroshiDataLoader(connection_url=f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{HOST}:{PORT}/{DBNAME}",
-                                   schema=SCHEMA,
-                                   table=f"{TABLE_NAME}_{datetime.now().date().__str__().replace('-', '_')}",
-                                   file_log=log_file)
-    # Extract data from json file
-    df = dataloader.convert_json_to_dataframe(fp=data_fp)
+    # The modes 'incremental' and 'history' keep one table along the days, the modes 'replace' and 'copy' create a table per day.
+    # The history table has its own name : its rows have a day and another primary key than the table of the mode 'incremental'
+    tables = {"incremental" : TABLE_NAME, "history" : f"{TABLE_NAME}_history"}
+    return KoroshiDataLoader(connection_url=f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{HOST}:{PORT}/{DBNAME}",
+                             schema=SCHEMA,
+                             table=tables.get(LOAD_MODE, f"{TABLE_NAME}_{datetime.now().date().__str__().replace('-', '_')}"),
+                             file_log=log_file,
+                             mode=LOAD_MODE)
+
+
+def create_validator(configuration: Any) -> Union["VariantValidator", None] :
+    """
+    Create the validation of the variants described by the configuration 'validation' ('enabled', 'required', 'max-price', 'barcode-pattern')
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+
+        Return
+            [VariantValidator or None] : the validation, None when 'validation.enabled' is false (it is enabled by default)
+    """
+
+    from load.validation import VariantValidator, REQUIRED_FIELDS, MAX_PRICE, BARCODE_PATTERN
+
+    validation_config = (configuration or {}).get("validation", {})
+
+    if not validation_config.get("enabled", True) :
+        return None
+
+    return VariantValidator(required=validation_config.get("required", REQUIRED_FIELDS),
+                            max_price=validation_config.get("max-price", MAX_PRICE),
+                            barcode_pattern=validation_config.get("barcode-pattern", BARCODE_PATTERN))
+
+
+def validate_batches(batches: Iterable["pl.DataFrame"],
+                     validator: "VariantValidator",
+                     quarantine: NDJSONWriter,
+                     stage: str,
+                     metrics: Union[PipelineMetrics, None]=None) -> Iterator["pl.DataFrame"] :
+    """
+    Give the valid rows of the batches to the loader, the invalid ones are written with their reasons into the quarantine file
+        
+        Args
+            batches : [iterable of pl.DataFrame] : the variants
+            validator : [VariantValidator] : the validation, see :func:create_validator
+            quarantine : [NDJSONWriter] : the writer of the quarantine file
+            stage : [string] : the stage of the counters
+            metrics : [PipelineMetrics or None] : if not None, the counters 'rows_quarantined' and 'validation_seconds' are added
+                    when all the batches are validated :default:None
+
+        Return
+            [iterator of pl.DataFrame] : the valid rows of each batch
+    """
+
+    yield from validator.validate_batches(batches=batches, quarantine=quarantine.write_frame)
+
+    stats = validator.get_stats()
+    logging.info(f"Validation : ({stats['valid']}) valid variants, ({stats['quarantined']}) quarantined into '{quarantine.fp}' "
+                 f"({stats['reasons']}), ({stats['rows_per_second']}) rows/s")
+    if metrics is not None :
+        metrics.add(counter="rows_quarantined", value=stats["quarantined"], stage=stage)
+        metrics.add(counter="validation_seconds", value=round(stats["seconds"], 3), stage=stage)
+
+
+def load_data_to_db(data_fp: str,
+                    log_file: str,
+                    metrics: Union[PipelineMetrics, None]=None,
+                    configuration: Any=None,
+                    quarantine_fp: Union[str, None]=None) -> None :
+    """
+    Job description
+        
+        Args
+            data_fp : [string] : file path that contains data to insert to the database (parquet or ndjson file, read lazily by batches)
+            log_file : [string] : file path where log will be write
+            metrics : [PipelineMetrics or None] : if not None, the rows given to the loader are added to the counter 'rows_loaded'
+                    :default:None
+            configuration : [Any type] : object data that contains configuration how to extract data (see 'validation') :default:None
+            quarantine_fp : [string or None] : the ndjson file of the variants that fail the validation,
+                    if None 'json/quarantine_<date>.ndjson' :default:None
+    """
+
+    from load.load_data import COPY_CHUNK_SIZE
+
+    dataloader = create_dataloader(log_file=log_file)
+    validator = create_validator(configuration=configuration)
+
+    # Read lazily the file, it is loaded one batch after the other so the memory does not grow with the file
+    lazy_df = dataloader.scan_data(fp=data_fp)
 
     # Insert data into the database
-    if df is not None:
-        #df.write_csv('koroshi_data.csv')
-        #logging.info(f"Data saved into csv file")
+    if lazy_df is not None:
+        batches = lazy_df.collect_batches(chunk_size=COPY_CHUNK_SIZE)
+
+        if validator is None :
+            dataloader.load_batches(batches if metrics is None else metrics.count_rows(batches, counter="rows_loaded", stage="load"))
 
-        dataloader.insert_data(df)
+        # Only the valid variants reach the table
+        else :
+            quarantine_fp = quarantine_fp or os.path.join(os.path.dirname(__file__), f'json/quarantine_{datetime.now().date()}.ndjson')
+            with NDJSONWriter(fp=quarantine_fp) as quarantine :
+                batches = validate_batches(batches=batches, validator=validator, quarantine=quarantine, stage="load", metrics=metrics)
+                dataloader.load_batches(batches if metrics is None else metrics.count_rows(batches, counter="rows_loaded", stage="load"))
             
 
+# ============================================================================= #
+# ============================== STREAMING PIPELINE =========================== #
+# ============================================================================= #
+def put_until_stopped(items_queue: queue.Queue,
+                      item: Any,
+                      stop: threading.Event) -> bool :
+    """
+    Put an item into a bounded queue, waiting while it is full, unless the pipeline is stopped
+        
+        Args
+            items_queue : [queue.Queue] : the queue between two stages
+            item : [Any type] : the item
+            stop : [threading.Event] : set when a stage failed
+
+        Return
+            [boolean] : True when the item was put, False when the pipeline is stopped
+    """
+
+    while not stop.is_set() :
+        try :
+            items_queue.put(item, timeout=1)
+            return True
+        except queue.Full :
+            continue
+
+    return False
+
+
+def run_streaming_pipeline(configuration: Any,
+                           base_dir: str,
+                           metrics: Union[PipelineMetrics, None]=None) -> str :
+    """
+    Run the list, fetch and load stages at the same time, linked by bounded queues : the products of a listing page
+    are fetched as soon as the page is explored, and the variants are loaded by batches while the crawl goes on.
+    The variants are also saved into the ndjson file of the day (configuration 'streaming' : 'queue-size', 'batch-size')
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs and json files are written
+            metrics : [PipelineMetrics or None] : if not None, the variants loaded are added to the counters 'variants' and 'rows_loaded'
+                    :default:None
+
+        Return
+            [string] : the file path where data is saved
+
+        Raises
+            [Exception] : the first error of a stage, the other stages are stopped
+    """
+
+    import polars as pl
+    from extract.extract_data import KoroshiProductsListExtractor, KoroshiProductDataExtractor, DEFAULT_CONCURRENCY
+    from load.load_data import VARIANT_SCHEMA
+
+    streaming_config = configuration.get("streaming", {})
+    queue_size = streaming_config.get("queue-size", 1000)
+    batch_size = streaming_config.get("batch-size", 5000)
+    concurrency = configuration.get("page-product", {}).get("concurrency", DEFAULT_CONCURRENCY)
+    pagination_config = configuration["products-list"]["pagination"]
+    output_fp = os.path.join(base_dir, f'json/products_data_{datetime.now().date()}.ndjson')
+
+    links_queue = queue.Queue(maxsize=queue_size)
+    variants_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    koroshi_products_list_scraper = KoroshiProductsListExtractor(configuration=configuration,
+                                                                 file_log=os.path.join(base_dir, 'logs/products_list.log'))
+    koroshi_products_data_scraper = KoroshiProductDataExtractor(configuration=configuration,
+                                                                file_log=os.path.join(base_dir, 'logs/products_data.log'))
+    dataloader = create_dataloader(log_file=os.path.join(base_dir, 'logs/to_db.log'))
+
+    def run_stage(stage: Callable[[], None]) -> None :
+        # The first error stops all the stages
+        try :
+            stage()
+        except Exception as error :
+            logging.error(f"The stage '{stage.__name__}' failed, stopping the pipeline : {error}")
+            errors.append(error)
+            stop.set()
+
+    def list_stage() -> None :
+        # Each product is sent once to the fetch stage, as soon as its page is explored, the crawl roots are explored at the same time
+        seen = set()
+        seen_lock = threading.Lock()
+
+        def send_links(n_page: int, links: List[str]) -> None :
+            if stop.is_set() :
+                raise InterruptedError("The pipeline is stopped")
+            for link in links :
+                product_url = canonicalize_product_url(link)
+                with seen_lock :
+                    if product_url is None or product_url in seen :
+                        continue
+                    seen.add(product_url)
+                put_until_stopped(links_queue, product_url, stop)
+
+        def crawl_root(root: str) -> None :
+            koroshi_products_list_scraper.get_all_pages_products_list(url=root,
+                                                                      max_pages=pagination_config.get("max-pages"),
+                                                                      prefetch_window=pagination_config.get("prefetch-window", 1),
+                                                                      callback=send_links)
+
+        try :
+            roots = get_crawl_roots(configuration)
+            crawl_roots(scraper=koroshi_products_list_scraper, crawl_root=crawl_root, roots=roots)
+            logging.info(f"List stage finished : ({len(seen)}) products from ({len(roots)}) crawl roots")
+        finally :
+            for _ in range(concurrency) :
+                put_until_stopped(links_queue, None, stop)
+
+    def fetch_stage() -> None :
+        while not stop.is_set() :
+            try :
+                product_url = links_queue.get(timeout=1)
+            except queue.Empty :
+                continue
+            if product_url is None :
+                break
+            # A product that cannot be read is skipped, like in the other modes
+            try :
+                variants = koroshi_products_data_scraper.extract_product_data(product_url=product_url)
+            except Exception as error :
+                logging.error(f"Cannot extract the product '{product_url}' : {error}")
+                continue
+            for variant in variants or [] :
+                put_until_stopped(variants_queue, variant, stop)
+
+    def variants_batches() -> Iterator["pl.DataFrame"] :
+        # Batches of variants for the loader, they are also saved into the ndjson file
+        batch = []
+        with NDJSONWriter(fp=output_fp) as writer :
+            while not stop.is_set() :
+                try :
+                    variant = variants_queue.get(timeout=1)
+                except queue.Empty :
+                    continue
+                if variant is not None :
+                    batch.append(variant)
+                if batch and (variant is None or len(batch) >= batch_size) :
+                    writer.write_many(batch)
+                    if metrics is not None :
+                        metrics.add(counter="variants", value=len(batch), stage="pipeline")
+                    yield pl.DataFrame(batch, schema=VARIANT_SCHEMA)
+                    batch = []
+                if variant is None :
+                    return
+        raise InterruptedError("The pipeline is stopped")
+
+    def load_stage() -> None :
+        validator = create_validator(configuration=configuration)
+        with NDJSONWriter(fp=os.path.join(base_dir, f'json/quarantine_{datetime.now().date()}.ndjson')) as quarantine :
+            batches = variants_batches()
+            if validator is not None :
+                batches = validate_batches(batches=batches, validator=validator, quarantine=quarantine, stage="pipeline", metrics=metrics)
+            if metrics is not None :
+                batches = metrics.count_rows(batches, counter="rows_loaded", stage="pipeline")
+            dataloader.load_batches(batches)
+
+    def fetch_stages() -> None :
+        fetchers = [threading.Thread(target=run_stage, args=(fetch_stage,), name=f"fetch-{n}") for n in range(concurrency)]
+        for fetcher in fetchers :
+            fetcher.start()
+        for fetcher in fetchers :
+            fetcher.join()
+        # All the variants are sent, the loader can finish
+        put_until_stopped(variants_queue, None, stop)
+
+    logging.info(f" === Streaming pipeline started (concurrency ({concurrency}), queues of ({queue_size}), batches of ({batch_size})) ===")
+    stages = [threading.Thread(target=run_stage, args=(stage,), name=stage.__name__) for stage in (list_stage, fetch_stages, load_stage)]
+    for stage in stages :
+        stage.start()
+    for stage in stages :
+        stage.join()
+
+    if errors :
+        raise errors[0]
+    logging.info(f" === Streaming pipeline finished. Exit with code 0 === \n")
+
+    return output_fp
+
+
+# ============================================================================= #
+# ============================== WORK QUEUE =================================== #
+# ============================================================================= #
+def open_work_queue(configuration: Any,
+                    base_dir: str) -> WorkQueue :
+    """
+    Open the work queue of the day described by the configuration 'work-queue' ('path', 'lease-seconds', 'max-attempts', 'journal-mode')
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, the relative path of the queue is relative to it
+
+        Return
+            [WorkQueue] : the queue shared by the coordinator and the workers
+    """
+
+    queue_config = configuration.get("work-queue", {})
+
+    return WorkQueue(fp=os.path.join(base_dir, queue_config.get("path", f'json/work_queue_{datetime.now().date()}.sqlite')),
+                     lease_seconds=queue_config.get("lease-seconds", 300),
+                     max_attempts=queue_config.get("max-attempts", 3),
+                     journal_mode=queue_config.get("journal-mode", "WAL"))
+
+
+def run_worker(configuration: Any,
+               base_dir: str,
+               owner: Union[str, None]=None) -> None :
+    """
+    Extract the product urls claimed from the work queue until it is drained, in a worker process of this host or of another host
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs are written
+            owner : [string or None] : the unique name of the worker, if None '<host>-<pid>' :default:None
+    """
+
+    from extract.extract_data import KoroshiProductDataExtractor
+
+    owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+    work_queue = open_work_queue(configuration=configuration, base_dir=base_dir)
+    koroshi_products_data_scraper = KoroshiProductDataExtractor(configuration=configuration,
+                                                                file_log=os.path.join(base_dir, f'logs/products_data_{owner}.log'))
+
+    try :
+        run_queue_worker(work_queue=work_queue,
+                         extractor=koroshi_products_data_scraper,
+                         owner=owner,
+                         batch_size=configuration.get("work-queue", {}).get("batch-size", 100))
+    finally :
+        work_queue.close()
+
+
+def run_queue_pipeline(configuration: Any,
+                       base_dir: str,
+                       metrics: Union[PipelineMetrics, None]=None) -> str :
+    """
+    Push the product urls of the listing pages into the durable work queue, while 'work-queue.workers' local worker processes
+    (and the workers started on other hosts with the 'pipeline-mode' 'worker') extract them. A stopped run restarted
+    the same day only extracts the urls not done yet
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs and json files are written
+            metrics : [PipelineMetrics or None] : if not None, the number of variants extracted is added to the counter 'variants'
+                    :default:None
+
+        Return
+            [string] : the file path where data is saved
+    """
+
+    from extract.extract_data import KoroshiProductsListExtractor
+
+    output_fp = os.path.join(base_dir, f'json/products_data_{datetime.now().date()}.ndjson')
+    pagination_config = configuration["products-list"]["pagination"]
+    n_workers = configuration.get("work-queue", {}).get("workers", os.cpu_count() or 1)
+    work_queue = open_work_queue(configuration=configuration, base_dir=base_dir)
+    # The queue of the day may have been closed by a stopped run
+    work_queue.reopen_input()
+
+    # The workers claim the urls as soon as they are pushed
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(configuration, base_dir, f"{socket.gethostname()}-local-{n}"), name=f"worker-{n}")
+               for n in range(n_workers)]
+    for worker in workers :
+        worker.start()
+
+    logging.info(f" === Work queue pipeline started ('{work_queue.fp}', ({n_workers}) local workers) ===")
+    koroshi_products_list_scraper = KoroshiProductsListExtractor(configuration=configuration,
+                                                                 file_log=os.path.join(base_dir, 'logs/products_list.log'))
+
+    def crawl_root(root: str) -> None :
+        koroshi_products_list_scraper.get_all_pages_products_list(url=root,
+                                                                  max_pages=pagination_config.get("max-pages"),
+                                                                  prefetch_window=pagination_config.get("prefetch-window", 1),
+                                                                  callback=lambda n_page, links : work_queue.push(dedupe_product_urls(links)[0]))
+
+    try :
+        roots = get_crawl_roots(configuration)
+        crawl_roots(scraper=koroshi_products_list_scraper, crawl_root=crawl_root, roots=roots)
+    except BaseException :
+        # The input stays open so that the restarted run pushes the remaining urls, the local workers would wait for them
+        for worker in workers :
+            worker.terminate()
+        raise
+
+    # The workers stop once the queue is drained
+    work_queue.close_input()
+
+    for worker in workers :
+        worker.join()
+    logging.info(f"Work queue : {work_queue.get_stats()}")
+
+    if not work_queue.is_drained() :
+        raise RuntimeError(f"The work queue '{work_queue.fp}' is not drained, the workers stopped : {work_queue.get_stats()}")
+
+    n_variants = work_queue.export(fp=output_fp)
+    work_queue.close()
+    if metrics is not None :
+        metrics.add(counter="variants", value=n_variants, stage="pipeline")
+    logging.info(f" === Work queue pipeline finished. Exit with code 0 === \n")
+
+    return output_fp
+
+
+# ============================================================================= #
+# ============================== PIPELINE ===================================== #
+# ============================================================================= #
+def run_pipeline(configuration: Any,
+                 base_dir: str,
+                 metrics: PipelineMetrics) -> None :
+    """
+    Run the stages one after the other (list, data, load or catalog, load), with checkpoints into the manifest of the day
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs and json files are written
+            metrics : [PipelineMetrics] : the measures of the run
+    """
+
+    # Journal of the run : a stopped run restarted the same day skips the work already done
+    manifest = RunManifest(fp=os.path.join(base_dir, f'json/manifest_{datetime.now().date()}.ndjson'))
+    
+    # Bulk mode : all products and their variants from the JSON endpoint of the store
+    if configuration.get("extraction-mode") == "catalog" :
+        with metrics.stage("products-data") :
+            products_data_fp = get_all_catalog_data(configuration=configuration,
+                                                    log_file=os.path.join(base_dir, 'logs/products_data.log'),
+                                                    manifest=manifest,
+                                                    metrics=metrics)
+
+    # Only the products new or modified since the previous run, from the sitemaps
+    elif configuration.get("extraction-mode") == "sitemap" :
+        with metrics.stage("products-data") :
+            products_data_fp = get_sitemap_products_data(configuration=configuration,
+                                                         base_dir=base_dir,
+                                                         manifest=manifest,
+                                                         metrics=metrics)
+
+    else :
+        # Extract and save products list
+        with metrics.stage("products-list") :
+            products_list_fp = get_all_products_list(configuration=configuration,
+                                                     log_file=os.path.join(base_dir, 'logs/products_list.log'),
+                                                     manifest=manifest)
+        
+        # Extract and save products data
+        with metrics.stage("products-data") :
+            products_data_fp = get_all_products_data(products_list_fp=products_list_fp,
+                                                     log_file=os.path.join(base_dir, 'logs/products_data.log'),
+                                                     configuration=configuration,
+                                                     manifest=manifest,
+                                                     metrics=metrics)
+    
+    # Optional local images and thumbnails of the variants
+    if configuration.get("images", {}).get("enabled") :
+        with metrics.stage("images") :
+            get_all_images(products_data_fp=products_data_fp,
+                           configuration=configuration,
+                           base_dir=base_dir,
+                           metrics=metrics)
+
+    # Typed and compressed hand-off between the extraction and the load
+    if configuration.get("artifact-format") == "parquet" :
+        from load.load_data import VARIANT_SCHEMA
+        with metrics.stage("parquet") :
+            products_data_fp = ndjson_to_parquet(ndjson_fp=products_data_fp,
+                                                 parquet_fp=products_data_fp.replace(".ndjson", ".parquet"),
+                                                 schema=VARIANT_SCHEMA) or products_data_fp
+
+    # Load data extracted into a PostgreSQL database
+    if manifest.is_stage_done("load") :
+        logging.info("The data were already loaded today, remove the manifest to run again")
+    else :
+        with metrics.stage("load") :
+            load_data_to_db(data_fp=products_data_fp,
+                            log_file=os.path.join(base_dir, 'logs/to_db.log'),
+                            metrics=metrics,
+                            configuration=configuration)
+        manifest.mark_stage_done("load")
+
+    manifest.close()
+
+
+# ============================================================================= #
+# ============================== COMMANDS ===================================== #
+# ============================================================================= #
+def import_stage_modules(command: str) -> Dict[str, float] :
+    """
+    Import the modules of the stages of a command and measure the seconds spent, see :data:STAGE_MODULES
+        
+        Args
+            command : [string] : the command of the CLI ('list', 'fetch', 'load' or 'run')
+
+        Return
+            [dictionary] : the seconds spent importing each module, a module already imported is not measured again
+    """
+
+    for name in STAGE_MODULES[command] :
+        if name not in sys.modules :
+            start = time.perf_counter()
+            importlib.import_module(name)
+            IMPORT_TIMES[name] = time.perf_counter() - start
+
+    return IMPORT_TIMES
+
+
+def observe_requests(configuration: Any,
+                     metrics: PipelineMetrics) -> None :
+    """
+    Measure the requests of the shared HTTP transport of the extraction stages
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data (see 'transport')
+            metrics : [PipelineMetrics] : the measures of the run
+    """
+
+    from extract.transport import get_shared_transport
+
+    transport = get_shared_transport(configuration.get("transport"))
+    transport.add_observer(metrics.observe_request)
+    transport.add_retry_observer(metrics.observe_retry)
+
+
+def fetch_products_data(configuration: Any,
+                        base_dir: str,
+                        metrics: PipelineMetrics,
+                        products_list_fp: Union[str, None]=None,
+                        output_fp: Union[str, None]=None) -> str :
+    """
+    Extract the variants of the products with the 'extraction-mode' of the configuration, without manifest : from the catalog,
+    from the sitemaps, or from the products list saved by the command 'list'
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs and json files are written
+            metrics : [PipelineMetrics] : the measures of the run
+            products_list_fp : [string or None] : the ndjson file of the products' links, if None 'json/products_list_<date>.ndjson'
+                    (only read by the default extraction mode) :default:None
+            output_fp : [string or None] : the path of the ndjson file of the variants, if None 'json/products_data_<date>.ndjson'
+                    :default:None
+
+        Return
+            [string] : the file path where data is saved
+    """
+
+    if configuration.get("extraction-mode") == "catalog" :
+        return get_all_catalog_data(configuration=configuration,
+                                    log_file=os.path.join(base_dir, 'logs/products_data.log'),
+                                    metrics=metrics,
+                                    output_fp=output_fp)
+
+    if configuration.get("extraction-mode") == "sitemap" :
+        return get_sitemap_products_data(configuration=configuration,
+                                         base_dir=base_dir,
+                                         metrics=metrics,
+                                         output_fp=output_fp)
+
+    return get_all_products_data(products_list_fp=products_list_fp or os.path.join(base_dir, f'json/products_list_{datetime.now().date()}.ndjson'),
+                                 log_file=os.path.join(base_dir, 'logs/products_data.log'),
+                                 configuration=configuration,
+                                 metrics=metrics,
+                                 output_fp=output_fp)
+
+
+def run_all(configuration: Any,
+            base_dir: str,
+            metrics: PipelineMetrics) -> None :
+    """
+    Run all the stages with the 'pipeline-mode' of the configuration (streaming, work queue, worker only, or one stage after the other)
+        
+        Args
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs and json files are written
+            metrics : [PipelineMetrics] : the measures of the run
+    """
+
+    # All the stages at the same time, linked by queues (no checkpoints in this mode)
+    if configuration.get("pipeline-mode") == "streaming" :
+        with metrics.stage("pipeline") :
+            run_streaming_pipeline(configuration=configuration,
+                                   base_dir=base_dir,
+                                   metrics=metrics)
+
+    # Product urls shared with worker processes through a durable queue, then loaded
+    elif configuration.get("pipeline-mode") == "queue" :
+        with metrics.stage("pipeline") :
+            products_data_fp = run_queue_pipeline(configuration=configuration,
+                                                  base_dir=base_dir,
+                                                  metrics=metrics)
+        with metrics.stage("load") :
+            load_data_to_db(data_fp=products_data_fp,
+                            log_file=os.path.join(base_dir, 'logs/to_db.log'),
+                            metrics=metrics,
+                            configuration=configuration)
+
+    # Only a worker of the queue of a coordinator (e.g. on another host sharing the storage)
+    elif configuration.get("pipeline-mode") == "worker" :
+        with metrics.stage("products-data") :
+            run_worker(configuration=configuration,
+                       base_dir=base_dir)
+
+    else :
+        run_pipeline(configuration=configuration,
+                     base_dir=base_dir,
+                     metrics=metrics)
+
+
+def run_command(arguments: argparse.Namespace,
+                configuration: Any,
+                base_dir: str,
+                metrics: PipelineMetrics) -> Union[str, None] :
+    """
+    Run a command of the CLI : a single stage reads and writes the artifacts given on the command line, so that the stages
+    can run apart (e.g. on different machines), 'run' runs all the stages like before
+        
+        Args
+            arguments : [argparse.Namespace] : the arguments of the command line, see :func:parse_arguments
+            configuration : [Any type] : object data that contains configuration how to extract data
+            base_dir : [string] : the scraper directory, where logs and json files are written
+            metrics : [PipelineMetrics] : the measures of the run
+
+        Return
+            [string or None] : the artifact written by a stage, None for 'load' and 'run'
+    """
+
+    import_stage_modules(arguments.command)
+
+    if arguments.command in ("list", "fetch", "run") :
+        observe_requests(configuration=configuration, metrics=metrics)
+
+    if arguments.command == "list" :
+        with metrics.stage("products-list") :
+            return get_all_products_list(configuration=configuration,
+                                         log_file=os.path.join(base_dir, 'logs/products_list.log'),
+                                         output_fp=arguments.output)
+
+    if arguments.command == "fetch" :
+        with metrics.stage("products-data") :
+            return fetch_products_data(configuration=configuration,
+                                       base_dir=base_dir,
+                                       metrics=metrics,
+                                       products_list_fp=arguments.input,
+                                       output_fp=arguments.output)
+
+    if arguments.command == "load" :
+        with metrics.stage("load") :
+            load_data_to_db(data_fp=arguments.input or os.path.join(base_dir, f'json/products_data_{datetime.now().date()}.ndjson'),
+                            log_file=os.path.join(base_dir, 'logs/to_db.log'),
+                            metrics=metrics,
+                            configuration=configuration,
+                            quarantine_fp=arguments.quarantine)
+        return None
+
+    run_all(configuration=configuration,
+            base_dir=base_dir,
+            metrics=metrics)
+
+    return None
+
+
+def parse_arguments(argv: Union[List[str], None]=None) -> argparse.Namespace :
+    """
+    Read the command line : 'list', 'fetch', 'load' or 'run' (the default, when no command is given)
+        
+        Args
+            argv : [list of string or None] : the arguments, if None the arguments of the process :default:None
+
+        Return
+            [argparse.Namespace] : 'command', 'config' and the artifacts 'input' and 'output' of the command
+    """
+
+    parser = argparse.ArgumentParser(description="Extract the products of the Koroshi website and load them into the database")
+    parser.add_argument("--config", default=None,
+                        help="the json configuration, relative to the scraper directory (default : the environment variable 'CONFIGURATION_FILE_PATH')")
+    commands = parser.add_subparsers(dest="command", metavar="{list,fetch,load,run}")
+
+    list_parser = commands.add_parser("list", help="extract the products' links into a ndjson file")
+    list_parser.add_argument("--output", default=None, help="the ndjson file of the links (default : json/products_list_<date>.ndjson)")
+
+    fetch_parser = commands.add_parser("fetch", help="extract the variants of the products with the 'extraction-mode' of the configuration")
+    fetch_parser.add_argument("--input", default=None, help="the ndjson file of the links (default : json/products_list_<date>.ndjson)")
+    fetch_parser.add_argument("--output", default=None, help="the ndjson file of the variants (default : json/products_data_<date>.ndjson)")
+
+    load_parser = commands.add_parser("load", help="load a ndjson or parquet file of variants into the database")
+    load_parser.add_argument("--input", default=None, help="the file of the variants (default : json/products_data_<date>.ndjson)")
+    load_parser.add_argument("--quarantine", default=None, help="the ndjson file of the variants that fail the validation (default : json/quarantine_<date>.ndjson)")
+
+    commands.add_parser("run", help="run all the stages with the 'pipeline-mode' of the configuration")
+
+    arguments = parser.parse_args(argv)
+    arguments.command = arguments.command or "run"
+
+    return arguments
+
+
 # ================================================================================================================== #
 # ============================================ MAIN FUNCTION ======================================================= #
 # ================================================================================================================== #
-def main() -> None :
+def main(argv: Union[List[str], None]=None) -> None :
     """
-    The main function that execute the pipeline
+    The main function that execute the command of the command line (the whole pipeline by default)
     """
 
+    arguments = parse_arguments(argv)
+
     # Variables d'environnements
     load_dotenv()
-    CONFIGURATION_FP = os.getenv('CONFIGURATION_FILE_PATH', '')
+    CONFIGURATION_FP = arguments.config or os.getenv('CONFIGURATION_FILE_PATH', '')
     BASE_DIR = os.path.dirname(__file__)
 
     logging.basicConfig(filename=os.path.join(BASE_DIR, 'logs/main.log'),
@@ -181,29 +1252,33 @@ def main() -> None :
                         format='[%(asctime)s] [%(levelname)s] [%(funcName)s()] %(message)s',
                         level=logging.INFO)
     
-    logging.info("======================= PROGRAM STARTED =======================")
+    logging.info(f"======================= PROGRAM STARTED ({arguments.command}) =======================")
 
     # fichier de configuration nécessaire au scraping du site
     configuration_fp = os.path.join(BASE_DIR, CONFIGURATION_FP)
     json_config = read_json(fp=configuration_fp)
 
     if json_config is not None :
-        
-        # Extract and save products list
-        products_list_fp = get_all_products_list(configuration=json_config,
-                                                 log_file = os.path.join(BASE_DIR, 'logs/products_list.log')
-                                                )
-                                                
-        
-        # Extract and save products data
-        products_data_fp = get_all_products_data(products_list_fp=products_list_fp,
-                                                 log_file=os.path.join(BASE_DIR, 'logs/products_data.log')
-                                                )
-        
-        # Load data extracted into a PostgreSQL database
-       
-        load_data_to_db(data_fp=products_data_fp,
-                        log_file=os.path.join(BASE_DIR, 'logs/to_db.log'))
+
+        # Measures of the run : stage wall times, request latencies, status codes, bytes and rates
+        metrics = PipelineMetrics()
+
+        try :
+            output_fp = run_command(arguments=arguments,
+                                    configuration=json_config,
+                                    base_dir=BASE_DIR,
+                                    metrics=metrics)
+            if output_fp is not None :
+                print(f"Output : {output_fp}")
+
+        finally :
+            # Written even when a stage failed
+            metrics.write(directory=os.path.join(BASE_DIR, json_config.get("metrics-directory", "metrics")))
+
+    # Cold start of the command : only the modules of its stages are imported
+    import_times = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in IMPORT_TIMES.items())
+    print(f"Import times : {import_times} (total {sum(IMPORT_TIMES.values()):.3f}s)")
+    logging.info(f"Import times : {import_times}")
         
     logging.info("======================= PROGRAM FINISHED =======================")
 
@@ -211,4 +1286,6 @@ def main() -> None :
 # ============================================================================= #
 # ============================== ENTRY POINT ================================== #
 # ============================================================================= #
-main()
\ No newline at end of file
+# The worker processes import this module, they must not run the pipeline
+if __name__ == "__main__" :
+    main()
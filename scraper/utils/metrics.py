@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Union
+from urllib.parse import urlsplit
+
+
+
+# Upper bounds (seconds) of the buckets of the request latency histograms
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Suffixes of the paths of the images of the products
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif")
+
+# Prefix of the metrics into the Prometheus textfile
+PROMETHEUS_PREFIX = "koroshi_scraper"
+
+
+
+def endpoint_type(url: str) -> str :
+    """
+    Get the type of endpoint of an url, used to separate the latencies of the listing pages and of the products
+
+        Args
+            url : [string] : the url of the request
+
+        Return
+            [string] : 'product' for '<product>.js', 'catalog' for the bulk '.json' endpoint, 'sitemap' for '.xml',
+                    'image' for the images of the products, else 'listing'
+    """
+
+    path = urlsplit(url).path
+
+    if path.endswith(".js") :
+        return "product"
+    if path.endswith(".json") :
+        return "catalog"
+    if path.endswith(".xml") :
+        return "sitemap"
+    if path.lower().endswith(IMAGE_SUFFIXES) :
+        return "image"
+
+    return "listing"
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= PipelineMetrics ======================================================================= #
+# ==================================================================================================================================================================== #
+class PipelineMetrics() :
+
+
+    def __init__(self) -> None :
+        """
+        Measures of a run of the pipeline : wall time of each stage, request latency histograms per endpoint type, status codes,
+        bytes downloaded and counters (e.g. variants extracted, rows loaded) from which the rates are computed
+        Constructor : initialise empty measures, the run starts now
+        """
+
+        self.lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.requests = {}
+        self.status_codes = {}
+        self.retries = {}
+        self.bytes_downloaded = 0
+        self.counters = {}
+        # Stage whose duration gives the rate of each counter
+        self.rate_stages = {}
+
+
+    @contextmanager
+    def stage(self,
+              name: str) -> Iterator[None] :
+        """
+        Measure the wall time of a stage, to use with a 'with' statement (the time is kept even when the stage fails)
+
+            Args
+                name : [string] : the name of the stage (e.g. 'products-list')
+        """
+
+        start = time.perf_counter()
+        try :
+            yield
+        finally :
+            with self.lock :
+                self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+    def observe_request(self,
+                        url: str,
+                        seconds: float,
+                        status_code: Union[int, None],
+                        n_bytes: int) -> None :
+        """
+        Record a request, to register as an observer of the transport (`HTTPTransport.add_observer()`)
+
+            Args
+                url : [string] : the url of the request
+                seconds : [float] : the latency of the request
+                status_code : [integer or None] : the status code, None when the request failed without response
+                n_bytes : [integer] : the size of the body
+        """
+
+        endpoint = endpoint_type(url)
+        status = str(status_code) if status_code is not None else "error"
+
+        with self.lock :
+            histogram = self.requests.setdefault(endpoint, {"count" : 0, "sum" : 0.0, "max" : 0.0, "buckets" : [0] * (len(LATENCY_BUCKETS) + 1)})
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+            histogram["buckets"][next((n for n, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))] += 1
+            self.status_codes[status] = self.status_codes.get(status, 0) + 1
+            self.bytes_downloaded += n_bytes
+
+
+    def observe_retry(self,
+                      url: str,
+                      status_code: Union[int, None]) -> None :
+        """
+        Record an attempt retried by urllib3 into a request, to register as a retry observer of the transport
+        (`HTTPTransport.add_retry_observer()`) : its status code is counted with the ones of the requests
+
+            Args
+                url : [string] : the url of the request
+                status_code : [integer or None] : the status code of the attempt, None when it failed without response
+        """
+
+        endpoint = endpoint_type(url)
+        status = str(status_code) if status_code is not None else "error"
+
+        with self.lock :
+            self.retries[endpoint] = self.retries.get(endpoint, 0) + 1
+            self.status_codes[status] = self.status_codes.get(status, 0) + 1
+
+
+    def add(self,
+            counter: str,
+            value: int=1,
+            stage: Union[str, None]=None) -> None :
+        """
+        Add a value to a counter
+
+            Args
+                counter : [string] : the name of the counter (e.g. 'variants', 'rows_loaded')
+                value : [integer] : the value to add :default:1
+                stage : [string or None] : the stage whose wall time gives the rate of the counter (e.g. 'variants per second'),
+                        if None the wall time of the run :default:None
+        """
+
+        with self.lock :
+            self.counters[counter] = self.counters.get(counter, 0) + value
+            if stage is not None :
+                self.rate_stages[counter] = stage
+
+
+    def count_rows(self,
+                   batches: Iterable[Any],
+                   counter: str,
+                   stage: Union[str, None]=None) -> Iterator[Any] :
+        """
+        Count the rows of batches of DataFrames while they are given to a consumer (e.g. the loader)
+
+            Args
+                batches : [iterable of pl.DataFrame] : the batches
+                counter : [string] : the name of the counter
+                stage : [string or None] : see :func:add :default:None
+
+            Return
+                [iterator of pl.DataFrame] : the same batches
+        """
+
+        for batch in batches :
+            self.add(counter=counter, value=batch.height, stage=stage)
+            yield batch
+
+
+    def to_dict(self) -> Dict[str, Any] :
+        """
+        Get all the measures
+
+            Return
+                [dictionary] : 'started_at', 'wall_seconds', 'stages' (seconds), 'requests' (histogram per endpoint type, the buckets are
+                        cumulative like in Prometheus), 'status_codes' (retried attempts included), 'retries' (per endpoint type),
+                        'bytes_downloaded', 'counters' and 'rates' (per second)
+        """
+
+        with self.lock :
+            wall_seconds = time.perf_counter() - self.start
+            rates = {}
+            for counter, value in self.counters.items() :
+                seconds = self.stages.get(self.rate_stages.get(counter), wall_seconds)
+                rates[f"{counter}_per_second"] = round(value / seconds, 3) if seconds > 0 else None
+
+            requests = {}
+            for endpoint, histogram in self.requests.items() :
+                cumulative, buckets = 0, {}
+                for bound, count in zip([*map(str, LATENCY_BUCKETS), "+Inf"], histogram["buckets"]) :
+                    cumulative += count
+                    buckets[bound] = cumulative
+                requests[endpoint] = {"count" : histogram["count"],
+                                      "sum_seconds" : round(histogram["sum"], 6),
+                                      "mean_seconds" : round(histogram["sum"] / histogram["count"], 6),
+                                      "max_seconds" : round(histogram["max"], 6),
+                                      "buckets" : buckets}
+
+            return {"started_at" : self.started_at.isoformat(timespec='seconds'),
+                    "wall_seconds" : round(wall_seconds, 3),
+                    "stages" : {name : round(seconds, 3) for name, seconds in self.stages.items()},
+                    "requests" : requests,
+                    "status_codes" : dict(self.status_codes),
+                    "retries" : dict(self.retries),
+                    "bytes_downloaded" : self.bytes_downloaded,
+                    "counters" : dict(self.counters),
+                    "rates" : rates}
+
+
+    def to_prometheus(self) -> str :
+        """
+        Get the measures into the Prometheus text format (e.g. for the textfile collector of the node exporter)
+
+            Return
+                [string] : the metrics, one sample per line
+        """
+
+        metrics = self.to_dict()
+        p = PROMETHEUS_PREFIX
+        lines = [f"# HELP {p}_run_duration_seconds Wall time of the run",
+                 f"# TYPE {p}_run_duration_seconds gauge",
+                 f"{p}_run_duration_seconds {metrics['wall_seconds']}",
+                 f"# HELP {p}_stage_duration_seconds Wall time of each stage of the pipeline",
+                 f"# TYPE {p}_stage_duration_seconds gauge"]
+        lines += [f'{p}_stage_duration_seconds{{stage="{stage}"}} {seconds}' for stage, seconds in metrics["stages"].items()]
+
+        lines += [f"# HELP {p}_request_duration_seconds Latency of the requests per endpoint type, retries included",
+                  f"# TYPE {p}_request_duration_seconds histogram"]
+        for endpoint, histogram in metrics["requests"].items() :
+            lines += [f'{p}_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}' for bound, count in histogram["buckets"].items()]
+            lines += [f'{p}_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram["sum_seconds"]}',
+                      f'{p}_request_duration_seconds_count{{endpoint="{endpoint}"}} {histogram["count"]}']
+
+        lines += [f"# HELP {p}_responses_total Responses per status code, retried attempts included ('error' when there was no response)",
+                  f"# TYPE {p}_responses_total counter"]
+        lines += [f'{p}_responses_total{{status="{status}"}} {count}' for status, count in metrics["status_codes"].items()]
+        lines += [f"# HELP {p}_retries_total Attempts sent again by the retries of the transport per endpoint type",
+                  f"# TYPE {p}_retries_total counter"]
+        lines += [f'{p}_retries_total{{endpoint="{endpoint}"}} {count}' for endpoint, count in metrics["retries"].items()]
+        lines += [f"# HELP {p}_downloaded_bytes_total Bytes of the bodies downloaded",
+                  f"# TYPE {p}_downloaded_bytes_total counter",
+                  f"{p}_downloaded_bytes_total {metrics['bytes_downloaded']}"]
+
+        for counter, value in metrics["counters"].items() :
+            lines += [f"# TYPE {p}_{counter}_total counter", f"{p}_{counter}_total {value}"]
+        for rate, value in metrics["rates"].items() :
+            if value is not None :
+                lines += [f"# TYPE {p}_{rate} gauge", f"{p}_{rate} {value}"]
+
+        return '\n'.join(lines) + '\n'
+
+
+    def write(self,
+              directory: str,
+              name: str="metrics") -> None :
+        """
+        Write the measures into '<name>_<date>.json' and '<name>.prom' (always the same file, so that the collector reads the last run),
+        the files are replaced at once so that a reader never sees a half written file
+
+            Args
+                directory : [string] : the directory of the files
+                name : [string] : the name of the files :default:'metrics'
+        """
+
+        try :
+            os.makedirs(directory, exist_ok=True)
+            files = {os.path.join(directory, f"{name}_{self.started_at.date()}.json") : json.dumps(self.to_dict(), indent=2),
+                     os.path.join(directory, f"{name}.prom") : self.to_prometheus()}
+
+            for fp, content in files.items() :
+                with open(f"{fp}.tmp", 'w', encoding='utf-8') as file :
+                    file.write(content)
+                os.replace(f"{fp}.tmp", fp)
+                logging.info(f"Metrics saved into the file at location '{fp}'")
+
+        except OSError as error :
+            logging.error(f"Cannot write the metrics into the directory '{directory}' : {error}")
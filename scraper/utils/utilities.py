@@ -1,6 +1,13 @@
+import os
 import json
 import logging
-from typing import Any
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Tuple, Union
+from urllib.parse import urlsplit, urlunsplit
+
+# Polars is imported by the functions that need it, the stages that only read and write json start without it
+if TYPE_CHECKING :
+    import polars as pl
 
 
 
@@ -76,4 +83,459 @@ def to_json(fp: str,
         logging.error(f"Access denied to the json file at location : '{fp}'")
 
     except Exception as error :
-        logging.error(f"An error occured during writting into the json file '{fp}' : {error}")
\ No newline at end of file
+        logging.error(f"An error occured during writting into the json file '{fp}' : {error}")
+
+
+def json_default(obj: Any) -> Any :
+    """
+    Serialize into json the objects that have a method `to_dict()` (e.g. the variant records), given to `json.dumps(default=...)`
+
+        Args
+            obj : [Any type] : the object that the json module cannot serialize
+
+        Return
+            [dictionary] : the object into dictionary format
+
+        Raises
+            [TypeError] : when the object has no method `to_dict()`
+    """
+
+    if hasattr(obj, "to_dict") :
+        return obj.to_dict()
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= NDJSONWriter ======================================================================= #
+# ==================================================================================================================================================================== #
+class NDJSONWriter() :
+
+
+    def __init__(self,
+                 fp: str,
+                 mode: str='w',
+                 flush_every: int=1000) -> None :
+        """
+        Write objects into a newline-delimited json file (one json per line) as soon as they are extracted,
+        so that the memory does not grow with the number of objects and a stopped run keeps what was already flushed
+        Constructor : open the file
+
+            Args
+                fp : [string] : the path where to store data
+                mode : [string] : 'w' to start a new file, 'a' to append to an existing file :default:'w'
+                flush_every : [integer] : the number of lines written before the file is flushed to the disk :default:1000
+
+            Assertions
+                mode : raise an error when the mode is not 'w' or 'a'
+        """
+
+        assert mode in ('w', 'a'), "Expected value of 'mode' is 'w' or 'a', please check"
+
+        self.fp = fp
+        self.flush_every = flush_every
+        self.lines = 0
+        self.pending = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(fp)), exist_ok=True)
+        self.file = open(fp, mode, encoding='utf-8')
+        # Size of the file in bytes once everything written is flushed (json.dumps only writes ascii characters)
+        self.offset = os.path.getsize(fp) if mode == 'a' else 0
+        logging.info(f"Writing into the ndjson file at location '{fp}'")
+
+
+    def write(self,
+              obj: Any) -> None :
+        """
+        Write one object on a new line
+
+            Args
+                obj : [Any type] : the object to write, must be serializable into json or have a method `to_dict()`
+        """
+
+        self.write_many([obj])
+
+
+    def write_many(self,
+                   objs: Iterable[Any]) -> None :
+        """
+        Write objects, one per line, and flush the file every :attr:flush_every lines
+
+            Args
+                objs : [iterable of Any type] : the objects to write, must be serializable into json or have a method `to_dict()`
+        """
+
+        lines = ''.join(f"{json.dumps(obj, default=json_default)}\n" for obj in objs)
+
+        with self.lock :
+            self.file.write(lines)
+            self.offset += len(lines)
+            count = lines.count('\n')
+            self.lines += count
+            self.pending += count
+            
+            if self.pending >= self.flush_every :
+                self._flush()
+
+
+    def write_frame(self,
+                    dataframe: "pl.DataFrame") -> None :
+        """
+        Write the rows of a DataFrame, one per line, serialized by Polars without building an object per row
+
+            Args
+                dataframe : [pl.DataFrame] : the rows to write
+        """
+
+        lines = dataframe.write_ndjson()
+
+        with self.lock :
+            self.file.write(lines)
+            # Polars does not escape the non ascii characters
+            self.offset += len(lines.encode('utf-8'))
+            self.lines += dataframe.height
+            self.pending += dataframe.height
+            
+            if self.pending >= self.flush_every :
+                self._flush()
+
+
+    def _flush(self) -> None :
+        """
+        Flush the file to the disk, the lock must be held
+        """
+
+        if self.file.closed :
+            return
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+
+    def flush(self) -> None :
+        """
+        Flush the lines already written to the disk
+        """
+
+        with self.lock :
+            self._flush()
+
+
+    def close(self) -> None :
+        """
+        Flush and close the file
+        """
+
+        with self.lock :
+            if not self.file.closed :
+                self._flush()
+                self.file.close()
+                logging.info(f"({self.lines}) lines saved successfully into the ndjson file at location '{self.fp}'")
+
+
+    def __enter__(self) -> "NDJSONWriter" :
+        return self
+
+
+    def __exit__(self, *args: Any) -> None :
+        self.close()
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= RunManifest ======================================================================= #
+# ==================================================================================================================================================================== #
+class RunManifest() :
+
+
+    def __init__(self,
+                 fp: str,
+                 flush_every: int=100) -> None :
+        """
+        Durable journal of the work done by a run (listing pages, product urls, finished stages), so that a stopped run
+        restarted for the same date only does the remaining work. Each entry keeps the size of the output file once
+        the output of the entry is written : before the entries are saved, the output files are flushed to the disk,
+        so a saved entry always refers to saved output, and the output written after the last saved entry is cut on resume
+        Constructor : read the entries of a previous run and open the journal
+
+            Args
+                fp : [string] : the path of the journal (ndjson file)
+                flush_every : [integer] : the number of entries kept in memory before being saved :default:100
+        """
+
+        self.fp = fp
+        self.flush_every = flush_every
+        self.writers = []
+        self.pending = []
+        self.lock = threading.Lock()
+
+        # For each stage, the keys already done and the size of the output after each one
+        self.entries = {}
+        if os.path.isfile(fp) :
+            for entry in read_ndjson(fp=fp) :
+                self.entries.setdefault(entry["stage"], {})[entry["key"]] = entry.get("offset")
+            logging.info(f"Resuming the run of the manifest '{fp}' : { {stage : len(keys) for stage, keys in self.entries.items()} }")
+
+        os.makedirs(os.path.dirname(os.path.abspath(fp)), exist_ok=True)
+        self.file = open(fp, 'a', encoding='utf-8')
+
+
+    def done(self,
+             stage: str) -> Dict[Any, Union[int, None]] :
+        """
+        Get the keys of a stage already done
+
+            Args
+                stage : [string] : the stage (e.g. 'pages', 'products')
+
+            Return
+                [dictionary] : each key done and the size of the output file after it
+        """
+
+        with self.lock :
+            return dict(self.entries.get(stage, {}))
+
+
+    def is_stage_done(self,
+                      stage: str) -> bool :
+        """
+        Check if a whole stage was finished
+
+            Args
+                stage : [string] : the stage name (e.g. 'products-list')
+
+            Return
+                [boolean] : True when :func:mark_stage_done was called for the stage
+        """
+
+        return stage in self.done("stages")
+
+
+    def open_output(self,
+                    stage: str,
+                    fp: str,
+                    **kwargs: Any) -> NDJSONWriter :
+        """
+        Open the output file of a stage : it is appended after the output of the keys already done (what was written after is cut),
+        or started again when nothing is done. The file is flushed before the entries are saved
+
+            Args
+                stage : [string] : the stage whose keys are recorded with the size of this file
+                fp : [string] : the path of the output file
+                kwargs : [Any type] : other arguments given to `NDJSONWriter`
+
+            Return
+                [NDJSONWriter] : the writer of the output file
+        """
+
+        offsets = [offset for offset in self.done(stage).values() if offset is not None]
+
+        if offsets and os.path.isfile(fp) :
+            os.truncate(fp, min(max(offsets), os.path.getsize(fp)))
+            writer = NDJSONWriter(fp=fp, mode='a', **kwargs)
+        else :
+            writer = NDJSONWriter(fp=fp, mode='w', **kwargs)
+
+        with self.lock :
+            self.writers.append(writer)
+
+        return writer
+
+
+    def mark_done(self,
+                  stage: str,
+                  key: Any,
+                  offset: Union[int, None]=None) -> None :
+        """
+        Record that a key of a stage is done, the entries are saved every :attr:flush_every entries
+
+            Args
+                stage : [string] : the stage (e.g. 'pages', 'products')
+                key : [Any type] : the key done (e.g. the page number, the product url), must be serializable into json
+                offset : [integer or None] : the size of the output file after the output of the key :default:None
+        """
+
+        with self.lock :
+            self.entries.setdefault(stage, {})[key] = offset
+            self.pending.append({"stage" : stage, "key" : key, "offset" : offset})
+            
+            if len(self.pending) >= self.flush_every :
+                self._flush()
+
+
+    def mark_stage_done(self,
+                        stage: str) -> None :
+        """
+        Record that a whole stage is finished and save the journal
+
+            Args
+                stage : [string] : the stage name (e.g. 'products-list')
+        """
+
+        self.mark_done(stage="stages", key=stage)
+        self.flush()
+
+
+    def _flush(self) -> None :
+        """
+        Flush the output files and then save the pending entries, the lock must be held
+        """
+
+        for writer in self.writers :
+            writer.flush()
+
+        self.file.write(''.join(f"{json.dumps(entry)}\n" for entry in self.pending))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = []
+
+
+    def flush(self) -> None :
+        """
+        Flush the output files and then save the pending entries
+        """
+
+        with self.lock :
+            self._flush()
+
+
+    def close(self) -> None :
+        """
+        Save the pending entries and close the journal
+        """
+
+        with self.lock :
+            if not self.file.closed :
+                self._flush()
+                self.file.close()
+                self.writers = []
+
+
+
+def canonicalize_product_url(url: Any) -> Union[str, None] :
+
+    """
+    Get the canonical form of a product url : scheme and host in lower case, without query (e.g. '?variant='),
+    fragment nor trailing slash, so that two links to the same product give the same url
+        
+        Args
+            url : [Any type] : the link extracted from a listing page
+
+        Return
+            [string or None] : the canonical url, None when the link is not a valid http(s) url (e.g. the '' placeholders)
+    """
+
+    if not isinstance(url, str) or not url.strip() :
+        return None
+
+    parts = urlsplit(url.strip())
+    if parts.scheme.lower() not in ("http", "https") or not parts.netloc :
+        return None
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/') or '/', '', ''))
+
+
+def dedupe_product_urls(urls: Iterable[Any]) -> Tuple[List[str], Dict[str, int]] :
+
+    """
+    Canonicalize the product links and keep each product once, into the order of its first link
+        
+        Args
+            urls : [iterable of Any type] : the links extracted from the listing pages
+
+        Return
+            [tuple] : the unique canonical urls, and the counts 'total', 'unique', 'duplicates' and 'invalid'
+    """
+
+    # The output data
+    unique_urls = []
+    stats = {"total" : 0, "unique" : 0, "duplicates" : 0, "invalid" : 0}
+    seen = set()
+
+    for url in urls :
+        stats["total"] += 1
+        canonical_url = canonicalize_product_url(url)
+
+        if canonical_url is None :
+            stats["invalid"] += 1
+        elif canonical_url in seen :
+            stats["duplicates"] += 1
+        else :
+            seen.add(canonical_url)
+            unique_urls.append(canonical_url)
+
+    stats["unique"] = len(unique_urls)
+
+    return unique_urls, stats
+
+
+def read_ndjson(fp: str) -> Iterator[Any] :
+
+    """
+    Read a newline-delimited json file one line at a time
+        
+        Args
+            fp : [string] : path to the ndjson file
+
+        Return
+            [iterator of Any type] : the object of each line, a truncated last line (stopped run) is skipped
+
+        Raises
+            [FileNotFoundError] : when the file at the location :param:fp is missing
+            [PermissionError] : when having no permission on reading the file
+    """
+
+    with open(fp, 'r', encoding='utf-8') as file :
+        for line in file :
+            if line.strip() :
+                try :
+                    yield json.loads(line)
+
+                except json.JSONDecodeError :
+                    logging.warning(f"Skipping a truncated line of the ndjson file '{fp}'")
+
+
+def ndjson_to_parquet(ndjson_fp: str,
+                      parquet_fp: str,
+                      schema: Dict[str, Any],
+                      compression: str='zstd') -> Union[str, None] :
+
+    """
+    Convert a newline-delimited json file into a compressed parquet file with a fixed schema,
+    the file is streamed so the memory does not grow with its size
+        
+        Args
+            ndjson_fp : [string] : path to the ndjson file
+            parquet_fp : [string] : the path where to store the parquet file
+            schema : [dictionary] : the name and the polars type of each column, the other fields are dropped
+            compression : [string] : the compression of the parquet file :default:'zstd'
+
+        Return
+            [string or None] : the path of the parquet file, None when the conversion failed
+
+        Raises
+            [FileNotFoundError] : when the file at the location :param:ndjson_fp is missing
+            [Exception] : for other exceptions (e.g. a value that does not match the schema)
+    """
+
+    # The output data
+    output_fp = None
+
+    import polars as pl
+
+    try :
+        pl.scan_ndjson(ndjson_fp, schema=schema).sink_parquet(parquet_fp, compression=compression)
+        output_fp = parquet_fp
+        logging.info(f"Data converted successfully into the parquet file at location '{parquet_fp}'")
+
+    except FileNotFoundError :
+        logging.error(f"Cannot find the ndjson file at location : '{ndjson_fp}'")
+
+    except Exception as error :
+        logging.error(f"An error occured during converting '{ndjson_fp}' into the parquet file '{parquet_fp}' : {error}")
+
+    finally :
+        return output_fp
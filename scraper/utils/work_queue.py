@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Union
+
+from .utilities import json_default
+
+
+
+# Status of the urls of the queue
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+
+
+# ==================================================================================================================================================================== #
+# ======================================================================= WorkQueue ======================================================================= #
+# ==================================================================================================================================================================== #
+class WorkQueue() :
+
+
+    def __init__(self,
+                 fp: str,
+                 lease_seconds: float=300.0,
+                 max_attempts: int=3,
+                 journal_mode: str="WAL") -> None :
+        """
+        Durable frontier of urls stored into a SQLite file, shared by several worker processes (on the same host, or on hosts
+        that share the storage with working file locks) : the listing stages push the urls, the workers claim them with a lease
+        and complete them with their output. A url whose lease expired (stopped worker) is claimed again by another worker,
+        and only the holder of the lease can complete it, so the output of each url is saved exactly once
+        Constructor : create the tables when they do not exist
+
+            Args
+                fp : [string] : the path of the SQLite file
+                lease_seconds : [float] : the seconds a worker has to complete a claimed url :default:300.0
+                max_attempts : [integer] : a url claimed this number of times without being completed is failed :default:3
+                journal_mode : [string] : the journal of SQLite, 'WAL' for workers on the same host,
+                        'DELETE' for a storage shared by several hosts (WAL needs a shared memory) :default:'WAL'
+        """
+
+        self.fp = fp
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.journal_mode = journal_mode
+        # One connection per thread, a sqlite3 connection cannot be shared between threads
+        self.local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(fp)), exist_ok=True)
+        with self.transaction() as connection :
+            connection.execute("CREATE TABLE IF NOT EXISTS urls (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE NOT NULL, "
+                               "status TEXT NOT NULL DEFAULT 'pending', owner TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+                               "output TEXT, error TEXT)")
+            connection.execute("CREATE INDEX IF NOT EXISTS urls_status ON urls (status, lease_until)")
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+    @property
+    def connection(self) -> sqlite3.Connection :
+        """
+        Get the connection of the current thread, opened at the first use
+        """
+
+        if getattr(self.local, "connection", None) is None :
+            # Transactions are opened explicitly, the writers wait for the lock instead of failing
+            connection = sqlite3.connect(self.fp, timeout=60, isolation_level=None)
+            connection.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            connection.execute("PRAGMA synchronous=NORMAL" if self.journal_mode.upper() == "WAL" else "PRAGMA synchronous=FULL")
+            self.local.connection = connection
+
+        return self.local.connection
+
+
+    def transaction(self) -> "_Transaction" :
+        """
+        Open a write transaction : the lock of the file is taken at the start, so that two workers never claim the same urls
+        """
+
+        return _Transaction(self.connection)
+
+
+    def push(self,
+             urls: Iterable[str]) -> int :
+        """
+        Add urls to the queue, the urls already into the queue (whatever their status) are skipped
+
+            Args
+                urls : [iterable of string] : the urls to add
+
+            Return
+                [integer] : the number of urls added
+        """
+
+        with self.transaction() as connection :
+            before = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO urls (url) VALUES (?)", ((url,) for url in urls))
+            return connection.total_changes - before
+
+
+    def close_input(self) -> None :
+        """
+        Record that no more urls will be pushed : the workers stop once the queue is drained
+        """
+
+        with self.transaction() as connection :
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('input_closed', '1')")
+
+
+    def reopen_input(self) -> None :
+        """
+        Record that urls will be pushed again, at the start of a run : the flag of :func:close_input left by a stopped run
+        of the same queue would make the workers stop before the urls pushed by the new run
+        """
+
+        with self.transaction() as connection :
+            connection.execute("DELETE FROM meta WHERE key = 'input_closed'")
+
+
+    def is_input_closed(self) -> bool :
+        """
+        Check if the pushing stage is finished, see :func:close_input
+        """
+
+        return self.connection.execute("SELECT 1 FROM meta WHERE key = 'input_closed'").fetchone() is not None
+
+
+    def claim(self,
+              owner: str,
+              n: int=1) -> List[str] :
+        """
+        Lease the next pending urls (or the urls whose lease expired) to a worker
+
+            Args
+                owner : [string] : the unique name of the worker (e.g. '<host>-<pid>')
+                n : [integer] : the maximum number of urls to claim :default:1
+
+            Return
+                [list of string] : the urls claimed into the order of the queue, empty list when nothing can be claimed now
+        """
+
+        now = time.time()
+
+        with self.transaction() as connection :
+            # Expired leases claimed too many times are given up
+            connection.execute("UPDATE urls SET status = ?, owner = NULL, error = 'lease expired too many times' "
+                               "WHERE status = ? AND lease_until < ? AND attempts >= ?", (FAILED, LEASED, now, self.max_attempts))
+            rows = connection.execute("SELECT id, url FROM urls WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY id LIMIT ?",
+                                      (PENDING, LEASED, now, n)).fetchall()
+            connection.executemany("UPDATE urls SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                                   ((LEASED, owner, now + self.lease_seconds, row_id) for row_id, _ in rows))
+
+        return [url for _, url in rows]
+
+
+    def complete(self,
+                 owner: str,
+                 url: str,
+                 output: Iterable[Any]) -> bool :
+        """
+        Save the output of a url and mark it done, in the same transaction, when the worker still holds its lease
+
+            Args
+                owner : [string] : the worker that claimed the url
+                url : [string] : the url
+                output : [iterable of Any type] : the objects extracted from the url, serializable into json or with a method `to_dict()`
+
+            Return
+                [boolean] : True when the url is completed, False when the lease was taken by another worker (the output is discarded)
+        """
+
+        lines = ''.join(f"{json.dumps(obj, default=json_default)}\n" for obj in output)
+
+        with self.transaction() as connection :
+            cursor = connection.execute("UPDATE urls SET status = ?, output = ?, lease_until = NULL WHERE url = ? AND status = ? AND owner = ?",
+                                        (DONE, lines, url, LEASED, owner))
+
+        return cursor.rowcount == 1
+
+
+    def fail(self,
+             owner: str,
+             url: str,
+             error: str) -> None :
+        """
+        Give back a url that the worker could not process : it is claimed again later, or failed after :attr:max_attempts attempts
+
+            Args
+                owner : [string] : the worker that claimed the url
+                url : [string] : the url
+                error : [string] : the reason, kept into the queue
+        """
+
+        with self.transaction() as connection :
+            connection.execute("UPDATE urls SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, owner = NULL, lease_until = NULL, error = ? "
+                               "WHERE url = ? AND status = ? AND owner = ?", (self.max_attempts, FAILED, PENDING, error, url, LEASED, owner))
+
+
+    def is_drained(self) -> bool :
+        """
+        Check if the work is finished : no more urls will be pushed and all of them are done or failed
+        """
+
+        return self.is_input_closed() and self.connection.execute("SELECT 1 FROM urls WHERE status IN (?, ?) LIMIT 1", (PENDING, LEASED)).fetchone() is None
+
+
+    def export(self,
+               fp: str) -> int :
+        """
+        Write the output of all the urls done into a ndjson file, into the order of the queue
+
+            Args
+                fp : [string] : the path of the ndjson file
+
+            Return
+                [integer] : the number of lines written
+        """
+
+        n_lines = 0
+        os.makedirs(os.path.dirname(os.path.abspath(fp)), exist_ok=True)
+
+        with open(fp, 'w', encoding='utf-8') as file :
+            for (output,) in self.connection.execute("SELECT output FROM urls WHERE status = ? ORDER BY id", (DONE,)) :
+                file.write(output)
+                n_lines += output.count('\n')
+
+        logging.info(f"({n_lines}) lines of the work queue '{self.fp}' saved into the ndjson file at location '{fp}'")
+
+        return n_lines
+
+
+    def get_stats(self) -> Dict[str, int] :
+        """
+        Count the urls of each status
+
+            Return
+                [dictionary] : the number of urls 'pending', 'leased', 'done' and 'failed'
+        """
+
+        counts = dict(self.connection.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall())
+
+        return {status : counts.get(status, 0) for status in (PENDING, LEASED, DONE, FAILED)}
+
+
+    def close(self) -> None :
+        """
+        Close the connection of the current thread
+        """
+
+        if getattr(self.local, "connection", None) is not None :
+            self.local.connection.close()
+            self.local.connection = None
+
+
+
+class _Transaction() :
+    """
+    Context of a write transaction ('BEGIN IMMEDIATE'), committed at the end or rolled back on error
+    """
+
+    def __init__(self, connection: sqlite3.Connection) -> None :
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection :
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type: Any, *args: Any) -> None :
+        self.connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+
+def run_queue_worker(work_queue: WorkQueue,
+                     extractor: Any,
+                     owner: str,
+                     batch_size: int=100,
+                     poll_seconds: float=1.0) -> Dict[str, int] :
+    """
+    Claim batches of product urls from the queue, extract them with the extractor (concurrently) and complete each url
+    with its variants, until the queue is drained. The extractor gives None instead of the variants when a product cannot be fetched,
+    such a url is given back to the queue (see :func:WorkQueue.fail) to be claimed again, a product without variants is completed
+
+        Args
+            work_queue : [WorkQueue] : the shared queue
+            extractor : [KoroshiProductDataExtractor] : the extractor of the worker, see :func:extract_products_data
+            owner : [string] : the unique name of the worker
+            batch_size : [integer] : the number of urls claimed at once :default:100
+            poll_seconds : [float] : the seconds waited when nothing can be claimed yet :default:1.0
+
+        Return
+            [dictionary] : the number of urls 'completed', 'rejected' (lease lost) and 'failed' (not fetched) by the worker
+    """
+
+    stats = {"completed" : 0, "rejected" : 0, "failed" : 0}
+
+    def complete(product_url: str, variants: Union[List[Any], None]) -> None :
+        if variants is None :
+            work_queue.fail(owner=owner, url=product_url, error="the product cannot be fetched")
+            stats["failed"] += 1
+            return
+        stats["completed" if work_queue.complete(owner=owner, url=product_url, output=variants) else "rejected"] += 1
+
+    while True :
+        urls = work_queue.claim(owner=owner, n=batch_size)
+
+        if not urls :
+            if work_queue.is_drained() :
+                break
+            # The listing stage is still pushing, or other workers hold the last leases
+            time.sleep(poll_seconds)
+            continue
+
+        try :
+            extractor.extract_products_data(products_urls=urls, callback=complete)
+        except Exception as error :
+            for url in urls :
+                work_queue.fail(owner=owner, url=url, error=str(error))
+
+    logging.info(f"Worker '{owner}' finished : {stats}")
+
+    return stats
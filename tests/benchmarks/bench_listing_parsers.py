@@ -0,0 +1,84 @@
+"""
+    Micro-benchmark of the parser backends of `KoroshiProductsListExtractor` on listing pages
+
+    Usage :
+        python tests/benchmarks/bench_listing_parsers.py [--pages <directory of saved listing pages (*.html)> --config <config.json>] [--repeat N]
+
+    Without saved pages, synthetic pages of 48 products are used. For each backend, print the mean time to extract
+    the links of one page and check that all backends give the same links than 'html.parser'
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            '..')
+                            )
+sys.path.append(SCRAPER_PATH)
+
+from scraper.extract.extract_data import KoroshiProductsListExtractor, PARSER_BACKENDS
+from scraper.utils.utilities import read_json
+
+
+# Selector of the product's links of the synthetic pages
+SYNTHETIC_PRODUCTS_CONFIG = {"selector" : "div.product-grid a.product-link", "attribute" : "href", "url-prefix" : ""}
+
+
+def synthetic_page(n_products: int=48) -> str :
+    """
+        Build a listing page with :param:n_products product cards and the noise of a real page (scripts, menu, images, prices)
+    """
+
+    head = "<script>var settings = {};</script><link rel='stylesheet' href='/style.css'/>" * 30
+    menu = "<li><a href='/collections/x'>collection</a><ul><li><a href='/collections/y'>sub</a></li></ul></li>" * 50
+    cards = ''.join(
+        f"<li class='card'><a class='product-link' href='/fr-fi/products/product-{n}?variant={n}'>"
+        f"<img src='/img/{n}.jpg' alt='product {n}'/></a><span class='badge'>new</span>"
+        f"<p class='price'><s>39,99 €</s> 29,99 €</p><p class='desc'>{'lorem ipsum ' * 20}</p></li>"
+        for n in range(n_products)
+    )
+
+    return f"<html><head>{head}</head><body><nav><ul>{menu}</ul></nav><div class='product-grid'><ul>{cards}</ul></div></body></html>"
+
+
+def main() -> None :
+
+    parser = argparse.ArgumentParser(description="Compare the parser backends on listing pages")
+    parser.add_argument("--pages", default=None, help="directory of saved listing pages (*.html)")
+    parser.add_argument("--config", default=None, help="the configuration file, its 'products-list.products' is used with --pages")
+    parser.add_argument("--repeat", type=int, default=20, help="number of times each page is parsed")
+    args = parser.parse_args()
+
+    if args.pages is not None :
+        products_config = read_json(fp=args.config)["products-list"]["products"]
+        pages = [open(fp, encoding='utf-8').read() for fp in sorted(glob.glob(os.path.join(args.pages, "*.html")))]
+    else :
+        products_config = SYNTHETIC_PRODUCTS_CONFIG
+        pages = [synthetic_page()] * 5
+    print(f"{len(pages)} pages, {args.repeat} repeats, selector '{products_config['selector']}'")
+
+    reference = None
+    log_file = os.path.join(tempfile.gettempdir(), "bench_listing_parsers.log")
+
+    for backend in PARSER_BACKENDS :
+        extractor = KoroshiProductsListExtractor(configuration={"products-list" : {"products" : products_config, "parser" : backend}},
+                                                 file_log=log_file)
+        if extractor.parser != backend :
+            print(f"{backend:<12} not installed")
+            continue
+
+        start = time.perf_counter()
+        for _ in range(args.repeat) :
+            links = [extractor.select_attributes(html=page, selector=products_config["selector"], attribute=products_config["attribute"]) for page in pages]
+        elapsed = (time.perf_counter() - start) / (args.repeat * len(pages))
+
+        reference = links if reference is None else reference
+        print(f"{backend:<12} {elapsed * 1000:8.2f} ms/page  {sum(map(len, links)):6d} links  identical={links == reference}")
+
+
+if __name__ == "__main__" :
+    main()
@@ -0,0 +1,150 @@
+"""
+    Benchmark of the listing, detail and load stages against the local fake store (no network access)
+
+    Usage :
+        python tests/benchmarks/bench_pipeline.py [--products 100000] [--latency 0.005] [--error-rate 0.01]
+                                                  [--concurrency 16] [--prefetch-window 8] [--flatten records|batch]
+                                                  [--stages list,detail,load] [--database-url <url>] [--load-mode incremental|replace|copy]
+                                                  [--output results.json]
+
+    Each stage runs like in the pipeline (the variants are streamed into a ndjson file, then loaded by batches), and reports
+    its wall time, its throughput and the growth of the peak memory of the process. Without --database-url, the load goes
+    into a temporary SQLite database (the modes 'replace' and 'copy' need PostgreSQL)
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+
+SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            '..')
+                            )
+sys.path.append(SCRAPER_PATH)
+
+from scraper.extract.extract_data import KoroshiProductsListExtractor, KoroshiProductDataExtractor
+from scraper.extract.transport import HTTPTransport
+from scraper.load.load_data import KoroshiDataLoader, COPY_CHUNK_SIZE
+from scraper.utils.utilities import NDJSONWriter, dedupe_product_urls
+from tests.fake_store import FakeStore
+
+
+def peak_rss_mb() -> float :
+    """
+        Peak resident memory of the process in MiB (kilobytes on Linux, bytes on macOS)
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_stage(name: str, function, unit: str, results: dict) -> object :
+    """
+        Run a stage, print and keep its wall time, its throughput (the function returns the number of :param:unit) and its memory
+    """
+
+    memory_before = peak_rss_mb()
+    start = time.perf_counter()
+    output, count = function()
+    elapsed = time.perf_counter() - start
+    memory_after = peak_rss_mb()
+
+    results[name] = {"seconds" : round(elapsed, 3), unit : count, f"{unit}_per_second" : round(count / elapsed, 1) if elapsed > 0 else None,
+                     "peak_rss_mb" : round(memory_after, 1), "peak_rss_growth_mb" : round(memory_after - memory_before, 1)}
+    print(f"{name:<8} {elapsed:9.2f} s  {count:9d} {unit:<9} {count / elapsed if elapsed > 0 else 0:10.1f} {unit}/s  "
+          f"peak rss {memory_after:8.1f} MiB (+{memory_after - memory_before:.1f})")
+
+    return output
+
+
+def main() -> None :
+
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the pipeline against a local fake store")
+    parser.add_argument("--products", type=int, default=10_000, help="size of the synthetic catalog")
+    parser.add_argument("--variants", type=int, default=3, help="variants per product")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds waited by the store before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="part of the requests answered with a 503")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests sent at the same time by the detail stage")
+    parser.add_argument("--prefetch-window", type=int, default=8, help="listing pages fetched at the same time")
+    parser.add_argument("--flatten", choices=("records", "batch"), default="records", help="variants built one product at a time or by Polars batches")
+    parser.add_argument("--stages", default="list,detail,load", help="stages to run, separated by commas")
+    parser.add_argument("--database-url", default=None, help="database of the load stage, a temporary SQLite database by default")
+    parser.add_argument("--load-mode", default="incremental", help="mode of the loader ('replace' and 'copy' need PostgreSQL)")
+    parser.add_argument("--output", default=None, help="json file where the results are saved")
+    args = parser.parse_args()
+
+    # The logs of the extractors and of the loader are written into the log file only
+    logging.basicConfig(handlers=[logging.NullHandler()])
+
+    stages = args.stages.split(',')
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    log_file = os.path.join(workdir, "bench.log")
+    data_fp = os.path.join(workdir, "products_data.ndjson")
+    results = {"parameters" : vars(args)}
+
+    with FakeStore(n_products=args.products, variants_per_product=args.variants, latency=args.latency, error_rate=args.error_rate) as store :
+        configuration = store.configuration(**{"page-product" : {"concurrency" : args.concurrency}})
+        transport = HTTPTransport(pool_maxsize=max(args.concurrency, args.prefetch_window), backoff_factor=0.01, backoff_jitter=0.01)
+        print(f"Fake store at {store.url} : {args.products} products, {args.variants} variants per product, "
+              f"latency {args.latency} s, error rate {args.error_rate}")
+
+        # Listing pages -> product links
+        products_list = [store.product_url(n) for n in range(args.products)]
+        if "list" in stages :
+            list_extractor = KoroshiProductsListExtractor(configuration=configuration, file_log=log_file, transport=transport)
+
+            def listing() -> tuple :
+                links = list_extractor.get_all_pages_products_list(url=configuration["main-url"], prefetch_window=args.prefetch_window)
+                return links, len(links)
+
+            products_list, _ = dedupe_product_urls(run_stage("list", listing, "products", results))
+
+        # Product payloads -> ndjson file of variants
+        if "detail" in stages or "load" in stages :
+            data_extractor = KoroshiProductDataExtractor(configuration=configuration, file_log=log_file, transport=transport)
+
+            def detail() -> tuple :
+                with NDJSONWriter(fp=data_fp) as writer :
+                    if args.flatten == "batch" :
+                        for start in range(0, len(products_list), 1000) :
+                            writer.write_frame(data_extractor.extract_products_frame(products_urls=products_list[start:start + 1000]))
+                    else :
+                        data_extractor.extract_products_data(products_urls=products_list,
+                                                             callback=lambda product_url, variants : writer.write_many(variants or []))
+                return data_fp, writer.lines
+
+            run_stage("detail", detail, "variants", results)
+
+        results["requests"] = dict(store.requests)
+        results["connections"] = transport.connection_stats()
+        transport.close()
+
+    # ndjson file -> database
+    if "load" in stages :
+        database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.sqlite')}"
+        dataloader = KoroshiDataLoader(connection_url=database_url, table="bench_variants", file_log=log_file, mode=args.load_mode)
+
+        def load() -> tuple :
+            rows = 0
+            def counted(batches) :
+                nonlocal rows
+                for batch in batches :
+                    rows += batch.height
+                    yield batch
+            dataloader.load_batches(counted(dataloader.scan_data(fp=data_fp).collect_batches(chunk_size=COPY_CHUNK_SIZE)))
+            return None, rows
+
+        run_stage("load", load, "rows", results)
+
+    print(f"Requests served : {results['requests']}")
+    if args.output is not None :
+        with open(args.output, 'w') as file :
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__" :
+    main()
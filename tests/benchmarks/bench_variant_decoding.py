@@ -0,0 +1,139 @@
+"""
+    Micro-benchmark of the decoding of '<product>.js' payloads into variants
+
+    Usage :
+        python tests/benchmarks/bench_variant_decoding.py [--payloads <directory of saved product payloads (*.js or *.json)>] [--repeat N]
+
+    Without saved payloads, synthetic products of 12 variants are used (with the fields of a real payload that are not extracted).
+    Compare the former way (`json.loads(response.text)` then one dictionary per variant) with `decode_product_variants()`
+    (bytes straight into slotted records, through msgspec when it is installed) : time per variant and memory kept per variant
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tracemalloc
+
+SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            '..')
+                            )
+sys.path.append(SCRAPER_PATH)
+
+from scraper.extract import records
+from scraper.extract.records import decode_product_variants
+
+
+def synthetic_payload(product_id: int, n_variants: int=12) -> bytes :
+    """
+        Build the body of a '<product>.js' response, with the fields of a real payload that are not extracted
+    """
+
+    return json.dumps({
+        "id" : product_id,
+        "title" : f"Product {product_id}",
+        "handle" : f"product-{product_id}",
+        "description" : "<p>" + "lorem ipsum " * 80 + "</p>",
+        "published_at" : "2024-01-01T00:00:00+01:00",
+        "vendor" : "Koroshi",
+        "type" : "Veste",
+        "tags" : ["homme", "hiver", "nouveau"],
+        "images" : [f"//cdn.fake/{product_id}-{n}.jpg" for n in range(6)],
+        "options" : [{"name" : "Couleur", "position" : 1, "values" : ["Noir", "Bleu"]}, {"name" : "Taille", "position" : 2, "values" : ["S", "M", "L"]}],
+        "variants" : [
+            {
+                "id" : product_id * 100 + n,
+                "title" : f"Noir / {n}",
+                "option1" : "Noir",
+                "option2" : str(n),
+                "option3" : None,
+                "sku" : f"SKU-{product_id}-{n}",
+                "requires_shipping" : True,
+                "taxable" : True,
+                "featured_image" : {"id" : n, "product_id" : product_id, "position" : 1, "alt" : None, "width" : 1200, "height" : 1600,
+                                    "src" : f"//cdn.fake/{product_id}-{n}.jpg", "variant_ids" : [product_id * 100 + n]},
+                "available" : n % 3 != 0,
+                "name" : f"Product {product_id} - Noir / {n}",
+                "public_title" : f"Noir / {n}",
+                "options" : ["Noir", str(n)],
+                "price" : 4999,
+                "weight" : 500,
+                "compare_at_price" : 6999,
+                "inventory_management" : "shopify",
+                "barcode" : f"3700000{product_id:06d}{n:02d}"
+            }
+            for n in range(n_variants)
+        ]
+    }).encode()
+
+
+def decode_with_dictionaries(body: bytes, url: str) -> list :
+    """
+        The former extraction : the payload is decoded into text, then into a tree of dictionaries, then copied into a dictionary per variant
+    """
+
+    data = json.loads(body.decode('utf-8'))
+
+    return list(
+        map(
+            lambda variant : {
+                    "product_url" : url,
+                    "product_id" : variant['id'],
+                    "product_sku" : variant['sku'],
+                    "product_name" : data['title'],
+                    "product_color" : variant['option1'],
+                    "product_size" : variant['option2'],
+                    "product_image" : variant['featured_image']['src'],
+                    "product_description" : data['description'],
+                    "product_net_price" : variant['price'],
+                    "product_gross_price" : variant['compare_at_price'],
+                    "product_stock_status" : variant['available'],
+                    "product_barcode" : variant['barcode']
+                },
+            data['variants']
+        )
+    )
+
+
+def measure(function, payloads: list, repeat: int) -> tuple :
+    """
+        Get the time per variant (µs) and the memory kept per variant (bytes) of a decoding function
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat) :
+        n_variants = sum(len(function(body, "https://fake-store.com/products/p")) for body in payloads)
+    elapsed = (time.perf_counter() - start) / (repeat * n_variants)
+
+    # Memory of the variants that are kept (the payloads are released after the decoding)
+    tracemalloc.start()
+    variants = [function(body, "https://fake-store.com/products/p") for body in payloads]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del variants
+
+    return elapsed * 1e6, size / n_variants, n_variants
+
+
+def main() -> None :
+
+    parser = argparse.ArgumentParser(description="Compare the decoding of product payloads into variants")
+    parser.add_argument("--payloads", default=None, help="directory of saved product payloads (*.js or *.json)")
+    parser.add_argument("--repeat", type=int, default=20, help="number of times each payload is decoded")
+    args = parser.parse_args()
+
+    if args.payloads is not None :
+        payloads = [open(fp, 'rb').read() for fp in sorted(glob.glob(os.path.join(args.payloads, "*.js")) + glob.glob(os.path.join(args.payloads, "*.json")))]
+    else :
+        payloads = [synthetic_payload(product_id) for product_id in range(200)]
+    print(f"{len(payloads)} payloads, {args.repeat} repeats, decoder '{'msgspec' if records.msgspec is not None else 'json'}'")
+
+    for name, function in (("dictionaries", decode_with_dictionaries), ("records", decode_product_variants)) :
+        elapsed, size, n_variants = measure(function=function, payloads=payloads, repeat=args.repeat)
+        print(f"{name:<14} {elapsed:8.2f} µs/variant  {size:8.0f} bytes/variant  {n_variants:6d} variants")
+
+
+if __name__ == "__main__" :
+    main()
@@ -0,0 +1,301 @@
+"""
+    Local stand-in of the Koroshi store, used by the offline tests and the benchmarks
+
+    Serves, for a synthetic catalog of any size (the pages and payloads are built on demand, nothing is kept in memory) :
+        - the listing pages '/fr-fi/collections/all?page=<n>'
+        - the product payloads '/fr-fi/products/<handle>.js'
+        - the bulk endpoint '/fr-fi/products.json?limit=<n>&page=<n>'
+        - the sitemap index '/sitemap.xml' and the product sitemaps '/sitemap_products_<n>.xml', with a 'lastmod' per product
+    with a configurable latency and a rate of errors (503 or 429 with 'Retry-After')
+    and `FlakyHandler`, a minimal keep-alive server shared by the transport and metrics tests
+
+    Usage :
+        with FakeStore(n_products=1000, latency=0.01) as store :
+            configuration = store.configuration()
+"""
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Union
+from urllib.parse import urlsplit, parse_qs
+
+
+# Path of the pages of the store
+LISTING_PATH = "/fr-fi/collections/all"
+PRODUCTS_PATH = "/fr-fi/products"
+SITEMAP_PATH = "/sitemap.xml"
+
+# 'lastmod' of the products that were not modified (see `FakeStore.modified`)
+DEFAULT_LASTMOD = "2026-01-01T00:00:00+00:00"
+
+
+class FakeStore() :
+
+
+    def __init__(self,
+                 n_products: int=1000,
+                 variants_per_product: int=3,
+                 products_per_page: int=48,
+                 latency: float=0.0,
+                 error_rate: float=0.0,
+                 error_status: int=503,
+                 products_per_sitemap: int=1000,
+                 seed: int=0) -> None :
+        """
+        Fake store served on a random port of 127.0.0.1, with keep-alive connections
+
+            Args
+                n_products : [integer] : the size of the catalog :default:1000
+                variants_per_product : [integer] : the number of variants of each product :default:3
+                products_per_page : [integer] : the number of products of a listing page :default:48
+                latency : [float] : seconds waited before each response :default:0.0
+                error_rate : [float] : the part of the requests answered with :param:error_status :default:0.0
+                error_status : [integer] : the status of the errors, 429 is sent with 'Retry-After: 0' :default:503
+                products_per_sitemap : [integer] : the number of products of each product sitemap :default:1000
+                seed : [integer] : the seed of the errors, so that a run can be reproduced :default:0
+        """
+
+        self.n_products = n_products
+        self.variants_per_product = variants_per_product
+        self.products_per_page = products_per_page
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.products_per_sitemap = products_per_sitemap
+        # 'lastmod' of the modified products, the others have :data:DEFAULT_LASTMOD
+        self.modified = {}
+        # Ids of the products listed into the sitemaps whose payload answers 404, like a product deleted since the sitemap was built
+        self.missing = set()
+        self.requests = {"listing" : 0, "product" : 0, "catalog" : 0, "sitemap" : 0, "errors" : 0, "not_found" : 0}
+        self.server = None
+
+
+    @property
+    def url(self) -> str :
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+
+    def configuration(self, **overrides: Any) -> Dict[str, Any] :
+        """
+        Get a scraper configuration that points to the store, :param:overrides replace the top level keys
+        """
+
+        return {
+            "main-url" : f"{self.url}{LISTING_PATH}",
+            "products-list" : {
+                "products" : {"selector" : "div.product-grid a.product-link", "attribute" : "href", "url-prefix" : self.url},
+                "pagination" : {"type" : "parameter", "value" : "?page=<PNum>"}
+            },
+            "page-product" : {},
+            "catalog" : {"url" : f"{self.url}{PRODUCTS_PATH}.json"},
+            "sitemap" : {"url" : f"{self.url}{SITEMAP_PATH}"},
+            **overrides
+        }
+
+
+    def product_url(self, product_id: int) -> str :
+        return f"{self.url}{PRODUCTS_PATH}/product-{product_id}"
+
+
+    def product(self, product_id: int) -> Dict[str, Any] :
+        """
+        Build the '<product>.js' payload of a product, with the fields of a real payload that are not extracted
+        """
+
+        return {
+            "id" : product_id,
+            "title" : f"Product {product_id}",
+            "handle" : f"product-{product_id}",
+            "description" : f"<p>Description {product_id} " + "lorem ipsum " * 40 + "</p>",
+            "vendor" : "Koroshi",
+            "tags" : ["homme", "hiver"],
+            "images" : [f"//cdn.fake/{product_id}.jpg"],
+            "variants" : [
+                {
+                    "id" : product_id * 100 + n,
+                    "title" : f"Noir / {n}",
+                    "sku" : f"SKU-{product_id}-{n}",
+                    "option1" : "Noir",
+                    "option2" : str(n),
+                    "option3" : None,
+                    "featured_image" : {"id" : n, "src" : f"//cdn.fake/{product_id}-{n}.jpg", "width" : 1200, "height" : 1600},
+                    "price" : 2999 + n * 100,
+                    "compare_at_price" : 3999 if n % 2 else None,
+                    "available" : n % 3 != 0,
+                    "barcode" : f"37{product_id:08d}{n:02d}",
+                    "requires_shipping" : True,
+                    "weight" : 500
+                }
+                for n in range(self.variants_per_product)
+            ]
+        }
+
+
+    def catalog_product(self, product_id: int) -> Dict[str, Any] :
+        """
+        Build a product of the bulk endpoint (prices as strings, 'body_html')
+        """
+
+        product = self.product(product_id)
+        product["body_html"] = product.pop("description")
+        product["images"] = [{"src" : f"https:{src}"} for src in product["images"]]
+        for variant in product["variants"] :
+            variant["price"] = f"{variant['price'] / 100:.2f}"
+            variant["compare_at_price"] = None if variant["compare_at_price"] is None else f"{variant['compare_at_price'] / 100:.2f}"
+
+        return product
+
+
+    def listing_page(self, n_page: int) -> str :
+        """
+        Build a listing page, the pages after the last product have no products
+        """
+
+        first = (n_page - 1) * self.products_per_page
+        cards = ''.join(
+            f"<li class='card'><a class='product-link' href='{PRODUCTS_PATH}/product-{product_id}?variant={product_id * 100}'>"
+            f"<img src='/img/{product_id}.jpg'/></a><p class='price'>29,99 €</p></li>"
+            for product_id in range(max(first, 0), min(first + self.products_per_page, self.n_products))
+        )
+
+        return (f"<html><head><script>var settings = {{}};</script></head><body><nav><a href='/fr-fi/collections/x'>x</a></nav>"
+                f"<div class='product-grid'><ul>{cards}</ul></div></body></html>")
+
+
+    def sitemap(self, n_sitemap: Union[int, None]=None) -> str :
+        """
+        Build the sitemap index (:param:n_sitemap is None) or a product sitemap, numbered from 1
+        """
+
+        namespace = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+        if n_sitemap is None :
+            n_sitemaps = (self.n_products + self.products_per_sitemap - 1) // self.products_per_sitemap
+            entries = ''.join(f"<sitemap><loc>{self.url}/sitemap_products_{n}.xml?from=1&amp;to=9</loc></sitemap>" for n in range(1, n_sitemaps + 1))
+            return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{namespace}">{entries}<sitemap><loc>{self.url}/sitemap_pages_1.xml</loc></sitemap></sitemapindex>'
+
+        first = (n_sitemap - 1) * self.products_per_sitemap
+        entries = ''.join(f"<url><loc>{self.product_url(product_id)}</loc><lastmod>{self.modified.get(product_id, DEFAULT_LASTMOD)}</lastmod>"
+                          f"<changefreq>daily</changefreq></url>"
+                          for product_id in range(first, min(first + self.products_per_sitemap, self.n_products)))
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{namespace}"><url><loc>{self.url}/</loc></url>{entries}</urlset>'
+
+
+    def respond(self, path: str, query: Dict[str, Any]) -> Union[tuple, None] :
+        """
+        Get the (kind, content type, body) of a request, None when the page does not exist
+        """
+
+        if path == LISTING_PATH :
+            return "listing", "text/html; charset=utf-8", self.listing_page(int(query.get("page", ["1"])[0])).encode()
+
+        if path == f"{PRODUCTS_PATH}.json" :
+            limit, page = int(query.get("limit", ["250"])[0]), int(query.get("page", ["1"])[0])
+            products = [self.catalog_product(product_id) for product_id in range((page - 1) * limit, min(page * limit, self.n_products))]
+            return "catalog", "application/json", json.dumps({"products" : products}).encode()
+
+        if path == SITEMAP_PATH :
+            return "sitemap", "application/xml", self.sitemap().encode()
+
+        if path.startswith("/sitemap_products_") and path.endswith(".xml") :
+            return "sitemap", "application/xml", self.sitemap(int(path.removeprefix("/sitemap_products_").removesuffix(".xml"))).encode()
+
+        if path.startswith(f"{PRODUCTS_PATH}/product-") and path.endswith(".js") :
+            product_id = path.removeprefix(f"{PRODUCTS_PATH}/product-").removesuffix(".js")
+            if product_id.isdigit() and int(product_id) < self.n_products and int(product_id) not in self.missing :
+                return "product", "application/javascript", json.dumps(self.product(int(product_id))).encode()
+
+        return None
+
+
+    def handler(self) -> type :
+        """
+        Build the request handler class bound to the store
+        """
+
+        store = self
+
+        class Handler(BaseHTTPRequestHandler) :
+
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None :
+                if store.latency :
+                    time.sleep(store.latency)
+
+                url = urlsplit(self.path)
+                with store.lock :
+                    failed = store.error_rate > 0 and store.random.random() < store.error_rate
+
+                if failed :
+                    status, content_type, body = store.error_status, "text/plain", b"error"
+                    with store.lock :
+                        store.requests["errors"] += 1
+                else :
+                    response = store.respond(url.path, parse_qs(url.query))
+                    if response is None :
+                        kind, (status, content_type, body) = "not_found", (404, "text/plain", b"not found")
+                    else :
+                        kind, content_type, body = response
+                        status = 200
+                    with store.lock :
+                        store.requests[kind] += 1
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429 :
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None :
+                pass
+
+        return Handler
+
+
+    def start(self) -> "FakeStore" :
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+
+    def stop(self) -> None :
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self) -> "FakeStore" :
+        return self.start()
+
+
+    def __exit__(self, *args) -> None :
+        self.stop()
+
+
+class FlakyHandler(BaseHTTPRequestHandler) :
+    """
+        Keep-alive server : the paths '/flaky<...>' answer 503 to their first request and 200 after, other paths always answer 200
+    """
+
+    protocol_version = "HTTP/1.1"
+    calls = {}
+
+    def do_GET(self) -> None :
+        FlakyHandler.calls[self.path] = FlakyHandler.calls.get(self.path, 0) + 1
+        status = 503 if self.path.startswith("/flaky") and FlakyHandler.calls[self.path] == 1 else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None :
+        pass
@@ -1,5 +1,14 @@
 import os
 import sys
+import json
+import io
+import time
+import threading
+import pytest
+import requests
+import polars as pl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
 
 # Point to the scraper directory
 SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
@@ -10,8 +19,11 @@ SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
 sys.path.append(SCRAPER_PATH)
 
 
-from scraper.extract.extract_data import KoroshiProductsListExtractor,KoroshiProductDataExtractor
+from scraper.extract.extract_data import KoroshiProductsListExtractor,KoroshiProductDataExtractor,KoroshiCatalogExtractor,KoroshiImageExtractor,KoroshiSitemapExtractor
+from scraper.extract.records import ProductVariant, VARIANT_FIELDS, decode_product_variants, variants_from_product, flatten_product_payloads
 from scraper.utils.utilities import read_json
+from scraper.extract.transport import HTTPTransport
+from tests.fake_store import FakeStore, DEFAULT_LASTMOD
 
 
 # Point to the tests directory
@@ -41,7 +53,391 @@ def test_get_product_data() :
 
     product_data = koroshi_products_data_scraper.extract_product_data(product_url="https://koroshishop.com/fr-fi/products/ceinture-femme-effet-cuir?variant=55971618685303")
     assert len(product_data) > 0
-    assert product_data[0]["product_name"] == "Ceinture femme effet cuir"
+    assert product_data[0].product_name == "Ceinture femme effet cuir"
 
-    product_data = koroshi_products_data_scraper.extract_product_data(product_url="https://fake-url")
-    assert len(product_data) == 0
\ No newline at end of file
+    assert koroshi_products_data_scraper.extract_product_data(product_url="https://fake-url") is None
+
+
+class FakeResponse() :
+    """
+        Minimal stand-in of `requests.Response` used to test the extractors without network
+    """
+
+    def __init__(self, text: str, status_code: int=200) -> None :
+        self.text = text
+        self.content = text.encode()
+        self.status_code = status_code
+
+
+def fake_product_payload(product_id: int) -> str :
+    """
+        Build the body of a `<product>.js` response with 2 variants
+    """
+
+    return json.dumps({
+        "title" : f"Product {product_id}",
+        "description" : f"Description {product_id}",
+        "variants" : [
+            {
+                "id" : product_id * 10 + n,
+                "sku" : f"SKU-{product_id}-{n}",
+                "option1" : "Noir",
+                "option2" : "M",
+                "featured_image" : {"src" : f"https://cdn.fake/{product_id}.jpg"},
+                "price" : 2999,
+                "compare_at_price" : 3999,
+                "available" : True,
+                "barcode" : "3760000000000"
+            }
+            for n in range(2)
+        ]
+    })
+
+
+def test_extract_products_data_concurrently(monkeypatch) :
+
+    koroshi_products_data_scraper = KoroshiProductDataExtractor(configuration={"page-product" : {"concurrency" : 10}},
+                                                                file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/products.log'))
+
+    def fake_send_request(url: str) -> FakeResponse :
+        product_id = int(url.split('/')[-1].removesuffix('.js'))
+        # The first products are the slowest ones, so the completion order is not the input order
+        time.sleep(0.2 - product_id * 0.01)
+        return FakeResponse(fake_product_payload(product_id))
+
+    monkeypatch.setattr(koroshi_products_data_scraper, "send_request", fake_send_request)
+
+    products_urls = [f"https://fake-store.com/products/{n}?variant=1" for n in range(10)]
+    start = time.perf_counter()
+    product_data = koroshi_products_data_scraper.extract_products_data(products_urls=products_urls)
+    elapsed = time.perf_counter() - start
+
+    # The requests were sent at the same time
+    assert elapsed < 1
+    # Same variants, into the same order than the sequential extraction
+    assert product_data == [variant for url in products_urls for variant in koroshi_products_data_scraper.extract_product_data(product_url=url)]
+
+    # Given to a callback as soon as they are known, still into the same order
+    streamed_data = []
+    assert koroshi_products_data_scraper.extract_products_data(products_urls=products_urls,
+                                                               callback=lambda product_url, variants : streamed_data.extend(variants)) == []
+    assert streamed_data == product_data
+
+
+def test_extract_products_data_shared_across_locales(monkeypatch) :
+
+    koroshi_products_data_scraper = KoroshiProductDataExtractor(file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/products.log'))
+    requested_urls = []
+
+    def fake_send_request(url: str) -> FakeResponse :
+        requested_urls.append(url)
+        product_id = int(url.split('/')[-1].removesuffix('.js'))
+        payload = json.loads(fake_product_payload(product_id))
+        # Prices of the locale 'en-se', the second variant is not sold there
+        if "/en-se/" in url :
+            payload["variants"] = [{**payload["variants"][0], "price" : 34900, "available" : False}]
+        return FakeResponse(json.dumps(payload))
+
+    monkeypatch.setattr(koroshi_products_data_scraper, "send_request", fake_send_request)
+
+    products_urls = ["https://fake-store.com/fr-fi/products/1", "https://fake-store.com/fr-fi/products/2",
+                     "https://fake-store.com/en-se/products/1?variant=10", "https://fake-store.com/en-se/products/2"]
+    assert koroshi_products_data_scraper.group_products_urls(products_urls) == [[products_urls[0], products_urls[2]], [products_urls[1], products_urls[3]]]
+
+    # The links of a product follow its first link, the fields shared by the locales come from the first one
+    product_data = koroshi_products_data_scraper.extract_products_data(products_urls=products_urls)
+    assert [(variant.product_url, variant.product_id) for variant in product_data] == [
+        ("https://fake-store.com/fr-fi/products/1", 10), ("https://fake-store.com/fr-fi/products/1", 11), ("https://fake-store.com/en-se/products/1", 10),
+        ("https://fake-store.com/fr-fi/products/2", 20), ("https://fake-store.com/fr-fi/products/2", 21), ("https://fake-store.com/en-se/products/2", 20)
+    ]
+    assert (product_data[2].product_net_price, product_data[2].product_stock_status) == (34900, False)
+    assert product_data[2].product_name is product_data[0].product_name
+    assert len(requested_urls) == 4
+
+    # Given to the callback for each link
+    streamed_data = {}
+    koroshi_products_data_scraper.extract_products_data(products_urls=products_urls,
+                                                        callback=lambda product_url, variants : streamed_data.update({product_url : len(variants)}))
+    assert streamed_data == {products_urls[0] : 2, products_urls[1] : 2, products_urls[2] : 1, products_urls[3] : 1}
+
+    # A locale with an invalid payload does not lose the product, the next locale gives the shared fields
+    monkeypatch.setattr(koroshi_products_data_scraper, "send_request",
+                        lambda url : FakeResponse("<html>") if "/fr-fi/" in url else fake_send_request(url))
+    group_variants = koroshi_products_data_scraper.extract_product_locales_data(products_urls=[products_urls[0], products_urls[2]])
+    assert group_variants[0] is None
+    assert [(variant.product_url, variant.product_net_price) for variant in group_variants[1]] == [("https://fake-store.com/en-se/products/1", 34900)]
+
+
+# Configuration of a fake store whose pages are '<url>?page=<n>'
+FAKE_CONFIG = {
+    "main-url" : "https://fake-store.com/collections/all",
+    "products-list" : {
+        "products" : {"selector" : "a.product-link", "attribute" : "href", "url-prefix" : "https://fake-store.com"},
+        "pagination" : {"type" : "parameter", "value" : "?page=<PNum>"}
+    }
+}
+
+
+def fake_listing_page(n_page: int, n_pages: int=5, products_per_page: int=3) -> str :
+    """
+        Build a listing page, the pages after :param:n_pages have no products
+    """
+
+    links = ''.join(f'<a class="product-link" href="/products/{n_page}-{n}">p</a>' for n in range(products_per_page)) if n_page <= n_pages else ''
+    return f"<html><body><div class='grid'>{links}</div></body></html>"
+
+
+def test_get_all_pages_products_list_prefetch(monkeypatch) :
+
+    koroshi_products_list_scraper = KoroshiProductsListExtractor(configuration=FAKE_CONFIG,
+                                                                 file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/products_list.log'))
+    requested_pages = []
+
+    def fake_send_request(url: str) -> FakeResponse :
+        n_page = int(url.split('?page=')[1]) if '?page=' in url else 1
+        requested_pages.append(n_page)
+        # The first pages of a window are the slowest ones
+        time.sleep(0.05 / n_page)
+        return FakeResponse(fake_listing_page(n_page))
+
+    monkeypatch.setattr(koroshi_products_list_scraper, "send_request", fake_send_request)
+
+    # Serial and speculative explorations give the same links into the page order
+    serial_products = koroshi_products_list_scraper.get_all_pages_products_list(url=FAKE_CONFIG["main-url"])
+    requested_pages.clear()
+    prefetched_products = koroshi_products_list_scraper.get_all_pages_products_list(url=FAKE_CONFIG["main-url"],
+                                                                                    prefetch_window=4)
+    assert prefetched_products == serial_products
+    assert prefetched_products == [f"https://fake-store.com/products/{p}-{n}" for p in range(1, 6) for n in range(3)]
+    # 2 windows of 4 pages : the pages 7 and 8 were fetched after the empty page 6 and discarded
+    assert sorted(requested_pages) == list(range(1, 9))
+
+    # The exploration stops at 'max_pages'
+    assert len(koroshi_products_list_scraper.get_all_pages_products_list(url=FAKE_CONFIG["main-url"], max_pages=2, prefetch_window=4)) == 6
+
+
+def fake_catalog_page(n_page: int, n_products: int=5, limit: int=2) -> str :
+    """
+        Build a page of the bulk products endpoint ('products.json'), prices are strings like on the real endpoint
+    """
+
+    return json.dumps({"products" : [
+        {
+            "handle" : f"product-{n}",
+            "title" : f"Product {n}",
+            "body_html" : f"Description {n}",
+            "images" : [{"src" : f"https://cdn.fake/{n}.jpg"}],
+            "variants" : [{"id" : n * 10, "sku" : f"SKU-{n}", "option1" : "Noir", "option2" : "M", "featured_image" : None,
+                           "price" : "29.99", "compare_at_price" : None, "available" : True}]
+        }
+        for n in range((n_page - 1) * limit, min(n_page * limit, n_products))
+    ]})
+
+
+def test_extract_catalog_data(monkeypatch) :
+
+    koroshi_catalog_scraper = KoroshiCatalogExtractor(configuration={"catalog" : {"url" : "https://fake-store.com/fr-fi/products.json", "limit" : 2}},
+                                                      file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/products.log'))
+    requested_urls = []
+
+    def fake_send_request(url: str) -> FakeResponse :
+        requested_urls.append(url)
+        return FakeResponse(fake_catalog_page(int(url.split('page=')[1])))
+
+    monkeypatch.setattr(koroshi_catalog_scraper, "send_request", fake_send_request)
+
+    product_data = koroshi_catalog_scraper.extract_catalog_data()
+
+    # 5 products by pages of 2 : 3 requests instead of listing pages and 5 '<product>.js' requests
+    assert len(requested_urls) == 3
+    assert [variant.product_id for variant in product_data] == [0, 10, 20, 30, 40]
+    assert product_data[0].to_dict() == {
+        "product_url" : "https://fake-store.com/fr-fi/products/product-0",
+        "product_id" : 0,
+        "product_sku" : "SKU-0",
+        "product_name" : "Product 0",
+        "product_color" : "Noir",
+        "product_size" : "M",
+        "product_image" : "https://cdn.fake/0.jpg",
+        "product_description" : "Description 0",
+        "product_net_price" : 2999,
+        "product_gross_price" : None,
+        "product_stock_status" : True,
+        "product_barcode" : None
+    }
+
+
+def test_parser_backends_give_identical_links() :
+
+    html = ("<html><body><nav><a href='/menu'>menu</a></nav><div class='grid'>"
+            "<span><a class='product-link' href=' /products/1 '>1</a></span><a class='product-link'>no link</a>"
+            "<a class='product-link' href='/products/2'>2</a></div></body></html>")
+    links = []
+
+    for backend in ("html.parser", "lxml", "strainer", "selectolax") :
+        configuration = {"products-list" : {**FAKE_CONFIG["products-list"], "parser" : backend}}
+        koroshi_products_list_scraper = KoroshiProductsListExtractor(configuration=configuration,
+                                                                     file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/products_list.log'))
+        links.append(koroshi_products_list_scraper.select_attributes(html=html, selector="div.grid a.product-link", attribute="href"))
+
+    assert links[0] == [' /products/1 ', None, '/products/2']
+    assert all(backend_links == links[0] for backend_links in links)
+
+    # Only the tags of the selector are parsed by the backend 'strainer', or the whole page when it is not possible
+    assert KoroshiProductsListExtractor.selector_tags("div.grid > a.product-link") == ['a', 'div']
+    assert KoroshiProductsListExtractor.selector_tags(".grid a") is None
+
+
+def test_decode_product_variants_from_bytes() :
+
+    body = fake_product_payload(7).encode()
+    variants = decode_product_variants(body=body, url="https://fake-store.com/products/7")
+
+    # Same variants than from the decoded dictionary, without a dictionary per variant
+    assert variants == variants_from_product(data=json.loads(body), url="https://fake-store.com/products/7")
+    assert all(isinstance(variant, ProductVariant) and not hasattr(variant, "__dict__") for variant in variants)
+    assert [variant.product_id for variant in variants] == [70, 71]
+    assert tuple(variants[0].to_dict()) == VARIANT_FIELDS
+    assert variants[0].product_name is variants[1].product_name
+
+    # A variant without image and a payload that is not a json
+    assert decode_product_variants(body=b'{"title" : "p", "variants" : [{"id" : 1, "featured_image" : null}]}', url="u")[0].product_image is None
+    with pytest.raises(ValueError) :
+        decode_product_variants(body=b'<html>', url="u")
+
+
+def test_flatten_product_payloads_identical_to_records(monkeypatch) :
+
+    koroshi_products_data_scraper = KoroshiProductDataExtractor(file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/products.log'))
+    payloads = {n : fake_product_payload(n) for n in range(5)}
+    payloads[3] = json.dumps({"title" : "Product 3", "variants" : [{"id" : 30, "featured_image" : None, "extra" : [1, 2]}]})
+    payloads[4] = json.dumps({"title" : "Product 4", "description" : "é", "variants" : []})
+
+    def fake_send_request(url: str) -> FakeResponse :
+        product_id = int(url.split('/')[-1].removesuffix('.js'))
+        return FakeResponse(payloads[product_id]) if product_id in payloads else FakeResponse("<html>not a product</html>")
+
+    monkeypatch.setattr(koroshi_products_data_scraper, "send_request", fake_send_request)
+    products_urls = [f"https://fake-store.com/products/{n}?variant=1" for n in range(5)]
+
+    # Column for column, the same table than the variants extracted one by one
+    records = [variant for url in products_urls for variant in koroshi_products_data_scraper.extract_product_data(product_url=url)]
+    frame = koroshi_products_data_scraper.extract_products_frame(products_urls=products_urls)
+    assert frame.columns == list(VARIANT_FIELDS)
+    assert frame.to_dicts() == [variant.to_dict() for variant in records]
+    assert frame.equals(pl.DataFrame(records, schema=frame.schema))
+
+    # An invalid payload only removes its product
+    frame = koroshi_products_data_scraper.extract_products_frame(products_urls=products_urls + ["https://fake-store.com/products/9"])
+    assert frame.height == len(records)
+    assert flatten_product_payloads(payloads=[], urls=[]).columns == list(VARIANT_FIELDS)
+
+
+def test_extract_offline_from_fake_store() :
+
+    with FakeStore(n_products=100, products_per_page=12, error_rate=0.05, seed=1) as store :
+        configuration = store.configuration(**{"page-product" : {"concurrency" : 8}})
+        transport = HTTPTransport(backoff_factor=0.01, backoff_jitter=0.0)
+
+        koroshi_products_list_scraper = KoroshiProductsListExtractor(configuration=configuration,
+                                                                     file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/products_list.log'),
+                                                                     transport=transport)
+        products_list = koroshi_products_list_scraper.get_all_pages_products_list(url=configuration["main-url"], prefetch_window=4)
+        assert products_list == [f"{store.product_url(n)}?variant={n * 100}" for n in range(100)]
+
+        koroshi_products_data_scraper = KoroshiProductDataExtractor(configuration=configuration,
+                                                                    file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/products.log'),
+                                                                    transport=transport)
+        product_data = koroshi_products_data_scraper.extract_products_data(products_urls=products_list)
+        transport.close()
+
+    # The errors of the store were retried
+    assert store.requests["errors"] > 0
+    assert len(product_data) == 100 * 3
+    assert product_data[0].product_url == store.product_url(0)
+    assert product_data[-1].product_id == 99 * 100 + 2
+
+
+
+def test_sitemap_products_with_lastmod() :
+
+    with FakeStore(n_products=25, products_per_sitemap=10) as store :
+        store.modified[7] = "2026-10-16T08:00:00+00:00"
+        koroshi_sitemap_scraper = KoroshiSitemapExtractor(configuration=store.configuration(),
+                                                          file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/sitemap.log'),
+                                                          transport=HTTPTransport())
+
+        # The index is followed into the 3 product sitemaps, the other sitemaps and the home page are skipped
+        products = list(koroshi_sitemap_scraper.iter_products())
+        assert [loc for loc, _ in products] == [store.product_url(n) for n in range(25)]
+        assert {lastmod for loc, lastmod in products if loc != store.product_url(7)} == {DEFAULT_LASTMOD}
+        assert dict(products)[store.product_url(7)] == "2026-10-16T08:00:00+00:00"
+        assert store.requests["sitemap"] == 4
+
+        # A sitemap that cannot be downloaded is an error, not an empty sitemap
+        with pytest.raises(requests.HTTPError) :
+            list(koroshi_sitemap_scraper.iter_products(url=f"{store.url}/missing.xml"))
+
+
+def fake_image() -> bytes :
+    """
+        Build a PNG of 600x400 pixels
+    """
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (600, 400), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler) :
+    """
+        Server of images with an ETag : '/a.png' and '/b.png' are the same image, answers 304 when the ETag matches
+    """
+
+    protocol_version = "HTTP/1.1"
+    body = fake_image()
+
+    def do_GET(self) -> None :
+        if self.headers.get("If-None-Match") == '"v1"' :
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args) -> None :
+        pass
+
+
+def test_extract_images_content_addressed(tmp_path) :
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    koroshi_image_scraper = KoroshiImageExtractor(file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/images.log'),
+                                                  transport=HTTPTransport())
+    variants = [{"product_id" : 1, "product_image" : f"{base_url}/a.png"}, {"product_id" : 2, "product_image" : f"{base_url}/a.png"},
+                {"product_id" : 3, "product_image" : f"{base_url}/b.png"}, {"product_id" : 4, "product_image" : None}]
+
+    try :
+        # Each url is downloaded once, the same bytes are stored once
+        manifest, stats = koroshi_image_scraper.extract_images(variants=variants, directory=str(tmp_path), processes=2, thumbnail_size=64)
+        assert [row["product_id"] for row in manifest] == [1, 2, 3]
+        assert len({row["path"] for row in manifest}) == 1
+        assert (stats["images"], stats["downloaded"], stats["duplicates"], stats["thumbnails"]) == (2, 1, 1, 1)
+        with Image.open(manifest[0]["thumbnail"]) as thumbnail :
+            assert max(thumbnail.size) == 64
+
+        # Next run : the unchanged images are not downloaded again
+        manifest, stats = koroshi_image_scraper.extract_images(variants=variants, directory=str(tmp_path), processes=2, thumbnail_size=64)
+        assert (stats["not_modified"], stats["bytes_downloaded"], stats["hit_rate"]) == (2, 0, 1.0)
+        assert len(manifest) == 3
+
+    finally :
+        server.shutdown()
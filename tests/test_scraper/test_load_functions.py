@@ -0,0 +1,292 @@
+import io
+import os
+import sys
+from datetime import date
+from typing import Any
+import polars as pl
+from sqlalchemy import text
+
+SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            '..')
+                            )
+sys.path.append(SCRAPER_PATH)
+
+from scraper.load.load_data import KoroshiDataLoader, VARIANT_SCHEMA
+from scraper.load.validation import VariantValidator
+from scraper.utils.utilities import ndjson_to_parquet
+
+
+# Point to the tests directory
+TESTS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def fake_variants(ids: list, price: int=2999) -> pl.DataFrame :
+    """
+        Build variants like the ones extracted by `KoroshiProductDataExtractor`
+    """
+
+    return pl.DataFrame([
+        {
+            "product_url" : f"https://fake-store.com/products/{n}",
+            "product_id" : n,
+            "product_sku" : f"SKU-{n}",
+            "product_name" : f"Product {n}",
+            "product_color" : "Noir",
+            "product_size" : "M",
+            "product_image" : f"https://cdn.fake/{n}.jpg",
+            "product_description" : f"Description {n}",
+            "product_net_price" : price,
+            "product_gross_price" : None,
+            "product_stock_status" : True,
+            "product_barcode" : None
+        }
+        for n in ids
+    ], schema_overrides={"product_gross_price" : pl.Int64, "product_barcode" : pl.Utf8})
+
+
+def test_upsert_data_only_writes_changed_rows(tmp_path) :
+
+    connection_url = f"sqlite:///{tmp_path / 'koroshi.db'}"
+    dataloader = KoroshiDataLoader(connection_url=connection_url,
+                                   table="koroshi_products",
+                                   file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'),
+                                   mode="incremental")
+
+    # First run : everything is new
+    assert dataloader.upsert_data(fake_variants([1, 2, 3])) == {"inserted" : 3, "updated" : 0, "unchanged" : 0}
+
+    # Next day : the variant 2 changed its price, the variant 4 is new, the others are untouched
+    dataloader = KoroshiDataLoader(connection_url=connection_url,
+                                   table="koroshi_products",
+                                   file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'),
+                                   mode="incremental")
+    today = pl.concat([fake_variants([1, 3]), fake_variants([2], price=1999), fake_variants([4])])
+    assert dataloader.upsert_data(today) == {"inserted" : 1, "updated" : 1, "unchanged" : 2}
+
+    with dataloader.db_engine.connect() as connection :
+        rows = connection.execute(text("SELECT product_id, product_net_price FROM koroshi_products ORDER BY product_id;")).fetchall()
+    assert [tuple(row) for row in rows] == [(1, 2999), (2, 1999), (3, 2999), (4, 2999)]
+
+    # The locale 'en' of the variant 1 is another row, it does not overwrite the default locale
+    assert dataloader.upsert_data(pl.concat([fake_variants([1]), locale_variants([1], "en", price=3499)])) == {"inserted" : 1, "updated" : 0, "unchanged" : 1}
+    assert dataloader.upsert_data(locale_variants([1], "en", price=3999)) == {"inserted" : 0, "updated" : 1, "unchanged" : 0}
+
+    with dataloader.db_engine.connect() as connection :
+        rows = connection.execute(text("SELECT product_url, product_net_price FROM koroshi_products WHERE product_id = 1 ORDER BY product_url;")).fetchall()
+    assert [tuple(row) for row in rows] == [("https://fake-store.com/en/products/1", 3999), ("https://fake-store.com/products/1", 2999)]
+
+
+class FakeCopyConnection() :
+    """
+        Stand-in of a psycopg2 connection : keeps what is sent with `COPY ... FROM STDIN`
+    """
+
+    def __init__(self) -> None :
+        self.copies = []
+        self.committed = False
+
+    def cursor(self) -> "FakeCopyConnection" :
+        return self
+
+    def __enter__(self) -> "FakeCopyConnection" :
+        return self
+
+    def __exit__(self, *args) -> None :
+        pass
+
+    def copy_expert(self, sql: str, file: Any) -> None :
+        self.copies.append((sql, file.read()))
+
+    def commit(self) -> None :
+        self.committed = True
+
+    def rollback(self) -> None :
+        pass
+
+    def close(self) -> None :
+        pass
+
+
+def test_copy_data_streams_chunks(tmp_path, monkeypatch) :
+
+    dataloader = KoroshiDataLoader(connection_url=f"sqlite:///{tmp_path / 'koroshi.db'}",
+                                   table="koroshi_products",
+                                   file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'),
+                                   mode="copy")
+    fake_connection = FakeCopyConnection()
+    monkeypatch.setattr(dataloader.db_engine, "raw_connection", lambda : fake_connection)
+
+    variants = fake_variants(list(range(10)))
+    report = dataloader.copy_data(variants, chunk_size=4)
+
+    # 3 COPY of 4, 4 and 2 rows, committed together
+    assert report["rows"] == 10 and report["peak_rss_mb"] > 0
+    assert fake_connection.committed
+    assert [sql for sql, _ in fake_connection.copies] == [f"COPY koroshi_products ({', '.join(variants.columns)}) FROM STDIN WITH (FORMAT csv)"] * 3
+
+    # The CSV read back gives the same data
+    sent = pl.concat([pl.read_csv(io.BytesIO(data), has_header=False, new_columns=variants.columns, schema_overrides=variants.schema)
+                      for _, data in fake_connection.copies])
+    assert sent.equals(variants)
+
+
+def test_scan_ndjson_loads_by_batches(tmp_path) :
+
+    # Variants written one per line, with a line without id
+    fp = tmp_path / "products_data.ndjson"
+    fp.write_text(''.join(f"{line}\n" for line in fake_variants(list(range(7))).write_ndjson().splitlines()) + '{"product_id" : null}\n')
+
+    dataloader = KoroshiDataLoader(connection_url=f"sqlite:///{tmp_path / 'koroshi.db'}",
+                                   table="koroshi_products",
+                                   file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'),
+                                   mode="incremental")
+    lazy_df = dataloader.scan_ndjson(fp=str(fp))
+    batches = list(lazy_df.collect_batches(chunk_size=3))
+
+    assert sum(batch.height for batch in batches) == 7
+    assert dataloader.upsert_batches(batches) == {"inserted" : 7, "updated" : 0, "unchanged" : 0}
+    assert dataloader.scan_ndjson(fp=str(tmp_path / "missing.ndjson")) is None
+
+
+def test_parquet_hand_off_is_typed(tmp_path) :
+
+    ndjson_fp = tmp_path / "products_data.ndjson"
+    ndjson_fp.write_text(fake_variants(list(range(2000))).write_ndjson())
+
+    parquet_fp = ndjson_to_parquet(ndjson_fp=str(ndjson_fp),
+                                   parquet_fp=str(tmp_path / "products_data.parquet"),
+                                   schema=VARIANT_SCHEMA)
+    assert parquet_fp is not None
+    assert os.path.getsize(parquet_fp) < os.path.getsize(ndjson_fp)
+
+    dataloader = KoroshiDataLoader(connection_url=f"sqlite:///{tmp_path / 'koroshi.db'}",
+                                   table="koroshi_products",
+                                   file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'))
+    df = dataloader.scan_data(fp=parquet_fp).collect()
+
+    # Numeric prices, boolean stock status and nullable barcode, without inference
+    assert dict(df.schema) == VARIANT_SCHEMA
+    assert df.equals(fake_variants(list(range(2000))))
+
+
+
+def test_history_table_and_price_changes(tmp_path) :
+
+    connection_url = f"sqlite:///{tmp_path / 'koroshi.db'}"
+
+    def load_day(day: date, variants: pl.DataFrame) -> dict :
+        dataloader = KoroshiDataLoader(connection_url=connection_url,
+                                       table="koroshi_products",
+                                       file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'),
+                                       mode="history",
+                                       snapshot_date=day)
+        return dataloader.insert_history_batches([variants])
+
+    # 3 days into the same table : the variant 2 changes its price, then the variant 3 is out of stock
+    assert load_day(date(2026, 9, 30), fake_variants([1, 2, 3])) == {"inserted" : 3, "replaced" : 0}
+    assert load_day(date(2026, 10, 1), pl.concat([fake_variants([1, 3]), fake_variants([2], price=1999)])) == {"inserted" : 3, "replaced" : 0}
+    day_3 = pl.concat([fake_variants([1, 2], price=1999), fake_variants([3]).with_columns(pl.lit(False).alias("product_stock_status"))])
+    load_day(date(2026, 10, 2), fake_variants([1]))
+    # The load of a day can be run again
+    assert load_day(date(2026, 10, 2), day_3) == {"inserted" : 3, "replaced" : 1}
+
+    dataloader = KoroshiDataLoader(connection_url=connection_url,
+                                   table="koroshi_products",
+                                   file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'),
+                                   mode="history")
+
+    # The change of the first day of the period is found with the day before it
+    changes = dataloader.price_changes(start_date=date(2026, 10, 1), end_date=date(2026, 10, 31))
+    assert changes.select("product_id", "snapshot_date", "previous_net_price", "net_price", "stock_status").rows() == [
+        (1, date(2026, 10, 2), 2999, 1999, True),
+        (2, date(2026, 10, 1), 2999, 1999, True),
+        (3, date(2026, 10, 2), 2999, 2999, False)
+    ]
+    assert changes["previous_date"].to_list() == [date(2026, 10, 1), date(2026, 9, 30), date(2026, 10, 1)]
+
+    # Only one SKU, and a period without changes
+    assert dataloader.price_changes(start_date=date(2026, 10, 1), end_date=date(2026, 10, 1), product_sku="SKU-2")["product_id"].to_list() == [2]
+    assert dataloader.price_changes(start_date=date(2026, 9, 1), end_date=date(2026, 9, 30)).height == 0
+
+
+
+def locale_variants(ids: list, locale: str, price: int=2999) -> pl.DataFrame :
+    """
+        Build the variants of another locale : same ids, url of the locale (see `records.localize_variants`)
+    """
+
+    return fake_variants(ids, price=price).with_columns(pl.col("product_url").str.replace("/products/", f"/{locale}/products/"))
+
+
+def test_history_keeps_each_locale(tmp_path) :
+
+    connection_url = f"sqlite:///{tmp_path / 'koroshi.db'}"
+
+    def load_day(day: date, variants: pl.DataFrame) -> dict :
+        dataloader = KoroshiDataLoader(connection_url=connection_url,
+                                       table="koroshi_products",
+                                       file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'),
+                                       mode="history",
+                                       snapshot_date=day)
+        return dataloader.insert_history_batches([variants])
+
+    # The price of the variant changes only into the locale 'en'
+    assert load_day(date(2026, 10, 1), pl.concat([fake_variants([1]), locale_variants([1], "en", price=3499)])) == {"inserted" : 2, "replaced" : 0}
+    assert load_day(date(2026, 10, 2), pl.concat([fake_variants([1]), locale_variants([1], "en", price=2999)])) == {"inserted" : 2, "replaced" : 0}
+
+    dataloader = KoroshiDataLoader(connection_url=connection_url,
+                                   table="koroshi_products",
+                                   file_log=os.path.join(TESTS_PATH, 'test_scraper/logs/to_db.log'),
+                                   mode="history")
+    changes = dataloader.price_changes(start_date=date(2026, 10, 1), end_date=date(2026, 10, 31))
+    assert changes.select("product_url", "previous_net_price", "net_price").rows() == [("https://fake-store.com/en/products/1", 3499, 2999)]
+
+
+def test_validation_quarantines_invalid_variants() :
+
+    validator = VariantValidator()
+
+    batch = pl.concat([
+        fake_variants([1, 2]),
+        # Missing name, negative price, gross below net, malformed barcode and a duplicate id of the batch
+        fake_variants([3]).with_columns(pl.lit(None, dtype=pl.Utf8).alias("product_name")),
+        fake_variants([4], price=-1),
+        fake_variants([5]).with_columns(pl.lit(1999, dtype=pl.Int64).alias("product_gross_price")),
+        fake_variants([6]).with_columns(pl.lit("12AB", dtype=pl.Utf8).alias("product_barcode")),
+        fake_variants([7]).with_columns(pl.lit("3700123456789", dtype=pl.Utf8).alias("product_barcode")),
+        fake_variants([1])
+    ])
+
+    valid, quarantined = validator.validate(batch)
+    assert valid["product_id"].to_list() == [1, 2, 7]
+    assert dict(zip(quarantined["product_id"], quarantined["reasons"].to_list())) == {
+        3 : ["missing_product_name"],
+        4 : ["net_price_out_of_range"],
+        5 : ["gross_price_below_net_price"],
+        6 : ["invalid_barcode"],
+        1 : ["duplicate_id"]
+    }
+
+    # The ids of the previous batches are duplicates too
+    quarantine = []
+    valid_batches = list(validator.validate_batches([fake_variants([2, 8])], quarantine=quarantine.append))
+    assert valid_batches[0]["product_id"].to_list() == [8]
+    assert quarantine[0]["product_id"].to_list() == [2]
+
+    stats = validator.get_stats()
+    assert (stats["rows"], stats["valid"], stats["quarantined"]) == (10, 4, 6)
+    assert stats["reasons"]["duplicate_id"] == 2
+
+
+def test_validation_keeps_the_locales_of_a_variant() :
+
+    validator = VariantValidator()
+
+    # The locale 'en' shares the ids of the default locale with other urls, only the same url twice is a duplicate
+    valid, quarantined = validator.validate(pl.concat([fake_variants([1, 2]), locale_variants([1, 2], "en")]))
+    assert valid.height == 4 and quarantined.height == 0
+
+    valid, quarantined = validator.validate(pl.concat([locale_variants([1], "en"), locale_variants([1], "de")]))
+    assert valid["product_url"].to_list() == ["https://fake-store.com/de/products/1"]
+    assert quarantined["reasons"].to_list() == [["duplicate_id"]]
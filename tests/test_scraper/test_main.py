@@ -0,0 +1,194 @@
+import os
+import sys
+import threading
+import subprocess
+import pytest
+import requests
+from sqlalchemy import text
+
+SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            '..')
+                            )
+sys.path.append(SCRAPER_PATH)
+# The pipeline imports its modules from the scraper directory
+sys.path.append(os.path.join(SCRAPER_PATH, 'scraper'))
+
+# Everything through the modules of the pipeline, the same module imported as 'scraper.utils' would be loaded twice
+import main
+from load.load_data import KoroshiDataLoader
+from extract.extract_data import KoroshiProductsListExtractor
+from utils.utilities import RunManifest, read_ndjson, read_json
+from utils.metrics import PipelineMetrics
+from tests.fake_store import FakeStore
+
+
+def run_in_thread(function, timeout: float=60) :
+    """
+        Run the pipeline in a thread so that a pipeline that hangs fails the test instead of blocking it
+    """
+
+    result = {}
+
+    def target() :
+        try :
+            result["value"] = function()
+        except Exception as error :
+            result["error"] = error
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout=timeout)
+    assert not thread.is_alive(), "The pipeline did not stop"
+
+    return result
+
+
+def test_streaming_pipeline_loads_all_variants(tmp_path, monkeypatch) :
+
+    os.makedirs(tmp_path / "logs")
+    connection_url = f"sqlite:///{tmp_path / 'koroshi.db'}"
+    monkeypatch.setattr(main, "create_dataloader", lambda log_file : KoroshiDataLoader(connection_url=connection_url,
+                                                                                          table="koroshi_products",
+                                                                                          file_log=log_file,
+                                                                                          mode="incremental"))
+
+    with FakeStore(n_products=60, products_per_page=12) as store :
+        configuration = store.configuration(**{"page-product" : {"concurrency" : 4}, "streaming" : {"queue-size" : 10, "batch-size" : 50}})
+        metrics = PipelineMetrics()
+        result = run_in_thread(lambda : main.run_streaming_pipeline(configuration=configuration, base_dir=str(tmp_path), metrics=metrics))
+
+    assert "error" not in result
+    assert len(list(read_ndjson(fp=result["value"]))) == 180
+
+    with KoroshiDataLoader(connection_url=connection_url, table="koroshi_products", file_log=str(tmp_path / "logs/to_db.log"),
+                           mode="incremental").db_engine.connect() as connection :
+        assert connection.execute(text("SELECT COUNT(DISTINCT product_id) FROM koroshi_products;")).scalar() == 180
+
+
+class FailingLoader() :
+    """
+        Loader that fails on the first batch
+    """
+
+    def load_batches(self, batches) :
+        next(iter(batches))
+        raise RuntimeError("The database is down")
+
+
+def test_streaming_pipeline_stops_when_a_stage_fails(tmp_path, monkeypatch) :
+
+    os.makedirs(tmp_path / "logs")
+    monkeypatch.setattr(main, "create_dataloader", lambda log_file : FailingLoader())
+
+    # The list and fetch stages block on the full queues once the loader stopped reading them
+    with FakeStore(n_products=500, products_per_page=12) as store :
+        configuration = store.configuration(**{"page-product" : {"concurrency" : 4}, "streaming" : {"queue-size" : 5, "batch-size" : 10}})
+        result = run_in_thread(lambda : main.run_streaming_pipeline(configuration=configuration, base_dir=str(tmp_path)))
+        requests = dict(store.requests)
+
+    with pytest.raises(RuntimeError, match="The database is down") :
+        raise result["error"]
+    # The crawl stopped with the loader
+    assert requests["product"] < 500
+
+
+def test_sitemap_pipeline_only_extracts_changed_products(tmp_path) :
+
+    for directory in ("logs", "json") :
+        os.makedirs(tmp_path / directory)
+    state_fp = tmp_path / "json/sitemap_state.json"
+
+    with FakeStore(n_products=20, products_per_sitemap=8) as store :
+        configuration = store.configuration()
+
+        # First run : every product is extracted but the one whose payload cannot be fetched
+        store.missing = {3}
+        first_fp = main.get_sitemap_products_data(configuration=configuration, base_dir=str(tmp_path), output_fp=str(tmp_path / "json/first.ndjson"))
+        assert len(list(read_ndjson(fp=first_fp))) == 19 * 3
+        assert set(read_json(fp=str(state_fp))["lastmod"]) == {store.product_url(n) for n in range(20) if n != 3}
+
+        # Second run : the failed product is back, one product is modified and the last two are removed from the sitemaps
+        store.missing = set()
+        store.modified[5] = "2026-10-16T08:00:00+00:00"
+        store.n_products = 18
+        fetched = store.requests["product"]
+        second_fp = main.get_sitemap_products_data(configuration=configuration, base_dir=str(tmp_path), output_fp=str(tmp_path / "json/second.ndjson"))
+        fetched = store.requests["product"] - fetched
+
+    # Only the failed and the modified products are fetched again, the others are carried forward from the first run
+    assert fetched == 2
+    variants = list(read_ndjson(fp=second_fp))
+    assert len(variants) == 18 * 3
+    assert {variant["product_url"] for variant in variants} == {store.product_url(n) for n in range(18)}
+    state = read_json(fp=str(state_fp))
+    assert state["data-fp"] == second_fp
+    assert len(state["lastmod"]) == 18 and state["lastmod"][store.product_url(5)] == "2026-10-16T08:00:00+00:00"
+
+
+def test_sitemap_pipeline_writes_nothing_when_a_sitemap_fails(tmp_path) :
+
+    for directory in ("logs", "json") :
+        os.makedirs(tmp_path / directory)
+
+    with FakeStore(n_products=20, products_per_sitemap=8) as store :
+        configuration = store.configuration(sitemap={"url" : f"{store.url}/missing.xml"})
+        with pytest.raises(requests.HTTPError) :
+            main.get_sitemap_products_data(configuration=configuration, base_dir=str(tmp_path), output_fp=str(tmp_path / "json/products.ndjson"))
+
+    # Neither an empty output nor a state that would make the next run extract everything again
+    assert os.listdir(tmp_path / "json") == []
+
+
+def test_products_list_not_done_when_a_root_fails(tmp_path, monkeypatch) :
+
+    os.makedirs(tmp_path / "logs")
+    get_all_pages_products_list = KoroshiProductsListExtractor.get_all_pages_products_list
+
+    def crawl_or_fail(self, url, **kwargs) :
+        if url.endswith("/broken") :
+            raise ConnectionError("The root cannot be explored")
+        return get_all_pages_products_list(self, url=url, **kwargs)
+
+    monkeypatch.setattr(KoroshiProductsListExtractor, "get_all_pages_products_list", crawl_or_fail)
+
+    with FakeStore(n_products=30, products_per_page=12) as store :
+        configuration = store.configuration(**{"crawl-roots" : [store.configuration()["main-url"], f"{store.url}/fr-fi/collections/broken"]})
+        manifest = RunManifest(fp=str(tmp_path / "manifest.ndjson"))
+        with pytest.raises(RuntimeError, match="roots failed") :
+            main.get_all_products_list(configuration=configuration, log_file=str(tmp_path / "logs/products_list.log"),
+                                       manifest=manifest, output_fp=str(tmp_path / "products_list.ndjson"))
+
+    # The links of the other root are saved, the next run explores the failed root again
+    assert len(list(read_ndjson(fp=str(tmp_path / "products_list.ndjson")))) == 30
+    assert not manifest.is_stage_done("products-list")
+
+
+def test_import_main_does_not_load_the_stage_libraries() :
+
+    # A fresh interpreter, the modules imported by the other tests are already into `sys.modules`
+    code = ("import sys, main; loaded = [module for module in ('polars', 'sqlalchemy', 'requests', 'bs4', 'PIL') if module in sys.modules]; "
+            "import extract.extract_data; loaded += [module for module in ('polars', 'PIL') if module in sys.modules]; print(loaded)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.join(SCRAPER_PATH, 'scraper'), capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_parse_arguments() :
+
+    arguments = main.parse_arguments([])
+    assert (arguments.command, arguments.config) == ("run", None)
+
+    arguments = main.parse_arguments(["--config", "config.json", "list", "--output", "links.ndjson"])
+    assert (arguments.command, arguments.config, arguments.output) == ("list", "config.json", "links.ndjson")
+
+    arguments = main.parse_arguments(["fetch", "--input", "links.ndjson", "--output", "variants.ndjson"])
+    assert (arguments.command, arguments.input, arguments.output) == ("fetch", "links.ndjson", "variants.ndjson")
+    assert main.parse_arguments(["fetch"]).input is None
+
+    arguments = main.parse_arguments(["load", "--input", "variants.parquet", "--quarantine", "quarantine.ndjson"])
+    assert (arguments.command, arguments.input, arguments.quarantine) == ("load", "variants.parquet", "quarantine.ndjson")
+
+    # 'run' has no artifacts
+    with pytest.raises(SystemExit) :
+        main.parse_arguments(["run", "--input", "links.ndjson"])
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            '..')
+                            )
+sys.path.append(SCRAPER_PATH)
+
+from scraper.extract.transport import HTTPTransport
+from scraper.extract.http_cache import HTTPCache
+from scraper.extract.rate_control import AdaptiveConcurrency, AdaptiveLimiter
+from tests.fake_store import FlakyHandler
+
+
+def test_http_transport_reuses_connections_and_retries() :
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    transport = HTTPTransport(backoff_factor=0.01, backoff_jitter=0.01)
+
+    try :
+        # 5 requests on the same host : 1 handshake, 4 reused connections
+        for _ in range(5) :
+            assert transport.get(f"{base_url}/products/1.js").status_code == 200
+
+        stats = transport.connection_stats()[base_url]
+        assert stats["new_connections"] == 1
+        assert stats["reused_connections"] == 4
+
+        # The 503 is retried and the caller only sees the good response
+        assert transport.get(f"{base_url}/flaky").status_code == 200
+        assert FlakyHandler.calls["/flaky"] == 2
+
+    finally :
+        transport.close()
+        server.shutdown()
+
+
+
+class ETagHandler(BaseHTTPRequestHandler) :
+    """
+        Server whose bodies never change : answers 304 when the ETag of the request matches
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None :
+        body = (self.path * 100).encode()
+        etag = f'"{len(body)}"'
+
+        if self.headers.get("If-None-Match") == etag :
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None :
+        pass
+
+
+def test_http_transport_conditional_cache(tmp_path) :
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ETagHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/products/1.js"
+
+    try :
+        # First run : the response is downloaded and stored
+        transport = HTTPTransport(cache=HTTPCache(directory=str(tmp_path)))
+        first = transport.get(url)
+        assert transport.cache.get_stats()["misses"] == 1
+
+        # Next run (new cache object on the same directory) : 304, the body comes from the disk
+        transport = HTTPTransport(cache=HTTPCache(directory=str(tmp_path)))
+        second = transport.get(url)
+        assert second.status_code == 200
+        assert second.text == first.text
+        stats = transport.cache.get_stats()
+        assert stats["hits"] == 1 and stats["bytes_saved"] == len(first.content)
+
+        # The least recently used responses are removed when the cache is full
+        transport = HTTPTransport(cache=HTTPCache(directory=str(tmp_path), max_bytes=2 * len(first.content)))
+        for n in range(2, 5) :
+            transport.get(url.replace("/1.js", f"/{n}.js"))
+        stats = transport.cache.get_stats()
+        assert stats["entries"] == 2 and stats["evictions"] == 2
+        assert transport.cache.conditional_headers(url) == {}
+
+    finally :
+        server.shutdown()
+
+
+
+class ThrottleHandler(BaseHTTPRequestHandler) :
+    """
+        Server that answers 429 with 'Retry-After: 0' to the first two requests of each path and 200 after
+    """
+
+    protocol_version = "HTTP/1.1"
+    calls = {}
+
+    def do_GET(self) -> None :
+        ThrottleHandler.calls[self.path] = ThrottleHandler.calls.get(self.path, 0) + 1
+        status = 429 if ThrottleHandler.calls[self.path] <= 2 else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        if status == 429 :
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None :
+        pass
+
+
+def test_adaptive_limiter_increases_and_backs_off() :
+
+    limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=8, latency_target=1.0)
+
+    # Healthy responses : the limit grows by one request per window
+    for _ in range(40) :
+        limiter.acquire()
+        limiter.release(200, 0.01)
+    assert limiter.get_stats()["limit"] == 8
+
+    # Overload : the limit is halved once for the requests of the same round trip
+    for _ in range(3) :
+        limiter.acquire()
+    for _ in range(3) :
+        limiter.release(429, 10.0)
+    stats = limiter.get_stats()
+    assert stats["limit"] == 4 and stats["decreases"] == 1 and stats["throttled"] == 3 and stats["in_flight"] == 0
+
+
+def test_http_transport_requeues_throttled_requests() :
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottleHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try :
+        # The 429 are not dropped : the request is sent again until the host accepts it
+        transport = HTTPTransport(adaptive=AdaptiveConcurrency(initial=2))
+        assert transport.get(f"{base_url}/products/1.js").status_code == 200
+        assert ThrottleHandler.calls["/products/1.js"] == 3
+        assert transport.adaptive.get_stats()[f"127.0.0.1:{server.server_port}"]["throttled"] == 2
+
+        # After 'max_requeues' sendings again, the last rejection is returned
+        transport = HTTPTransport(adaptive=AdaptiveConcurrency(), max_requeues=1)
+        assert transport.get(f"{base_url}/products/2.js").status_code == 429
+
+    finally :
+        server.shutdown()
+
+
+class UnavailableHandler(BaseHTTPRequestHandler) :
+    """
+        Server that always answers 503 without 'Retry-After', and keeps the time of each request
+    """
+
+    protocol_version = "HTTP/1.1"
+    times = []
+
+    def do_GET(self) -> None :
+        UnavailableHandler.times.append(time.monotonic())
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args) -> None :
+        pass
+
+
+def test_http_transport_backs_off_without_retry_after() :
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UnavailableHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/products/1.js"
+
+    try :
+        transport = HTTPTransport(adaptive=AdaptiveConcurrency(), max_requeues=3, backoff_factor=0.05, backoff_jitter=0.0)
+        assert transport.get(url).status_code == 503
+
+        # The host is paused 'backoff_factor * 2 ** n' seconds before each sending again
+        times = UnavailableHandler.times
+        assert len(times) == 4
+        assert all(later - earlier >= 0.05 * 2 ** n for n, (earlier, later) in enumerate(zip(times, times[1:])))
+
+        # A failure that is not a requests error gives the slot back too
+        def fail(*args, **kwargs) :
+            raise ValueError("Invalid request")
+
+        transport.session.get = fail
+        with pytest.raises(ValueError) :
+            transport.get(url)
+        assert transport.adaptive.get_stats()[f"127.0.0.1:{server.server_port}"]["in_flight"] == 0
+
+    finally :
+        server.shutdown()
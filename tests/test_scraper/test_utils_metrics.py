@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            '..')
+                            )
+sys.path.append(SCRAPER_PATH)
+
+import polars as pl
+
+from scraper.utils.metrics import PipelineMetrics, endpoint_type, LATENCY_BUCKETS
+from scraper.extract.transport import HTTPTransport
+from tests.fake_store import FlakyHandler
+
+
+def test_endpoint_type() :
+
+    assert endpoint_type("https://fake-store.com/fr-fi/products/p-1.js") == "product"
+    assert endpoint_type("https://fake-store.com/fr-fi/products.json?limit=250&page=2") == "catalog"
+    assert endpoint_type("https://fake-store.com/sitemap.xml") == "sitemap"
+    assert endpoint_type("https://fake-store.com/cdn/shop/files/p-1.JPG?v=1") == "image"
+    assert endpoint_type("https://fake-store.com/collections/all?page=2") == "listing"
+
+
+def test_pipeline_metrics_from_the_transport(tmp_path) :
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    metrics = PipelineMetrics()
+    transport = HTTPTransport(backoff_factor=0.01, backoff_jitter=0.01)
+    transport.add_observer(metrics.observe_request)
+    transport.add_retry_observer(metrics.observe_retry)
+
+    try :
+        with metrics.stage("products-data") :
+            for n in range(3) :
+                transport.get(f"{base_url}/products/{n}.js")
+            transport.get(f"{base_url}/collections/all?page=1")
+            # The 503 is retried by urllib3 before the transport sees the 200
+            transport.get(f"{base_url}/flaky-metrics")
+        with metrics.stage("load") :
+            list(metrics.count_rows([pl.DataFrame({"a" : [1, 2]}), pl.DataFrame({"a" : [3]})], counter="rows_loaded", stage="load"))
+        metrics.add(counter="variants", value=6, stage="products-data")
+
+    finally :
+        transport.close()
+        server.shutdown()
+
+    measures = metrics.to_dict()
+    assert set(measures["stages"]) == {"products-data", "load"}
+    assert measures["requests"]["product"]["count"] == 3
+    assert measures["requests"]["listing"]["count"] == 2
+    # The buckets are cumulative, the last one counts all the requests
+    assert measures["requests"]["product"]["buckets"]["+Inf"] == 3
+    assert len(measures["requests"]["product"]["buckets"]) == len(LATENCY_BUCKETS) + 1
+    assert measures["status_codes"] == {"200" : 5, "503" : 1}
+    assert measures["retries"] == {"listing" : 1}
+    assert measures["bytes_downloaded"] == 5 * len(b'{"ok": true}')
+    assert measures["counters"] == {"rows_loaded" : 3, "variants" : 6}
+    assert measures["rates"]["variants_per_second"] > 0
+
+    # JSON and Prometheus textfile
+    metrics.write(directory=str(tmp_path))
+    with open(tmp_path / f"metrics_{metrics.started_at.date()}.json") as file :
+        assert json.load(file)["counters"]["variants"] == 6
+    prometheus = (tmp_path / "metrics.prom").read_text()
+    assert 'koroshi_scraper_request_duration_seconds_bucket{endpoint="product",le="+Inf"} 3' in prometheus
+    assert 'koroshi_scraper_responses_total{status="200"} 5' in prometheus
+    assert 'koroshi_scraper_retries_total{endpoint="listing"} 1' in prometheus
+    assert "koroshi_scraper_variants_total 6" in prometheus
@@ -7,7 +7,7 @@ SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
                             )
 sys.path.append(SCRAPER_PATH)
 
-from scraper.utils.utilities import read_json
+from scraper.utils.utilities import read_json, read_ndjson, dedupe_product_urls, NDJSONWriter, RunManifest
 
 
 def test_read_json() :
@@ -26,4 +26,77 @@ def test_read_json() :
     
     # test `read_json` function with an existing file
     json_config = read_json(fp=os.path.join(TESTS_PATH, "test_scraper/config.json"))
-    assert json_config is not None
\ No newline at end of file
+    assert json_config is not None
+
+def test_ndjson_writer_append_and_read(tmp_path) :
+    """
+        Les objets écrits par `NDJSONWriter` sont relus dans le même ordre par `read_ndjson`,
+        le mode 'a' reprend un fichier existant et une dernière ligne tronquée (arrêt brutal) est ignorée
+    """
+
+    fp = str(tmp_path / "json" / "products_data.ndjson")
+
+    with NDJSONWriter(fp=fp, flush_every=2) as writer :
+        writer.write_many([{"product_id" : n} for n in range(3)])
+    
+    with NDJSONWriter(fp=fp, mode='a') as writer :
+        writer.write({"product_id" : 3})
+    
+    with open(fp, 'a') as file :
+        file.write('{"product_id" : 4')
+
+    assert list(read_ndjson(fp=fp)) == [{"product_id" : n} for n in range(4)]
+
+
+def test_run_manifest_resume(tmp_path) :
+    """
+        Un run arrêté brutalement reprend après le dernier élément enregistré dans le manifeste :
+        la sortie écrite après ce dernier élément est coupée et l'élément est refait
+    """
+
+    manifest_fp = str(tmp_path / "manifest.ndjson")
+    output_fp = str(tmp_path / "products_data.ndjson")
+
+    # First run : 3 products done, only the 2 first entries are saved before the crash
+    manifest = RunManifest(fp=manifest_fp, flush_every=2)
+    writer = manifest.open_output(stage="products", fp=output_fp)
+    for n in range(3) :
+        writer.write_many([{"product_id" : n, "variant" : v} for v in range(2)])
+        manifest.mark_done(stage="products", key=f"url-{n}", offset=writer.offset)
+    writer.flush()
+
+    # Restarted run
+    manifest = RunManifest(fp=manifest_fp)
+    assert list(manifest.done("products")) == ["url-0", "url-1"]
+    assert not manifest.is_stage_done("products-data")
+
+    with manifest.open_output(stage="products", fp=output_fp) as writer :
+        writer.write_many([{"product_id" : 2, "variant" : v} for v in range(2)])
+        manifest.mark_done(stage="products", key="url-2", offset=writer.offset)
+    manifest.mark_stage_done("products-data")
+    manifest.close()
+
+    # No duplicated output and the stage is finished for the next restart
+    assert list(read_ndjson(fp=output_fp)) == [{"product_id" : n, "variant" : v} for n in range(3) for v in range(2)]
+    assert RunManifest(fp=manifest_fp).is_stage_done("products-data")
+
+
+def test_dedupe_product_urls() :
+    """
+        Chaque produit n'est gardé qu'une fois, quelle que soit la forme du lien,
+        et les liens vides ou invalides sont comptés puis retirés
+    """
+
+    urls = [
+        "https://koroshishop.com/fr-fi/products/ceinture?variant=1",
+        "https://KOROSHISHOP.com/fr-fi/products/ceinture/",
+        "",
+        "https://koroshishop.com/fr-fi/products/sac#reviews",
+        "/fr-fi/products/no-host",
+        "https://koroshishop.com/fr-fi/products/ceinture?variant=2",
+    ]
+
+    unique_urls, stats = dedupe_product_urls(urls)
+
+    assert unique_urls == ["https://koroshishop.com/fr-fi/products/ceinture", "https://koroshishop.com/fr-fi/products/sac"]
+    assert stats == {"total" : 6, "unique" : 2, "duplicates" : 2, "invalid" : 2}
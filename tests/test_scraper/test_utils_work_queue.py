@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import threading
+
+SCRAPER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            '..')
+                            )
+sys.path.append(SCRAPER_PATH)
+
+from scraper.utils.utilities import read_ndjson
+from scraper.utils.work_queue import WorkQueue, run_queue_worker
+
+
+class FakeExtractor() :
+    """
+        Extractor that gives one variant per url, without network
+    """
+
+    def __init__(self, failing=(), empty=()) :
+        self.failing = set(failing)
+        self.empty = set(empty)
+
+    def extract_products_data(self, products_urls, callback) :
+        for product_url in products_urls :
+            # A product that cannot be fetched gives None, a product without variants an empty list
+            if product_url in self.failing :
+                callback(product_url, None)
+            else :
+                callback(product_url, [] if product_url in self.empty else [{"product_url" : product_url}])
+
+
+def test_work_queue_leases(tmp_path) :
+    """
+        Une url est louée à un seul worker, reprise par un autre quand le bail expire,
+        et seul le détenteur du bail peut la terminer
+    """
+
+    work_queue = WorkQueue(fp=str(tmp_path / "work_queue.sqlite"), lease_seconds=0.2)
+
+    # The urls already into the queue are skipped
+    assert work_queue.push([f"url-{n}" for n in range(4)] + ["url-0"]) == 4
+    assert work_queue.claim(owner="a", n=2) == ["url-0", "url-1"]
+    assert work_queue.claim(owner="b", n=5) == ["url-2", "url-3"]
+    assert work_queue.claim(owner="c") == []
+
+    # Worker 'a' stopped : its urls are claimed again, its late output is discarded
+    time.sleep(0.3)
+    assert work_queue.claim(owner="c", n=5) == ["url-0", "url-1", "url-2", "url-3"]
+    assert not work_queue.complete(owner="a", url="url-0", output=[{"n" : 0}])
+    assert work_queue.complete(owner="c", url="url-0", output=[{"n" : 0}])
+    assert not work_queue.complete(owner="c", url="url-0", output=[{"n" : 0}])
+
+    assert work_queue.get_stats() == {"pending" : 0, "leased" : 3, "done" : 1, "failed" : 0}
+    assert not work_queue.is_drained()
+
+
+def test_work_queue_workers_complete_each_url_once(tmp_path) :
+    """
+        Plusieurs workers se partagent la file pendant qu'elle est remplie,
+        chaque url est terminée une seule fois et la sortie est exportée dans l'ordre de la file
+    """
+
+    fp = str(tmp_path / "work_queue.sqlite")
+    work_queue = WorkQueue(fp=fp)
+    results = []
+
+    workers = [threading.Thread(target=lambda n=n : results.append(run_queue_worker(work_queue=WorkQueue(fp=fp),
+                                                                                    extractor=FakeExtractor(),
+                                                                                    owner=f"worker-{n}",
+                                                                                    batch_size=5,
+                                                                                    poll_seconds=0.01)))
+               for n in range(4)]
+    for worker in workers :
+        worker.start()
+
+    for page in range(10) :
+        work_queue.push([f"url-{page}-{n}" for n in range(20)])
+    work_queue.close_input()
+
+    for worker in workers :
+        worker.join()
+
+    assert work_queue.is_drained()
+    assert sum(result["completed"] for result in results) == 200
+    assert work_queue.export(fp=str(tmp_path / "products_data.ndjson")) == 200
+    assert [line["product_url"] for line in read_ndjson(fp=str(tmp_path / "products_data.ndjson"))] == [f"url-{page}-{n}" for page in range(10) for n in range(20)]
+
+
+def test_work_queue_reopened_by_a_restarted_run(tmp_path) :
+    """
+        La file fermée par un run arrêté est rouverte au redémarrage,
+        les workers attendent les urls poussées par le nouveau run
+    """
+
+    fp = str(tmp_path / "work_queue.sqlite")
+    work_queue = WorkQueue(fp=fp)
+    work_queue.push(["url-0"])
+    work_queue.close_input()
+
+    # Restart : the leftover url is done before the listing pushes the next one
+    work_queue.reopen_input()
+    assert not work_queue.is_input_closed()
+    worker = threading.Thread(target=run_queue_worker, kwargs={"work_queue" : WorkQueue(fp=fp), "extractor" : FakeExtractor(),
+                                                               "owner" : "worker", "poll_seconds" : 0.01})
+    worker.start()
+    time.sleep(0.2)
+    assert worker.is_alive()
+
+    work_queue.push(["url-1"])
+    work_queue.close_input()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+    assert work_queue.get_stats() == {"pending" : 0, "leased" : 0, "done" : 2, "failed" : 0}
+
+
+def test_work_queue_retries_products_without_variants(tmp_path) :
+    """
+        Un produit sans variantes (échec de la requête) est rendu à la file et retenté,
+        puis marqué en échec après 'max_attempts' tentatives
+    """
+
+    work_queue = WorkQueue(fp=str(tmp_path / "work_queue.sqlite"), max_attempts=3)
+    work_queue.push(["url-0", "url-1", "url-2"])
+    work_queue.close_input()
+
+    stats = run_queue_worker(work_queue=work_queue, extractor=FakeExtractor(failing={"url-1"}, empty={"url-2"}), owner="worker", poll_seconds=0.01)
+
+    # A product without variants is done, not retried
+    assert stats == {"completed" : 2, "rejected" : 0, "failed" : 3}
+    assert work_queue.get_stats() == {"pending" : 0, "leased" : 0, "done" : 2, "failed" : 1}
+    assert work_queue.is_drained()